@@ -0,0 +1,223 @@
+"""In-process registry of active shifts, plus write-behind triage counts.
+
+The agent hot path asks "what is this agent's active shift?" on every page
+load and bumps the triage counter on every click. The registry keeps
+agent_id -> (shift_id, triaged_count, zd_ticket_count) for active shifts (and
+"no active shift" answers) so those lookups skip the database.
+
+Every worker listens on the live channel: start/end-shift and triage flushes
+from any worker invalidate the agent's entry, and a reconnect or periodic
+resync clears the registry. Each invalidation bumps a generation counter,
+and a lookup only stores what it loaded if no invalidation for that agent
+arrived meanwhile. While the listener is down the registry is bypassed.
+
+Triage clicks on an active shift are summed per shift and flushed every
+TRIAGE_FLUSH_MS with one `UPDATE ... FROM (VALUES ...)`. The count returned to
+the agent is the stored count plus this worker's unflushed clicks; clicks
+buffered in another worker show up once that worker flushes.
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+
+from psycopg2.extras import execute_values
+
+import live
+from db import db
+
+ENABLED = os.getenv("ACTIVE_SHIFT_CACHE", "1") != "0"
+FLUSH_INTERVAL = float(os.getenv("TRIAGE_FLUSH_MS", "250")) / 1000
+SOURCE = uuid.uuid4().hex[:12]  # tags this process's notifications
+
+_lock = threading.Lock()
+_by_agent = {}     # agent_id -> {"shift_id", "triaged_count", "zd_ticket_count"} or None
+_by_shift = {}     # shift_id -> agent_id
+_gen = {}          # agent_id -> invalidations so far; a load is only stored if unchanged
+_epoch = 0         # bumped by invalidations that can't be pinned to one agent
+_pending = {}      # shift_id -> triage delta not yet flushed
+_inflight = {}     # shift_id -> delta being flushed right now
+_flush_lock = threading.Lock()
+_thread = None
+
+
+def _active():
+    return _thread is not None and live.connected()
+
+
+def _overlay(shift_id):
+    return _pending.get(shift_id, 0) + _inflight.get(shift_id, 0)
+
+
+def _key(agent_id):
+    try:
+        return str(uuid.UUID(str(agent_id)))
+    except ValueError:
+        return str(agent_id)
+
+
+def _invalidate(agent_id):
+    _gen[agent_id] = _gen.get(agent_id, 0) + 1
+    _drop(agent_id)
+
+
+def _drop(agent_id):
+    entry = _by_agent.pop(agent_id, None)
+    if entry:
+        _by_shift.pop(entry["shift_id"], None)
+
+
+def _store(agent_id, entry):
+    _drop(agent_id)
+    _by_agent[agent_id] = entry
+    if entry:
+        _by_shift[entry["shift_id"]] = agent_id
+
+
+def _view(entry):
+    return dict(entry, triaged_count=max(entry["triaged_count"] + _overlay(entry["shift_id"]), 0))
+
+
+def _load(cur, agent_id):
+    cur.execute("SELECT id, triaged_count, COALESCE(zd_ticket_count,0) FROM shifts "
+                "WHERE agent_id=%s AND logout_time IS NULL ORDER BY login_time DESC LIMIT 1", (agent_id,))
+    row = cur.fetchone()
+    return {"shift_id": str(row[0]), "triaged_count": row[1] or 0, "zd_ticket_count": int(row[2] or 0)} if row else None
+
+
+def lookup(cur, agent_id):
+    """The agent's active shift {shift_id, triaged_count, zd_ticket_count}, or None."""
+    agent_id = _key(agent_id)
+    if not _active():
+        return _load(cur, agent_id)
+    with _lock:
+        if agent_id in _by_agent:
+            entry = _by_agent[agent_id]
+            return _view(entry) if entry else None
+        seen = (_epoch, _gen.get(agent_id, 0))
+    entry = _load(cur, agent_id)
+    with _lock:
+        # An invalidation that arrived while we were loading wins: don't cache a stale answer.
+        if (_epoch, _gen.get(agent_id, 0)) == seen:
+            _store(agent_id, entry)
+        return _view(entry) if entry else None
+
+
+def lock_active(cur, agent_id):
+    """Like lookup, but always read from shifts, with the agent's row locked
+    until the transaction ends so concurrent start-shifts for the same agent
+    queue up behind each other. For the write path; bypasses the registry."""
+    agent_id = _key(agent_id)
+    cur.execute("SELECT 1 FROM agents WHERE id=%s FOR UPDATE", (agent_id,))
+    entry = _load(cur, agent_id)
+    with _lock:
+        return _view(entry) if entry else None
+
+
+def forget(agent_id):
+    """Drop an agent's entry in this worker (others hear it through NOTIFY)."""
+    with _lock:
+        _invalidate(_key(agent_id))
+
+
+def triage(cur, shift_id, change):
+    """Apply a triage change. Returns the new count, or None if the shift doesn't exist.
+
+    Active shifts go through the write-behind buffer; anything else is updated directly."""
+    shift_id = str(shift_id)
+    if _active():
+        with _lock:
+            agent_id = _by_shift.get(shift_id)
+        if agent_id is None:
+            cur.execute("SELECT agent_id FROM shifts WHERE id=%s AND logout_time IS NULL", (shift_id,))
+            row = cur.fetchone()
+            if row:
+                agent_id = str(row[0])
+                lookup(cur, agent_id)
+        with _lock:
+            if agent_id is not None and _by_shift.get(shift_id) == agent_id:
+                _pending[shift_id] = _pending.get(shift_id, 0) + int(change)
+                return _view(_by_agent[agent_id])["triaged_count"]
+    cur.execute("UPDATE shifts SET triaged_count=GREATEST(triaged_count+%s,0) WHERE id=%s RETURNING triaged_count",
+                (change, shift_id))
+    row = cur.fetchone()
+    if row:
+        live.notify(cur, "triage", shift_id)
+    return row[0] if row else None
+
+
+def flush():
+    """Write the buffered triage deltas in one statement. Returns shifts updated."""
+    with _flush_lock:
+        with _lock:
+            if not _pending:
+                return 0
+            _inflight.update(_pending)
+            _pending.clear()
+            batch = list(_inflight.items())
+        try:
+            with db() as cur:
+                rows = execute_values(cur, """
+                    UPDATE shifts s SET triaged_count=GREATEST(s.triaged_count+v.change,0)
+                    FROM (VALUES %s) AS v(id, change)
+                    WHERE s.id=v.id
+                    RETURNING s.id, s.agent_id, s.triaged_count
+                """, batch, template="(%s::uuid, %s::int)", fetch=True)
+                for shift_id, agent_id, count in rows:
+                    live.notify(cur, "triage", shift_id, agent_id=str(agent_id), source=SOURCE)
+        except Exception as e:
+            with _lock:
+                for shift_id, delta in batch:
+                    _pending[shift_id] = _pending.get(shift_id, 0) + delta
+                _inflight.clear()
+            print(f"[active_shifts] triage flush failed, will retry: {e}", flush=True)
+            return 0
+        with _lock:
+            for shift_id, agent_id, count in rows:
+                entry = _by_agent.get(str(agent_id))
+                if entry and entry["shift_id"] == str(shift_id):
+                    entry["triaged_count"] = count
+            _inflight.clear()
+        return len(rows)
+
+
+def _on_events(events):
+    global _epoch
+    with _lock:
+        if events is None:
+            _epoch += 1
+            _by_agent.clear()
+            _by_shift.clear()
+            return
+        for e in events:
+            if e.get("source") == SOURCE:
+                continue
+            if e.get("agent_id"):
+                _invalidate(_key(e["agent_id"]))
+            elif e.get("event") in ("triage", "zd_count", "shift_ended"):
+                agent_id = _by_shift.get(e.get("shift_id"))
+                if agent_id:
+                    _invalidate(agent_id)
+                else:
+                    _epoch += 1  # the shift may belong to a load in flight
+
+
+def _loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def start():
+    """Start the listener and the triage flusher (ACTIVE_SHIFT_CACHE=0 disables both)."""
+    global _thread
+    if not ENABLED or _thread is not None:
+        return _thread
+    live.on_events(_on_events)
+    live.start()
+    _thread = threading.Thread(target=_loop, name="triage-flush", daemon=True)
+    _thread.start()
+    atexit.register(flush)
+    print(f"✅ Active-shift registry on, triage flushed every {FLUSH_INTERVAL * 1000:g}ms")
+    return _thread
@@ -0,0 +1,57 @@
+"""Shared loader for the per-shift activity lists.
+
+All seven activity tables are read with one UNION ALL statement, so a shift
+summary costs one round trip to Postgres instead of seven, and any number of
+shifts can be loaded together.
+"""
+from db import to_ist
+
+# (response key, table, selected columns, output field names)
+KINDS = [
+    ("tickets",         "tickets",          ("ticket_number", "description"),          ("number", "description")),
+    ("alerts",          "alerts",           ("monitor", "alert_type", "comment"),      ("monitor", "type", "comment")),
+    ("incidents",       "incident_status",  ("description",),                          ("description",)),
+    ("adhoc_tasks",     "adhoc_tasks",      ("task",),                                 ("task",)),
+    ("handovers",       "handovers",        ("description", "handover_to"),            ("description", "handover_to")),
+    ("maintenance",     "maintenance_logs", ("description",),                          ("description",)),
+    ("dialpad_tickets", "dialpad_tickets",  ("ticket_number", "description"),          ("ticket_number", "description")),
+]
+
+_WIDTH = max(len(k[2]) for k in KINDS)
+
+_SQL = "\nUNION ALL\n".join(
+    "SELECT {i}, shift_id, {cols}, created_at FROM {table} WHERE shift_id = ANY(%(ids)s::uuid[])".format(
+        i=i, table=table,
+        cols=", ".join([f"{c}::text" for c in cols] + ["NULL::text"] * (_WIDTH - len(cols))),
+    )
+    for i, (_, table, cols, _) in enumerate(KINDS)
+) + "\nORDER BY created_at"
+
+
+def _empty():
+    return {key: [] for key, *_ in KINDS}
+
+
+def _rows(cur, shift_ids):
+    cur.execute(_SQL, {"ids": [str(s) for s in shift_ids]})
+    for r in cur.fetchall():
+        key, _, _, fields = KINDS[r[0]]
+        item = dict(zip(fields, r[2:2 + len(fields)]))
+        item["created_at"] = to_ist(r[-1])
+        yield str(r[1]), key, item
+
+
+def shift_activities(cur, shift_id):
+    """Every activity list for one shift."""
+    out = _empty()
+    for _, key, item in _rows(cur, [shift_id]):
+        out[key].append(item)
+    return out
+
+
+def load_shift_activities(cur, shift_ids):
+    """{shift_id: activity lists} for every shift in `shift_ids` (one query)."""
+    out = {str(s): _empty() for s in shift_ids}
+    for sid, key, item in _rows(cur, shift_ids):
+        out.setdefault(sid, _empty())[key].append(item)
+    return out
@@ -0,0 +1,308 @@
+"""Sections of /manager/advanced-analytics.
+
+Each section is an independent function of (cur, date_from, date_to) that
+returns some of the response keys. `run` dispatches them on a shared,
+bounded executor, each on its own pooled connection with a server-side
+statement_timeout, so the page costs about as long as its slowest section
+rather than the sum of all of them. A section that fails or runs past
+ANALYTICS_SECTION_TIMEOUT comes back as its empty defaults plus an entry in
+`errors`; the rest of the page is still returned.
+
+ANALYTICS_PARALLEL=0 runs the sections one after another instead (same
+results, same timings/errors shape).
+
+Section results are cached per (section, date_from, date_to) for
+ANALYTICS_SECTION_TTL seconds, so a tab that asks for one section with
+?sections= after another tab asked for the same range is served from memory.
+"""
+import contextvars
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pagination
+import rollups
+from cache import TTLCache, HIT
+from db import db
+
+DAY_NAMES = ["Sunday","Monday","Tuesday","Wednesday","Thursday","Friday","Saturday"]
+
+PARALLEL = os.getenv("ANALYTICS_PARALLEL", "1").strip() != "0"
+SECTION_TIMEOUT = float(os.getenv("ANALYTICS_SECTION_TIMEOUT", "10"))
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ANALYTICS_WORKERS", "4")), thread_name_prefix="analytics")
+_cache = TTLCache(ttl=float(os.getenv("ANALYTICS_SECTION_TTL", "30")), maxsize=256)
+
+
+HIST_BUCKETS = 10
+
+
+def _agg(col):
+    """Summary aggregates of `col` over the `v` CTE, for _describe."""
+    return (f"COUNT({col}), MIN({col}), MAX({col}), AVG({col}), "
+            f"percentile_cont(ARRAY[0.5,0.9,0.99]) WITHIN GROUP (ORDER BY {col}), STDDEV_SAMP({col}), "
+            f"(SELECT json_agg(json_build_array(b, n)) FROM ("
+            f"  SELECT LEAST(width_bucket(v.{col}, m.lo, m.hi, {HIST_BUCKETS}), {HIST_BUCKETS}) AS b, COUNT(*) AS n"
+            f"  FROM v, (SELECT MIN({col}) AS lo, MAX({col}) AS hi FROM v) m"
+            f"  WHERE v.{col} IS NOT NULL AND m.hi>m.lo GROUP BY 1) h)")
+
+
+def _describe(n, lo, hi, avg, pct, std, buckets):
+    """min/max/avg/median/std_dev (+ p90, p99 and an equal-width histogram)
+    from one _agg() result; {} when there were no values."""
+    if not n: return {}
+    if buckets:
+        width = (hi - lo) / HIST_BUCKETS
+        counts = dict(buckets)
+        histogram = [{"from": round(lo + i * width, 2), "to": round(lo + (i + 1) * width, 2), "count": counts.get(i + 1, 0)}
+                     for i in range(HIST_BUCKETS)]
+    else:  # every value the same
+        histogram = [{"from": round(lo, 2), "to": round(hi, 2), "count": n}]
+    return {
+        "min": round(lo, 2), "max": round(hi, 2),
+        "avg": round(avg, 2), "median": round(pct[0], 2),
+        "std_dev": round(std, 2) if n > 1 else 0,
+        "p90": round(pct[1], 2), "p99": round(pct[2], 2),
+        "count": n, "histogram": histogram,
+    }
+
+
+# ── sections ──────────────────────────────────────────────────────────────────
+
+def trends(cur, date_from, date_to):
+    """Per-day series, from the rollups (today is aggregated live)."""
+    day_rows = rollups.daily(cur, date_from, date_to[:10])
+    performance_trends, by_dow = [], {}
+    for day, shifts, triaged, zd, agent_ids, *_ in day_rows:
+        if not shifts: continue
+        performance_trends.append({"date": str(day), "agents": len(agent_ids), "shifts": shifts, "total_triaged": int(triaged),
+                                   "avg_triaged": round(triaged / shifts, 2), "total_zd_tickets": int(zd)})
+        d = by_dow.setdefault((day.weekday() + 1) % 7, [0, 0, set()])
+        d[0] += shifts; d[1] += triaged; d[2].update(agent_ids)
+    return {
+        "performance_trends": performance_trends,
+        "daily_distribution": [
+            {"day_of_week": dow, "day_name": DAY_NAMES[dow], "shift_count": n, "total_triaged": int(t),
+             "avg_triaged": round(t / n, 2), "unique_agents": len(agents)}
+            for dow, (n, t, agents) in sorted(by_dow.items())
+        ],
+        "incident_pattern": [{"date": str(r[0]), "count": r[5]} for r in day_rows if r[5]],
+        "ticket_volume":    [{"date": str(r[0]), "count": r[6]} for r in day_rows if r[6]],
+        "dialpad_volume":   [{"date": str(r[0]), "count": r[7]} for r in day_rows if r[7]],
+    }
+
+
+def hourly(cur, date_from, date_to):
+    """Per-hour-of-day totals and coverage, from the rollups."""
+    by_hour = {}
+    for _, hour, shifts, triaged, agents in rollups.hourly(cur, date_from, date_to[:10]):
+        h = by_hour.setdefault(hour, [0, 0, []])
+        h[0] += shifts; h[1] += triaged; h[2].append(agents)
+    return {
+        "hourly_distribution": [
+            {"hour": hour, "shift_count": n, "total_triaged": int(t), "avg_triaged": round(t / n, 2)}
+            for hour, (n, t, _) in sorted(by_hour.items())
+        ],
+        "coverage_analysis": [
+            {"hour": hour, "avg_agents": round(statistics.mean(slots), 2)}
+            for hour, (_, _, slots) in sorted(by_hour.items())
+        ],
+    }
+
+
+def rankings(cur, date_from, date_to):
+    cur.execute("""
+        SELECT sh.agent_id, COALESCE(ag.name,'Unknown Agent'),
+               COUNT(sh.id),
+               COALESCE(SUM(sh.triaged_count),0),
+               COALESCE(AVG(sh.triaged_count),0),
+               ROUND(COALESCE(AVG(sh.triaged_count/NULLIF(EXTRACT(EPOCH FROM (COALESCE(sh.logout_time,NOW())-sh.login_time))/3600,0)),0), 2),
+               COALESCE(SUM(c.ticket_cnt),0),
+               COALESCE(SUM(c.alert_cnt),0),
+               COALESCE(SUM(c.incident_cnt),0),
+               COALESCE(SUM(c.adhoc_cnt),0),
+               COALESCE(AVG(EXTRACT(EPOCH FROM (COALESCE(sh.logout_time,NOW())-sh.login_time))/3600),0),
+               COALESCE(SUM(c.ticket_cnt),0),
+               COALESCE(SUM(c.dialpad_cnt),0)
+        FROM shifts sh
+        LEFT JOIN shift_activity_counts c ON c.shift_id=sh.id
+        LEFT JOIN agents ag ON ag.id=sh.agent_id
+        WHERE sh.login_time>=%s AND sh.login_time<=%s
+        GROUP BY sh.agent_id, ag.name ORDER BY 6 DESC, 1
+    """, (date_from, date_to))
+    return {"agent_rankings": [
+        {"rank": i+1, "agent_id": str(r[0]), "agent_name": r[1],
+         "shift_count": r[2], "total_triaged": int(r[3] or 0), "avg_triaged": round(float(r[4] or 0), 2),
+         "productivity_rate": round(float(r[5] or 0), 2), "total_tickets": int(r[6] or 0),
+         "total_alerts": int(r[7] or 0), "total_incidents": int(r[8] or 0), "total_adhoc": int(r[9] or 0),
+         "avg_shift_hours": round(float(r[10] or 0), 2), "total_zd_tickets": int(r[11] or 0),
+         "total_dialpad": int(r[12] or 0)}
+        for i, r in enumerate(cur.fetchall())
+    ]}
+
+
+def alerts(cur, date_from, date_to):
+    p = (date_from, date_to)
+    cur.execute("SELECT alert_type,COUNT(*),COUNT(DISTINCT shift_id) FROM alerts WHERE created_at>=%s AND created_at<=%s GROUP BY 1 ORDER BY 2 DESC", p)
+    alert_analysis = [{"alert_type": r[0], "count": r[1], "shifts_affected": r[2]} for r in cur.fetchall()]
+    cur.execute("SELECT monitor,COUNT(*),COUNT(DISTINCT shift_id),COUNT(DISTINCT alert_type) FROM alerts WHERE created_at>=%s AND created_at<=%s GROUP BY 1 ORDER BY 2 DESC LIMIT 10", p)
+    monitor_analysis = [{"monitor": r[0], "alert_count": r[1], "shifts_affected": r[2], "unique_alert_types": r[3]} for r in cur.fetchall()]
+    return {"alert_analysis": alert_analysis, "monitor_analysis": monitor_analysis}
+
+
+def shift_stats(cur, date_from, date_to):
+    """Duration and productivity distributions, aggregated in Postgres."""
+    cur.execute(f"""
+        WITH s AS (
+            SELECT triaged_count,
+                   (EXTRACT(EPOCH FROM (logout_time-login_time))/3600)::float8 AS dur,
+                   (EXTRACT(EPOCH FROM (COALESCE(logout_time,NOW())-login_time))/3600)::float8 AS hours
+            FROM shifts WHERE login_time>=%s AND login_time<=%s
+        ), v AS (
+            SELECT CASE WHEN dur>0 THEN dur END AS dur,
+                   CASE WHEN hours>0.5 AND triaged_count IS NOT NULL
+                        THEN ROUND((triaged_count/hours)::numeric, 2)::float8 END AS rate
+            FROM s
+        )
+        SELECT {_agg("dur")}, {_agg("rate")} FROM v
+    """, (date_from, date_to))
+    r = cur.fetchone()
+    return {"shift_duration_stats": _describe(*r[:7]), "productivity_stats": _describe(*r[7:])}
+
+
+def consistency(cur, date_from, date_to):
+    cur.execute("SELECT agent_id,STDDEV(triaged_count),AVG(triaged_count) FROM shifts WHERE login_time>=%s AND login_time<=%s AND logout_time IS NOT NULL GROUP BY agent_id HAVING COUNT(*)>=1 ORDER BY 2", (date_from, date_to))
+    return {"agent_consistency": [
+        {"agent_id": str(r[0]), "variance": round(float(r[1] or 0), 2),
+         "avg_triaged": round(float(r[2] or 0), 2),
+         "consistency_score": round(100-min(float(r[1] or 0)*10, 100), 2) if r[1] else 100}
+        for r in cur.fetchall()
+    ][:10]}
+
+
+# name -> (function, response keys with their empty values)
+SECTIONS = {
+    "trends":      (trends, {"performance_trends": [], "daily_distribution": [], "incident_pattern": [],
+                             "ticket_volume": [], "dialpad_volume": []}),
+    "hourly":      (hourly, {"hourly_distribution": [], "coverage_analysis": []}),
+    "rankings":    (rankings, {"agent_rankings": []}),
+    "alerts":      (alerts, {"alert_analysis": [], "monitor_analysis": []}),
+    "shift_stats": (shift_stats, {"shift_duration_stats": {}, "productivity_stats": {}}),
+    "consistency": (consistency, {"agent_consistency": []}),
+}
+
+# Response keys computed from other sections' results.
+DERIVED = {"insights": ("rankings", "alerts", "hourly", "trends"), "peak_hour": ("hourly",)}
+_BY_KEY = {key: name for name, (_, keys) in SECTIONS.items() for key in keys}
+
+
+def resolve(requested):
+    """Section names for a ?sections= list, which may name sections, response
+    keys or derived keys. Raises ValueError on anything else."""
+    names = []
+    for item in (r.strip() for r in requested):
+        if not item:
+            continue
+        if item in SECTIONS:
+            wanted = (item,)
+        elif item in _BY_KEY:
+            wanted = (_BY_KEY[item],)
+        elif item in DERIVED:
+            wanted = DERIVED[item]
+        else:
+            raise ValueError(f"unknown section {item!r}")
+        names += [n for n in wanted if n not in names]
+    return names
+
+
+def columnar(data):
+    """Rewrite each section series (a list of row dicts) in `data` as
+    {field: [values...]}, in place; returns the keys rewritten. Used for
+    ?encoding=columnar, where the field names are sent once per series."""
+    keys = []
+    for key in _BY_KEY:
+        rows = data.get(key)
+        if isinstance(rows, list) and rows and isinstance(rows[0], dict):
+            data[key] = {f: [r[f] for r in rows] for f in rows[0]}
+            keys.append(key)
+    return keys
+
+
+def page_rankings(rankings, limit, cursor=None):
+    """One page of agent_rankings after `cursor` (ordered by productivity_rate
+    desc, then agent_id). Returns (page, next_cursor or None)."""
+    if cursor:
+        try:
+            rate, agent_id = pagination.decode(cursor)
+            rate, agent_id = float(rate), str(agent_id)
+        except (TypeError, ValueError):
+            raise ValueError("invalid cursor")
+        rankings = [r for r in rankings if (-r["productivity_rate"], r["agent_id"]) > (-rate, agent_id)]
+    page = rankings[:limit]
+    more = len(rankings) > limit
+    return page, pagination.encode([page[-1]["productivity_rate"], page[-1]["agent_id"]]) if more else None
+
+
+# ── runner ────────────────────────────────────────────────────────────────────
+
+def _compute(name, date_from, date_to):
+    with db(readonly=True) as cur:
+        cur.execute("SET LOCAL statement_timeout = %s", (int(SECTION_TIMEOUT * 1000),))
+        return SECTIONS[name][0](cur, date_from, date_to)
+
+
+def _section(name, date_from, date_to):
+    """(result, ms, error, cached) for one section, computed on its own pooled connection."""
+    start = time.perf_counter()
+    try:
+        result, _, status = _cache.get_or_load((name, str(date_from), str(date_to)),
+                                               lambda: _compute(name, date_from, date_to))
+        error = None
+    except Exception as e:
+        result, error, status = None, str(e).strip(), None
+    return result, round((time.perf_counter() - start) * 1000, 1), error, status == HIT
+
+
+def run(date_from, date_to, names=None):
+    """Run the named sections (default: all). Returns (data, errors, timings_ms,
+    cached); `data` always holds every key of the requested sections."""
+    names = list(names or SECTIONS)
+    data, errors, timings, cached = {}, {}, {}, []
+    for name in names:
+        data.update(SECTIONS[name][1])
+
+    outcomes = {}
+    for name in names:  # cache hits don't need a worker
+        hit = _cache.get((name, str(date_from), str(date_to)))
+        if hit:
+            outcomes[name] = (hit[0], 0.0, None, True)
+    todo = [n for n in names if n not in outcomes]
+
+    if PARALLEL and len(todo) > 1:
+        start = time.perf_counter()
+        # copy_context so section queries count towards this request's Server-Timing
+        futures = {_executor.submit(contextvars.copy_context().run, _section, name, date_from, date_to): name
+                   for name in todo}
+        # statement_timeout bounds the queries; this also bounds time spent
+        # queued behind other requests' sections.
+        done, _ = wait(futures, timeout=SECTION_TIMEOUT + 1)
+        for f, name in futures.items():
+            if f in done:
+                outcomes[name] = f.result()
+            else:
+                f.cancel()
+                outcomes[name] = (None, round((time.perf_counter() - start) * 1000, 1),
+                                  f"timed out after {SECTION_TIMEOUT:g}s", False)
+    else:
+        outcomes.update((name, _section(name, date_from, date_to)) for name in todo)
+
+    for name in names:
+        result, ms, error, hit = outcomes[name]
+        timings[name] = ms
+        if error:
+            errors[name] = error
+        else:
+            data.update(result)
+        if hit:
+            cached.append(name)
+    return data, errors, timings, cached
@@ -1,16 +1,23 @@
-from flask import Flask, redirect, request, make_response
+from flask import Flask, Response, redirect, request, make_response, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
-import json, base64, urllib.parse
-
-from db import init_pool
+import json, base64, functools, hmac, os, urllib.parse
+
+load_dotenv()  # before the local imports: they read their settings at import time
+
+from db import init_pool, pool_stats
+import active_shifts
+import compress
+import conditional
+import fastjson
+import metrics
+import rollups
+import zendesk_sync
 from routes.agent import agent_bp
 from routes.manager import manager_bp
 from routes.users import users_bp
 from routes.zendesk import zendesk_bp
 
-load_dotenv()
-
 app = Flask(__name__)
 
 app.config["SESSION_COOKIE_SAMESITE"] = "None"
@@ -18,7 +25,8 @@ app.config["SESSION_COOKIE_SECURE"] = True
 
 FRONTEND_URL = "https://blue-pond-0c737da03.6.azurestaticapps.net"
 
-CORS(app, resources={r"/*": {"origins": [FRONTEND_URL]}}, supports_credentials=True)
+CORS(app, resources={r"/*": {"origins": [FRONTEND_URL]}}, supports_credentials=True,
+     expose_headers=["X-Cache", "X-Cache-Age", "Server-Timing", "Retry-After"])
 
 # ── Handle ALL OPTIONS preflights before Azure auth can intercept them ───────
 @app.before_request
@@ -73,12 +81,62 @@ def auth_done():
         print(f"Auth-done error: {e}")
     return _redirect_no_cache(FRONTEND_URL)
 
+fastjson.init_app(app)
+compress.init_app(app)
+metrics.init_app(app)
+
+
+@app.after_request
+def timing_allow_origin(res):
+    res.headers["Timing-Allow-Origin"] = FRONTEND_URL  # lets the dashboard read Server-Timing
+    return res
+
+
+# Scrape token for the internal endpoints below. Unset: they answer 404.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _internal(view):
+    """Require `Authorization: Bearer <METRICS_TOKEN>`: these endpoints expose
+    route names, SQL statement labels, pool state and replica lag."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not METRICS_TOKEN:
+            return jsonify({"error": "Not found"}), 404
+        auth = request.headers.get("Authorization", "")
+        if not (auth.startswith("Bearer ") and hmac.compare_digest(auth[7:].encode(), METRICS_TOKEN.encode())):
+            res = jsonify({"error": "Unauthorized"})
+            res.status_code = 401
+            res.headers["WWW-Authenticate"] = "Bearer"
+            return res
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/metrics")
+@_internal
+def metrics_endpoint():
+    """Prometheus scrape target (per worker process)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/health/db")
+@_internal
+def health_db():
+    """Connection pool gauges: in_use / idle / waiting, checkout wait times, timeouts."""
+    return jsonify(pool_stats())
+
+
 app.register_blueprint(agent_bp)
 app.register_blueprint(manager_bp)
 app.register_blueprint(users_bp)
 app.register_blueprint(zendesk_bp)
 
 init_pool()
+zendesk_sync.start()
+rollups.start()
+active_shifts.start()
+conditional.start()
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
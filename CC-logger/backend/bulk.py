@@ -0,0 +1,177 @@
+"""Set-based writes for the activity tables.
+
+Tickets are unique per (shift_id, ticket_number): a batch is written with one
+multi-row INSERT ... ON CONFLICT DO NOTHING instead of a SELECT-then-INSERT
+per row, and the conflicts come back as the skipped count.
+
+`insert_activities` takes a mixed list of typed records for one shift (what
+POST /activities/batch receives), validates them up front and writes each
+type with one multi-row INSERT.
+
+    python bulk.py init   # archive duplicate tickets and create the unique index
+"""
+import sys
+from datetime import datetime
+
+from psycopg2.extras import execute_values
+
+if __name__ == "__main__":  # before the imports below read their settings
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from counters import bump, rebuild
+from db import db, init_pool, IST
+
+# Existing duplicates (same shift + number) can't stay in tickets once the index
+# exists: every row but the earliest is moved, unchanged, to tickets_duplicates
+# (plus archived_at) so nothing users entered is lost, and reported by `init`.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets_duplicates (LIKE tickets, archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW());
+"""
+_ARCHIVE = """
+WITH moved AS (
+    DELETE FROM tickets t USING tickets d
+     WHERE d.shift_id=t.shift_id AND d.ticket_number=t.ticket_number AND d.id<t.id
+    RETURNING t.*
+)
+INSERT INTO tickets_duplicates SELECT moved.*, NOW() FROM moved
+RETURNING shift_id, ticket_number
+"""
+INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS tickets_shift_ticket_number_uidx ON tickets (shift_id, ticket_number);"
+
+
+def init(cur):
+    """Archive duplicate tickets, create the unique index and rebuild the counters
+    of the shifts that had duplicates. Returns how many rows were archived."""
+    cur.execute(SCHEMA)
+    cur.execute(_ARCHIVE)
+    moved = cur.fetchall()
+    cur.execute(INDEX)
+    if moved:
+        rebuild(cur, {r[0] for r in moved})
+        print(f"⚠️ moved {len(moved)} duplicate ticket row(s) to tickets_duplicates:", flush=True)
+        for shift_id, number in moved[:50]:
+            print(f"  shift {shift_id} ticket {number}", flush=True)
+        if len(moved) > 50:
+            print(f"  ... and {len(moved) - 50} more", flush=True)
+    return len(moved)
+
+
+def insert_tickets(cur, shift_id, rows):
+    """Insert [(ticket_number, description), ...] for one shift in a single
+    statement, skipping numbers the shift already has. Returns (inserted, skipped)."""
+    if not rows:
+        return 0, 0
+    inserted = execute_values(
+        cur,
+        "INSERT INTO tickets (shift_id, ticket_number, description) VALUES %s "
+        "ON CONFLICT (shift_id, ticket_number) DO NOTHING RETURNING 1",
+        [(shift_id, str(number).strip(), description) for number, description in rows],
+        page_size=1000, fetch=True,
+    )
+    bump(cur, shift_id, "tickets", len(inserted))
+    return len(inserted), len(rows) - len(inserted)
+
+
+# ── mixed activity batches ────────────────────────────────────────────────────
+
+# type -> (table, columns, required fields); columns map 1:1 to payload fields
+# except alerts.created_at, which comes from `alert_datetime`.
+ACTIVITY_TYPES = {
+    "alert":       ("alerts", ("monitor", "alert_type", "comment", "created_at"), ("monitor", "alert_type")),
+    "incident":    ("incident_status", ("description",), ("description",)),
+    "adhoc":       ("adhoc_tasks", ("task",), ("task",)),
+    "handover":    ("handovers", ("description", "handover_to"), ("description", "handover_to")),
+    "maintenance": ("maintenance_logs", ("description",), ("description",)),
+    "dialpad":     ("dialpad_tickets", ("ticket_number", "description"), ("ticket_number",)),
+    "ticket":      ("tickets", ("ticket_number", "description"), ("ticket_number",)),
+}
+MAX_ACTIVITIES = 500
+
+
+def alert_time(raw):
+    """`alert_datetime` (IST, "%Y-%m-%dT%H:%M:%S") or now when missing/invalid."""
+    try:
+        return IST.localize(datetime.strptime(raw, "%Y-%m-%dT%H:%M:%S")) if raw else datetime.now(IST)
+    except (ValueError, TypeError):
+        return datetime.now(IST)
+
+
+def _row(item):
+    """(type, values) for a valid record, or raise ValueError with the reason."""
+    if not isinstance(item, dict):
+        raise ValueError("activity must be an object")
+    kind = item.get("type")
+    if kind not in ACTIVITY_TYPES:
+        raise ValueError(f"unknown type {kind!r}")
+    _, columns, required = ACTIVITY_TYPES[kind]
+    clean = {}
+    for k, v in item.items():
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            v = str(v)  # every stored field is text; ticket numbers often arrive as JSON numbers
+        elif v is not None and not isinstance(v, str) and k in columns:
+            raise ValueError(f"{k} must be a string")
+        clean[k] = v.strip() if isinstance(v, str) else v
+    missing = [f for f in required if not clean.get(f)]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} required for {kind}")
+    if kind == "alert":
+        clean["created_at"] = alert_time(clean.get("alert_datetime"))
+    return kind, tuple(clean.get(c) or ("" if c in ("comment", "description") else None) for c in columns)
+
+
+def insert_activities(cur, shift_id, items):
+    """Insert a mixed batch for one shift: one multi-row INSERT per type, all in
+    the caller's transaction. Returns one result per item, in order:
+    {"index", "type", "status": "inserted"|"skipped"|"invalid", "error"?}."""
+    results, by_kind = [], {}
+    for i, item in enumerate(items):
+        try:
+            kind, values = _row(item)
+        except ValueError as e:
+            results.append({"index": i, "type": item.get("type") if isinstance(item, dict) else None,
+                            "status": "invalid", "error": str(e)})
+            continue
+        results.append({"index": i, "type": kind, "status": "inserted"})
+        by_kind.setdefault(kind, []).append((i, values))
+
+    for kind, rows in by_kind.items():
+        table, columns, _ = ACTIVITY_TYPES[kind]
+        if kind == "ticket":
+            # Same dedup rule as insert_tickets, per item: a number repeated in the
+            # batch or already on the shift is skipped.
+            cur.execute("SELECT ticket_number FROM tickets WHERE shift_id=%s AND ticket_number = ANY(%s)",
+                        (shift_id, [v[0] for _, v in rows]))
+            seen, fresh = {r[0] for r in cur.fetchall()}, []
+            for i, values in rows:
+                if values[0] in seen:
+                    results[i]["status"] = "skipped"
+                else:
+                    seen.add(values[0])
+                    fresh.append((i, values))
+            rows = fresh
+            if not rows:
+                continue
+        sql = (f"INSERT INTO {table} (shift_id, {', '.join(columns)}) VALUES %s"
+               + (" ON CONFLICT (shift_id, ticket_number) DO NOTHING RETURNING ticket_number" if kind == "ticket" else ""))
+        written = execute_values(cur, sql, [(shift_id, *v) for _, v in rows], page_size=1000,
+                                 fetch=kind == "ticket")
+        if kind == "ticket":  # lost a race with a concurrent insert
+            written = {r[0] for r in written}
+            for i, values in rows:
+                if values[0] not in written:
+                    results[i]["status"] = "skipped"
+            bump(cur, shift_id, table, len(written))
+        else:
+            bump(cur, shift_id, table, len(rows))
+    return results
+
+
+if __name__ == "__main__":
+    init_pool()
+    if (sys.argv[1:] or [""])[0] != "init":
+        print("usage: python bulk.py init")
+        sys.exit(2)
+    with db() as cur:
+        moved = init(cur)
+    print(f"✅ tickets unique per shift ({moved} duplicate row(s) archived to tickets_duplicates)")
@@ -0,0 +1,96 @@
+"""Small in-process caches shared by every request a worker serves.
+
+TTLCache keeps values for `ttl` seconds, evicts least-recently-used entries
+past `maxsize`, and coalesces concurrent misses for the same key: the first
+caller runs the loader, everyone else waits for its result instead of issuing
+the same query or upstream call again. With `wait`, those callers give up
+with TimeoutError after that many seconds rather than block on a stuck loader.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+HIT, MISS, COALESCED = "HIT", "MISS", "COALESCED"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, ttl, maxsize=1024, wait=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.wait = wait
+        self._data = OrderedDict()   # key -> (stored_at, value)
+        self._inflight = {}          # key -> _Call
+        self._lock = threading.Lock()
+
+    def _fresh(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if now - entry[0] >= self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        """Return (value, age_seconds), or None when missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._fresh(key, now)
+        return (entry[1], now - entry[0]) if entry else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_or_load(self, key, loader):
+        """Return (value, age_seconds, status) where status is HIT, MISS or COALESCED.
+
+        Only one `loader()` runs per key at a time; errors propagate to every
+        waiting caller and nothing is cached."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._fresh(key, now)
+            if entry:
+                return entry[1], now - entry[0], HIT
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(self.wait):
+                raise TimeoutError(f"gave up waiting {self.wait:g}s for a load already in progress")
+            if call.error is not None:
+                raise call.error
+            return call.value, 0.0, COALESCED
+
+        try:
+            call.value = loader()
+            self.set(key, call.value)
+            return call.value, 0.0, MISS
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
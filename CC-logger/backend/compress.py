@@ -0,0 +1,54 @@
+"""Response compression for JSON, CSV and text bodies.
+
+Brotli when the `brotli` package is installed and the client accepts it,
+gzip otherwise. Bodies under COMPRESS_MIN_BYTES (default 1024) and
+streamed responses (SSE, exports) go out as they are.
+"""
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+
+_TYPES = ("application/json", "text/csv", "text/plain", "text/html")
+
+
+def negotiate(size, mimetype):
+    """The encoding to use for a body of `size` bytes, or None."""
+    if size < MIN_BYTES or mimetype not in _TYPES:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def encode(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def init_app(app):
+    @app.after_request
+    def _compress(response):
+        response.vary.add("Accept-Encoding")
+        if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                or "Content-Encoding" in response.headers):
+            return response
+        body = response.get_data()
+        encoding = negotiate(len(body), response.mimetype)
+        if encoding:
+            response.set_data(encode(body, encoding))
+            response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,141 @@
+"""ETags and 304s for the manager's polled reads.
+
+The dashboard polls /manager/active-agents, /analytics, /shifts and
+/handovers far more often than the data behind them changes. Each worker
+keeps a version per table, bumped from the live listener when an agent write
+commits (live.notify), plus an epoch bumped on reconnects, periodic resyncs
+and events it can't place (e.g. an agent deleted with their history).
+
+`cached(*tables)` keeps a view's 200 response under the current versions of
+the tables it reads, with a strong ETag hashed from the body. A poll whose
+If-None-Match still matches gets a 304 without any query; other polls get the
+stored body until one of those tables changes. Hashing the body rather than
+numbering it means the same data has the same ETag on every worker. A view's
+X-Cache-Age header is kept with the body and grows with the entry's age.
+
+While the listener is down the versions can't be trusted, so the view runs
+every time and the ETag only saves the download. RESPONSE_CACHE_TTL (seconds,
+default 60, 0 = never store) bounds how stale time-derived fields such as
+hours_active can get.
+"""
+import functools
+import hashlib
+import os
+import threading
+
+from flask import make_response, request
+
+import compress
+import live
+from activities import KINDS
+from cache import TTLCache
+
+TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+
+_ACTIVITY_TABLES = tuple(table for _, table, _, _ in KINDS)
+_SHIFT_EVENTS = ("shift_started", "shift_ended", "triage", "zd_count")
+
+_cache = TTLCache(ttl=TTL, maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "128")))
+_lock = threading.Lock()
+_versions = {}   # table -> version
+_epoch = 0
+_started = False
+
+
+def _tables(e):
+    """Tables an event touched, or None for "anything"."""
+    if e.get("event") in _SHIFT_EVENTS:
+        return ("shifts",)
+    if e.get("event") == "activity":
+        return (e["table"],) if e.get("table") in _ACTIVITY_TABLES else _ACTIVITY_TABLES  # "batch"
+    return None
+
+
+def _on_events(events):
+    global _epoch
+    with _lock:
+        for e in events or (None,):
+            tables = _tables(e) if e else None
+            if tables is None:
+                _epoch += 1
+                continue
+            for t in tables:
+                _versions[t] = _versions.get(t, 0) + 1
+
+
+def version(tables):
+    """Watermark for `tables`: changes whenever any of them is written."""
+    with _lock:
+        return (_epoch, *(_versions.get(t, 0) for t in tables))
+
+
+def start():
+    global _started
+    if TTL <= 0 or _started:
+        return
+    _started = True
+    live.on_events(_on_events)
+    live.start()
+
+
+class _Uncached(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def _render(view, args, kwargs):
+    res = make_response(view(*args, **kwargs))
+    if res.status_code != 200 or res.is_streamed:
+        raise _Uncached(res)
+    body = res.get_data()
+    age = res.headers.get("X-Cache-Age")
+    return {"etag": hashlib.blake2b(body, digest_size=16).hexdigest(), "body": body,
+            "mimetype": res.mimetype, "encoded": {}, "age": float(age) if age else None}
+
+
+def _matches(etag):
+    inm = request.if_none_match
+    # Variants are "<hash>-gzip" / "<hash>-br"; any of them matches the same data.
+    return inm.star_tag or any(t.split("-", 1)[0] == etag for t in inm.as_set(include_weak=True))
+
+
+def _respond(entry, age):
+    encoding = compress.negotiate(len(entry["body"]), entry["mimetype"])
+    if _matches(entry["etag"]):
+        res = make_response("", 304)
+    elif encoding:
+        if encoding not in entry["encoded"]:
+            entry["encoded"][encoding] = compress.encode(entry["body"], encoding)
+        res = make_response(entry["encoded"][encoding])
+        res.headers["Content-Encoding"] = encoding
+    else:
+        res = make_response(entry["body"])
+    if res.status_code == 200:
+        res.mimetype = entry["mimetype"]
+    res.set_etag(f"{entry['etag']}-{encoding}" if encoding else entry["etag"])
+    res.headers["Cache-Control"] = "private, no-cache"  # browsers revalidate every poll
+    res.vary.add("Accept-Encoding")
+    if entry["age"] is not None:
+        res.headers["X-Cache-Age"] = f"{entry['age'] + age:.1f}"
+    return res
+
+
+def cached(*tables):
+    """Serve the decorated GET view through the response cache; `tables` are
+    the tables its response is derived from."""
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+            try:
+                if _started and live.connected():
+                    key = (request.full_path, version(tables))
+                    entry, age, _ = _cache.get_or_load(key, lambda: _render(view, args, kwargs))
+                else:
+                    entry, age = _render(view, args, kwargs), 0.0
+            except _Uncached as e:
+                return e.response
+            return _respond(entry, age)
+        return wrapper
+    return decorate
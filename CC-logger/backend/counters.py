@@ -0,0 +1,142 @@
+"""Per-shift activity counters.
+
+`shift_activity_counts` holds one row per shift with the number of rows each
+activity table has for it. The agent endpoints bump it in the same transaction
+as their INSERT, so analytics can read one narrow row per shift instead of
+left-joining shifts to every activity table and de-duplicating with
+COUNT(DISTINCT ...).
+
+    python counters.py init              # create the table and backfill it
+    python counters.py rebuild [ids...]  # recompute from the raw tables
+    python counters.py check [--fix]     # report (and repair) drifted shifts
+"""
+import argparse
+import sys
+
+if __name__ == "__main__":  # before the imports below read their settings
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from db import db, init_pool
+
+# activity table -> counter column
+COUNTERS = {
+    "tickets":          "ticket_cnt",
+    "alerts":           "alert_cnt",
+    "incident_status":  "incident_cnt",
+    "adhoc_tasks":      "adhoc_cnt",
+    "handovers":        "handover_cnt",
+    "maintenance_logs": "maintenance_cnt",
+    "dialpad_tickets":  "dialpad_cnt",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shift_activity_counts (
+    shift_id        UUID PRIMARY KEY REFERENCES shifts(id) ON DELETE CASCADE,
+    ticket_cnt      INTEGER NOT NULL DEFAULT 0,
+    alert_cnt       INTEGER NOT NULL DEFAULT 0,
+    incident_cnt    INTEGER NOT NULL DEFAULT 0,
+    adhoc_cnt       INTEGER NOT NULL DEFAULT 0,
+    handover_cnt    INTEGER NOT NULL DEFAULT 0,
+    maintenance_cnt INTEGER NOT NULL DEFAULT 0,
+    dialpad_cnt     INTEGER NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+_COLS = list(COUNTERS.values())
+
+# One LEFT JOIN per activity table, each pre-grouped by shift_id, so a full
+# rebuild is a handful of hash joins rather than a cartesian fan-out.
+_LIVE_SQL = "SELECT sh.id, {cols} FROM shifts sh {joins}".format(
+    cols=", ".join(f"COALESCE({c}.n,0)" for c in _COLS),
+    joins=" ".join(
+        f"LEFT JOIN (SELECT shift_id, COUNT(*) AS n FROM {t} GROUP BY shift_id) {c} ON {c}.shift_id=sh.id"
+        for t, c in COUNTERS.items()
+    ),
+)
+
+
+def bump(cur, shift_id, table, n=1):
+    """Add `n` to the counter for `table` on `shift_id` (upserting the row).
+
+    Call inside the same `with db() as cur:` block as the INSERT it accounts
+    for, so the counter commits or rolls back together with the activity."""
+    if not n:
+        return
+    col = COUNTERS[table]
+    cur.execute(
+        f"INSERT INTO shift_activity_counts (shift_id, {col}) VALUES (%s,%s) "
+        f"ON CONFLICT (shift_id) DO UPDATE SET {col}=shift_activity_counts.{col}+EXCLUDED.{col}, updated_at=NOW()",
+        (shift_id, n),
+    )
+
+
+def rebuild(cur, shift_ids=None):
+    """Recompute counters from the raw tables — all shifts, or only `shift_ids`.
+    Returns the number of rows written."""
+    sql, params = _LIVE_SQL, ()
+    if shift_ids:
+        sql += " WHERE sh.id = ANY(%s::uuid[])"
+        params = ([str(s) for s in shift_ids],)
+    cur.execute(
+        f"INSERT INTO shift_activity_counts (shift_id, {', '.join(_COLS)}) {sql} "
+        f"ON CONFLICT (shift_id) DO UPDATE SET {', '.join(f'{c}=EXCLUDED.{c}' for c in _COLS)}, updated_at=NOW()",
+        params,
+    )
+    return cur.rowcount
+
+
+def check(cur):
+    """Return [{shift_id, counter, stored, actual}] for every counter that
+    disagrees with the raw tables (a missing rollup row counts as all zeros)."""
+    cur.execute(f"""
+        SELECT live.*, {', '.join(f'COALESCE(c.{col},0)' for col in _COLS)}
+        FROM ({_LIVE_SQL}) live
+        LEFT JOIN shift_activity_counts c ON c.shift_id=live.id
+    """)
+    drift = []
+    width = len(_COLS)
+    for r in cur.fetchall():
+        actual, stored = r[1:1 + width], r[1 + width:]
+        for col, a, s in zip(_COLS, actual, stored):
+            if a != s:
+                drift.append({"shift_id": str(r[0]), "counter": col, "stored": s, "actual": a})
+    return drift
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain shift_activity_counts.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("init", help="create the table and backfill it")
+    rb = sub.add_parser("rebuild", help="recompute counters from the raw tables")
+    rb.add_argument("shift_ids", nargs="*")
+    ck = sub.add_parser("check", help="compare counters against the raw tables")
+    ck.add_argument("--fix", action="store_true", help="rebuild drifted shifts")
+    args = parser.parse_args(argv)
+
+    init_pool()
+
+    with db() as cur:
+        if args.cmd == "init":
+            cur.execute(SCHEMA)
+            print(f"✅ shift_activity_counts ready ({rebuild(cur)} shifts backfilled)")
+        elif args.cmd == "rebuild":
+            print(f"✅ rebuilt {rebuild(cur, args.shift_ids)} shift(s)")
+        else:
+            drift = check(cur)
+            for d in drift:
+                print(f"  {d['shift_id']} {d['counter']}: stored={d['stored']} actual={d['actual']}")
+            if not drift:
+                print("✅ counters consistent")
+                return 0
+            print(f"⚠️  {len(drift)} counter(s) drifted")
+            if args.fix:
+                print(f"✅ rebuilt {rebuild(cur, {d['shift_id'] for d in drift})} shift(s)")
+                return 0
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,317 @@
 import os
+import threading
+import time
 import pytz
+import psycopg2
+import psycopg2.extensions
 import psycopg2.pool
+from collections import deque
 from contextlib import contextmanager
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+import metrics
 
 IST = pytz.timezone("Asia/Kolkata")
+# India has no DST, so formatting can use a plain fixed offset instead of pytz.
+_IST_OFFSET = timezone(timedelta(hours=5, minutes=30), "IST")
 _pool = None
+_replica = None  # BlockingPool on DATABASE_REPLICA_URL, when configured
+
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "30"))      # seconds behind before reads go to the primary
+REPLICA_LAG_CHECK = float(os.getenv("DB_REPLICA_LAG_CHECK", "5"))   # how often to re-measure
+REPLICA_RETRY = float(os.getenv("DB_REPLICA_RETRY", "30"))          # back-off after the replica fails
+_replica_state = {"lag": None, "checked": 0.0, "down_until": 0.0, "lagging": False}
+_replica_lock = threading.Lock()
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+# (replay_timestamp alone grows while the primary is idle).
+_LAG_SQL = """
+    SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """No connection became free within DB_POOL_TIMEOUT seconds."""
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Reports every statement's time and row count to `metrics`."""
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metrics.observe_statement(sql, time.perf_counter() - start, self.rowcount)
+
+    def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            metrics.observe_statement(sql, time.perf_counter() - start, self.rowcount)
+
+
+class BlockingPool:
+    """Thread-safe connection pool. `getconn` waits up to `timeout` seconds for a
+    free connection instead of failing as soon as `maxconn` are checked out.
+
+    Idle connections are checked before being handed out: closed ones are
+    dropped, and ones idle longer than `ping_after` seconds get a `SELECT 1`
+    (Azure silently drops idle SSL connections), so callers only ever see a
+    live connection. Connections that broke mid-request are discarded on
+    return rather than pooled again.
+    """
+
+    def __init__(self, minconn, maxconn, dsn, timeout=10.0, ping_after=30.0, **kwargs):
+        self.minconn, self.maxconn = minconn, maxconn
+        self.timeout, self.ping_after = timeout, ping_after
+        self._dsn, self._kwargs = dsn, kwargs
+        self._cond = threading.Condition()
+        self._idle = deque()   # (conn, returned_at), most recently used on the right
+        self._in_use = 0
+        self._opening = 0      # connects in progress, counted against maxconn
+        self._waiting = 0
+        self._stats = {"checkouts": 0, "timeouts": 0, "discarded": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        return psycopg2.connect(self._dsn, **self._kwargs)
+
+    def _alive(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while not self._idle and self._in_use + self._opening >= self.maxconn:
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeout(f"no database connection free after {self.timeout:g}s "
+                                              f"({self._in_use} in use, max {self.maxconn})")
+                        self._cond.wait(left)
+                finally:
+                    self._waiting -= 1
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use += 1
+                else:
+                    conn, returned_at = None, None
+                    self._opening += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opening -= 1
+                    self._in_use += 1
+            elif not self._alive(conn, returned_at):
+                # Stale: drop it and go round again; the freed slot lets us open a new one.
+                self._discard(conn)
+                with self._cond:
+                    self._in_use -= 1
+                    self._stats["discarded"] += 1
+                continue
+
+            waited = (time.monotonic() - start) * 1000
+            metrics.observe_pool_wait(waited / 1000)
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_ms_total"] += waited
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        broken = close or conn.closed or conn.get_transaction_status() not in (
+            psycopg2.extensions.TRANSACTION_STATUS_IDLE,)
+        if broken:
+            self._discard(conn)
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def stats(self):
+        """Gauges (in_use, idle, waiting) and counters since start."""
+        with self._cond:
+            s = dict(self._stats)
+            s.update(in_use=self._in_use, idle=len(self._idle), waiting=self._waiting,
+                     max=self.maxconn, timeout_seconds=self.timeout)
+        s["wait_ms_avg"] = round(s["wait_ms_total"] / s["checkouts"], 2) if s["checkouts"] else 0.0
+        s["wait_ms_total"], s["wait_ms_max"] = round(s["wait_ms_total"], 2), round(s["wait_ms_max"], 2)
+        return s
+
+
+def _conn_kwargs():
+    return dict(
+        sslmode=os.getenv("DB_SSLMODE", "require"),
+        # TCP keepalives so a dead peer is noticed even while a connection sits idle
+        keepalives=1, keepalives_idle=60, keepalives_interval=10, keepalives_count=3,
+    )
+
+
+def connect():
+    """A dedicated connection outside the pool (e.g. for LISTEN)."""
+    return psycopg2.connect(os.getenv("DATABASE_URL"), **_conn_kwargs())
 
 
 def init_pool():
     global _pool
-    _pool = psycopg2.pool.SimpleConnectionPool(1, 20, os.getenv("DATABASE_URL"), sslmode="require")
-    print("✅ DB pool ready")
+    _pool = BlockingPool(
+        int(os.getenv("DB_POOL_MIN", "1")), int(os.getenv("DB_POOL_MAX", "20")), os.getenv("DATABASE_URL"),
+        timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        ping_after=float(os.getenv("DB_POOL_PING_AFTER", "30")),
+        cursor_factory=TimedCursor,
+        **_conn_kwargs(),
+    )
+    print(f"✅ DB pool ready (max {_pool.maxconn})")
+    replica = os.getenv("DATABASE_REPLICA_URL")
+    if replica:
+        global _replica
+        _replica = BlockingPool(
+            0, int(os.getenv("DB_REPLICA_POOL_MAX", os.getenv("DB_POOL_MAX", "20"))), replica,
+            timeout=float(os.getenv("DB_REPLICA_POOL_TIMEOUT", "2")),
+            ping_after=float(os.getenv("DB_POOL_PING_AFTER", "30")),
+            cursor_factory=TimedCursor,
+            **_conn_kwargs(),
+        )
+        print(f"✅ Replica pool ready (max {_replica.maxconn}, reads fall back past {REPLICA_MAX_LAG:g}s lag)")
+
+
+def pool_stats():
+    if not _pool:
+        return {}
+    s = _pool.stats()
+    if _replica:
+        with _replica_lock:
+            lag, down = _replica_state["lag"], time.monotonic() < _replica_state["down_until"]
+        s["replica"] = {**_replica.stats(), "lag_seconds": lag, "down": down}
+    return s
+
+
+def _replica_conn():
+    """A replica connection at most REPLICA_MAX_LAG behind, or None to use the primary."""
+    now = time.monotonic()
+    with _replica_lock:
+        if _replica is None or now < _replica_state["down_until"]:
+            return None
+        measure = now - _replica_state["checked"] >= REPLICA_LAG_CHECK
+        if not measure and _replica_state["lagging"]:
+            return None
+        if measure:
+            _replica_state["checked"] = now  # one thread measures, the rest use the last value
+    conn = None
+    try:
+        conn = _replica.getconn()
+        if measure:
+            with conn.cursor() as cur:
+                cur.execute(_LAG_SQL)
+                lag = float(cur.fetchone()[0])
+            conn.commit()
+    except PoolTimeout:
+        # Saturated, not down: this read goes to the primary, the next one tries again.
+        if measure:
+            with _replica_lock:
+                _replica_state["checked"] = 0.0
+        return None
+    except psycopg2.Error as e:
+        if conn is not None:
+            _replica.putconn(conn, close=True)
+        with _replica_lock:
+            _replica_state["down_until"] = now + REPLICA_RETRY
+            _replica_state["checked"] = 0.0  # measure again before trusting it
+        print(f"⚠️ replica unavailable, reading from the primary for {REPLICA_RETRY:g}s: {e}", flush=True)
+        return None
+    with _replica_lock:
+        if measure:
+            _replica_state["lag"] = round(lag, 3)
+            lagging = lag > REPLICA_MAX_LAG
+            if lagging != _replica_state["lagging"]:
+                print(f"{'⚠️ replica' if lagging else '✅ replica caught up,'} {lag:.1f}s behind", flush=True)
+            _replica_state["lagging"] = lagging
+        lagging = _replica_state["lagging"]
+    if lagging:
+        _replica.putconn(conn)
+        return None
+    return conn
 
 
 @contextmanager
-def db():
-    """Usage:  with db() as cur:  cur.execute(...)"""
-    conn = _pool.getconn()
+def db(name=None, itersize=None, readonly=False):
+    """Usage:  with db() as cur:  cur.execute(...)
+
+    `name` opens a server-side cursor that fetches `itersize` rows per round
+    trip while iterated, for results too large to hold in memory.
+
+    `readonly=True` reads from the replica (DATABASE_REPLICA_URL) when one is
+    configured, reachable and no more than DB_REPLICA_MAX_LAG seconds behind,
+    and from the primary otherwise. Only for reads that tolerate that lag:
+    anything cached against live.notify events must stay on the primary."""
+    pool = _pool
+    conn = _replica_conn() if readonly else None
+    if conn is not None:
+        pool = _replica
+    else:
+        conn = _pool.getconn()
+    cur, broken = None, False
     try:
-        cur = conn.cursor()
+        cur = conn.cursor(name=name) if name else conn.cursor()
+        if itersize:
+            cur.itersize = itersize
         yield cur
+        if name:
+            cur.close()  # a server-side cursor dies with its transaction; close it first
         conn.commit()
-    except Exception:
-        conn.rollback()
+    except BaseException:  # includes GeneratorExit when a streamed response is abandoned
+        # psycopg2 marks the connection closed when the server side went away
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
         raise
     finally:
-        cur.close()
-        _pool.putconn(conn)
+        if cur is not None and not cur.closed and not name:
+            try:
+                cur.close()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
 
 
 def to_ist(dt):
@@ -35,4 +319,4 @@ def to_ist(dt):
         return None
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(IST).isoformat()
\ No newline at end of file
+    return dt.astimezone(_IST_OFFSET).isoformat()
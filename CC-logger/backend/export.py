@@ -0,0 +1,138 @@
+"""Streaming exports behind /manager/export.
+
+Rows come off a server-side (named) cursor ITERSIZE at a time and are encoded
+as CSV or NDJSON chunk by chunk, so memory stays flat however long the range
+is, and the header goes out before the query has produced anything.
+
+Each streaming export keeps a pooled connection checked out until the last
+row is sent, so at most EXPORT_MAX_CONCURRENT (default 2) run per process;
+past that, reserve() raises ExportBusy and the route answers 503 rather than
+letting slow downloads starve the pool.
+
+Tables: `shifts` (with per-shift activity counts) and every activity list in
+activities.KINDS (tickets, alerts, incidents, ...), each row carrying its
+shift and agent.
+"""
+import csv
+import io
+import os
+import threading
+import uuid
+
+import fastjson
+from activities import KINDS
+from counters import COUNTERS
+from db import db, to_ist
+
+ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "2000"))
+MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+_SHIFT_COUNTS = list(COUNTERS.values())
+
+SHIFT_FIELDS = ["shift_id", "agent_id", "agent_name", "login_time", "logout_time", "duration_hours",
+                "triaged_count", "zd_ticket_count"] + _SHIFT_COUNTS
+
+_SHIFTS_SQL = f"""
+    SELECT s.id::text, s.agent_id::text, COALESCE(ag.name,'Unknown Agent'), s.login_time, s.logout_time,
+           ROUND((EXTRACT(EPOCH FROM (COALESCE(s.logout_time,NOW())-s.login_time))/3600)::numeric, 2)::float,
+           COALESCE(s.triaged_count,0), COALESCE(s.zd_ticket_count,0),
+           {", ".join(f"COALESCE(c.{col},0)" for col in _SHIFT_COUNTS)}
+    FROM shifts s
+    LEFT JOIN agents ag ON ag.id=s.agent_id
+    LEFT JOIN shift_activity_counts c ON c.shift_id=s.id
+    WHERE {{where}}
+    ORDER BY s.login_time, s.id
+"""
+
+_ACTIVITY_SQL = """
+    SELECT t.shift_id::text, s.agent_id::text, COALESCE(ag.name,'Unknown Agent'), t.created_at, {cols}
+    FROM {table} t
+    JOIN shifts s ON s.id=t.shift_id
+    LEFT JOIN agents ag ON ag.id=s.agent_id
+    WHERE {where}
+    ORDER BY t.created_at
+"""
+
+# name -> (fields, sql template, timestamp column, indexes of timestamp fields)
+TABLES = {"shifts": (SHIFT_FIELDS, _SHIFTS_SQL, "s.login_time", (3, 4))}
+for key, table, cols, fields in KINDS:
+    TABLES[key] = (
+        ["shift_id", "agent_id", "agent_name", "created_at", *fields],
+        _ACTIVITY_SQL.replace("{table}", table).replace("{cols}", ", ".join(f"t.{c}" for c in cols)),
+        "t.created_at", (3,),
+    )
+
+
+class ExportBusy(RuntimeError):
+    """Every export slot is taken by a download still streaming."""
+
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+
+def reserve():
+    """Take an export slot without waiting and return the function that gives
+    it back (safe to call twice). Raises ExportBusy when none is free."""
+    if not _slots.acquire(blocking=False):
+        raise ExportBusy(f"Too many exports running (limit {MAX_CONCURRENT}), retry shortly")
+    held = [True]
+
+    def release():
+        if held and held.pop():
+            _slots.release()
+    return release
+
+
+def rows(table, date_from=None, date_to=None, agent_id=None):
+    """Yield the rows of `table` (tuples in TABLES[table][0] order) through a
+    server-side cursor. date_to is inclusive."""
+    fields, sql, ts, stamps = TABLES[table]
+    where, params = ["TRUE"], {}
+    if date_from:
+        where.append(f"{ts}>=%(lo)s"); params["lo"] = date_from
+    if date_to:
+        where.append(f"{ts}<%(hi)s::date + 1"); params["hi"] = date_to
+    if agent_id:
+        where.append("s.agent_id=%(agent)s"); params["agent"] = agent_id
+    with db(name=f"export_{uuid.uuid4().hex}", itersize=ITERSIZE, readonly=True) as cur:
+        cur.execute(sql.replace("{where}", " AND ".join(where)), params)
+        for r in cur:
+            r = list(r)
+            for i in stamps:
+                r[i] = to_ist(r[i])
+            yield r
+
+
+def _chunks(lines):
+    """Group encoded lines so each yield is a reasonably sized write."""
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= 500:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+def csv_stream(table, **filters):
+    out = io.StringIO()
+    w = csv.writer(out)
+
+    def line(row):
+        out.seek(0); out.truncate()
+        w.writerow(row)
+        return out.getvalue()
+
+    yield line(TABLES[table][0])
+    yield from _chunks(line(r) for r in rows(table, **filters))
+
+
+def ndjson_stream(tables, **filters):
+    multi = len(tables) > 1
+    for table in tables:
+        fields = TABLES[table][0]
+        yield from _chunks(
+            fastjson.dumps({"table": table, **dict(zip(fields, r))} if multi else dict(zip(fields, r))) + "\n"
+            for r in rows(table, **filters)
+        )
@@ -0,0 +1,52 @@
+"""JSON encoding for jsonify() responses (app.json) and the SSE / NDJSON streams.
+
+Uses orjson when it is installed and the stdlib json otherwise; JSON_ENCODER=std
+forces the stdlib. The output is the same either way: compact, keys in
+insertion order, and anything JSON has no type for (datetime, date, Decimal,
+UUID, dataclasses) goes through Flask's default conversion, as before.
+"""
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODER = os.getenv("JSON_ENCODER", "orjson").strip().lower()
+if ENCODER == "orjson" and orjson is None:
+    ENCODER = "std"
+
+_default = DefaultJSONProvider.default
+# Datetimes go to _default so they keep Flask's format; int keys become strings like json's.
+_OPTS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def dumpb(obj):
+    """Compact JSON as UTF-8 bytes."""
+    if ENCODER == "orjson":
+        try:
+            return orjson.dumps(obj, default=_default, option=_OPTS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. ints past 64 bits; the stdlib copes
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps(obj):
+    return dumpb(obj).decode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return super().dumps(obj, **kwargs) if kwargs else dumps(obj)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumpb(obj) + b"\n", mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = FastJSONProvider(app)
+    print(f"✅ JSON encoder: {ENCODER}")
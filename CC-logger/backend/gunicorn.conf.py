@@ -0,0 +1,48 @@
+"""Gunicorn settings — startup.txt runs `gunicorn -c gunicorn.conf.py app:app`.
+
+gthread workers: each worker serves GUNICORN_THREADS requests at once, so a
+request stuck on Zendesk (or an open /manager/stream) holds one thread, not
+the whole worker. Everything the app shares between requests (BlockingPool,
+TTLCache, the live listener, the triage buffer) is thread-safe, and
+psycopg2 releases the GIL while it waits on Postgres.
+
+Threads are budgeted so the agent write path always has some left:
+ZENDESK_MAX_INFLIGHT requests per worker may be waiting on Zendesk and
+LIVE_MAX_STREAMS on SSE; anything beyond gets a quick 503 instead of a
+thread. The DB pool is sized to the thread count plus the analytics section
+workers, so a thread never waits for a connection another thread isn't using.
+"""
+import os
+
+from dotenv import load_dotenv
+
+# Load .env first so its values win over the defaults derived below.
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "24"))
+
+# With gthread the timeout is the worker's heartbeat, not a per-request limit,
+# so long SSE streams and exports are fine.
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# Not preloaded: app.py starts the pool and background threads at import,
+# and those have to be created in each worker, after the fork.
+preload_app = False
+
+os.environ.setdefault("ZENDESK_MAX_INFLIGHT", str(max(2, threads // 6)))
+os.environ.setdefault("LIVE_MAX_STREAMS", str(max(2, threads // 3)))
+os.environ.setdefault("DB_POOL_MAX", str(threads + int(os.getenv("ANALYTICS_WORKERS", "4")) + 2))
+
+
+def worker_exit(server, worker):
+    # Write buffered triage clicks before the worker goes away.
+    try:
+        import active_shifts
+        active_shifts.flush()
+    except Exception as e:
+        print(f"[gunicorn] triage flush on exit failed: {e}", flush=True)
@@ -0,0 +1,195 @@
+"""Live change feed behind /manager/stream.
+
+The agent endpoints call `notify()` inside their write transaction, so
+Postgres delivers a NOTIFY on `manager_events` when (and only if) the write
+commits. Each worker runs one listener thread on a dedicated connection and
+hands every burst of notifications to the callbacks registered with
+`on_events`. The dashboard Hub reloads its snapshot once per burst, diffs it
+against the previous one and pushes the delta to every connected dashboard's
+queue.
+Open tabs only read their queue, so database load follows the write rate, not
+the number of viewers.
+
+A periodic resync (LIVE_RESYNC seconds) catches changes that don't notify,
+such as bulk imports or fixes made directly in the database.
+"""
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+from db import connect
+
+CHANNEL = "manager_events"
+DEBOUNCE = float(os.getenv("LIVE_DEBOUNCE", "0.25"))   # gather a burst into one reload
+RESYNC = float(os.getenv("LIVE_RESYNC", "60"))
+HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
+QUEUE_SIZE = 100
+MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", "8"))  # each open stream holds a worker thread
+
+
+def notify(cur, event, shift_id=None, **extra):
+    """Queue a change event; delivered to listeners when the transaction commits."""
+    payload = {"event": event, **extra}
+    if shift_id is not None:
+        payload["shift_id"] = str(shift_id)
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, json.dumps(payload)))
+
+
+def _agent_key(a):
+    # hours_active moves every second; clients derive it from login_time
+    return {k: v for k, v in a.items() if k != "hours_active"}
+
+
+def diff(old, new):
+    """Delta between two snapshots: agents upserted / removed, analytics if changed."""
+    before = {a["shift_id"]: _agent_key(a) for a in old["active_agents"]}
+    after = {a["shift_id"]: a for a in new["active_agents"]}
+    delta = {
+        "upsert": [a for sid, a in after.items() if before.get(sid) != _agent_key(a)],
+        "removed": [sid for sid in before if sid not in after],
+    }
+    if old["analytics"] != new["analytics"]:
+        delta["analytics"] = new["analytics"]
+    return delta if delta["upsert"] or delta["removed"] or "analytics" in delta else None
+
+
+def _drain(q):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+
+# ── listener ──────────────────────────────────────────────────────────────────
+
+_callbacks = []
+_connected = threading.Event()
+_thread = None
+_lock = threading.Lock()
+
+
+def on_events(fn):
+    """Register fn(events) to run on the listener thread for every burst of
+    notifications. fn(None) means events may have been missed (reconnect,
+    periodic resync): drop anything derived from them."""
+    _callbacks.append(fn)
+    return fn
+
+
+def connected():
+    """True while the listener holds its LISTEN; caches should bypass themselves otherwise."""
+    return _connected.is_set()
+
+
+def _dispatch(events):
+    for fn in list(_callbacks):
+        try:
+            fn(events)
+        except Exception as e:
+            print(f"[live] {getattr(fn, '__qualname__', fn)} failed: {e}", flush=True)
+
+
+def _run():
+    while True:
+        conn = None
+        try:
+            conn = connect()
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+            _connected.set()
+            _dispatch(None)  # anything missed while (re)connecting
+            last = time.monotonic()
+            while True:
+                if select.select([conn], [], [], max(0.0, RESYNC - (time.monotonic() - last))) == ([], [], []):
+                    _dispatch(None)
+                    last = time.monotonic()
+                    continue
+                time.sleep(DEBOUNCE)
+                conn.poll()
+                events = []
+                while conn.notifies:
+                    try:
+                        events.append(json.loads(conn.notifies.pop(0).payload))
+                    except ValueError:
+                        pass
+                if events:
+                    _dispatch(events)
+        except Exception as e:
+            print(f"[live] listener error: {e}", flush=True)
+            time.sleep(5)
+        finally:
+            _connected.clear()
+            if conn is not None:
+                conn.close()
+
+
+def start():
+    """Start this process's listener thread (idempotent)."""
+    global _thread
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="live-listener", daemon=True)
+            _thread.start()
+    return _thread
+
+
+# ── dashboard fan-out ─────────────────────────────────────────────────────────
+
+class Hub:
+    """One snapshot per process, fanned out to subscriber queues.
+
+    `load` returns {"active_agents": [...], "analytics": {...}}. The snapshot is
+    only kept (and reloaded on events) while someone is subscribed."""
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._subs = set()
+        self._snapshot = None
+        self._version = 0
+        on_events(self._on_events)
+
+    def subscribe(self):
+        """Returns (queue, snapshot, version). The queue receives (kind, payload)."""
+        start()
+        q = queue.Queue(QUEUE_SIZE)
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._load()
+            self._subs.add(q)
+            return q, self._snapshot, self._version
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subs.discard(q)
+            if not self._subs:
+                self._snapshot = None
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subs)
+
+    def _on_events(self, events):
+        with self._lock:
+            if not self._subs:
+                return
+        new = self._load()
+        with self._lock:
+            old, self._snapshot = self._snapshot, new
+            delta = diff(old, new) if old else None
+            if not delta:
+                return
+            self._version += 1
+            msg = ("delta", {"version": self._version, "events": events or [], **delta})
+            for q in list(self._subs):
+                try:
+                    q.put_nowait(msg)
+                except queue.Full:
+                    # Too far behind to catch up from deltas: make it start over.
+                    self._subs.discard(q)
+                    _drain(q)
+                    q.put_nowait(("reset", None))
@@ -0,0 +1,221 @@
+"""Request, database and Zendesk timings.
+
+`init_app` times every request per route; `db()` cursors report each
+statement (time, rows), the pool reports checkout waits and the Zendesk client
+reports upstream calls. Everything lands in:
+
+  * `/metrics` — Prometheus text format. Values are per worker process.
+    Scrapers send `Authorization: Bearer $METRICS_TOKEN`; unset, it is off.
+  * a `Server-Timing` header on each response (app, db, pool, zendesk), which
+    shows up in the browser's network panel.
+
+Statements slower than SLOW_QUERY_MS (default 500, 0 = off) are logged with
+the route that ran them.
+"""
+import bisect
+import contextvars
+import os
+import re
+import threading
+import time
+
+from flask import g, request
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, s in sorted(series.items()):
+            base = _labels(self.labels, labels)
+            acc = 0
+            for bound, n in zip(self.buckets, s):
+                acc += n
+                out.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound:g}"}} {acc}')
+            out.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {s[-1]}')
+            out.append(f"{self.name}_sum{{{base}}} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{{{base}}} {s[-1]}")
+        return out
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, n, *labels):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + n
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for labels, n in sorted(series.items()):
+            out.append(f"{self.name}{{{_labels(self.labels, labels)}}} {n}")
+        return out
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in zip(names, values))
+
+
+http_seconds = Histogram("http_request_duration_seconds", "Request latency until the response is returned.",
+                         ("method", "route", "status"), HTTP_BUCKETS)
+db_seconds = Histogram("db_statement_duration_seconds", "SQL statement execution time.",
+                       ("route", "statement"), DB_BUCKETS)
+db_rows = Counter("db_statement_rows_total", "Rows returned or affected by SQL statements.", ("route", "statement"))
+pool_wait_seconds = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection.",
+                              ("route",), DB_BUCKETS)
+zendesk_seconds = Histogram("zendesk_request_duration_seconds", "Zendesk API call time.",
+                            ("endpoint", "status"), HTTP_BUCKETS)
+slow_queries = Counter("db_slow_statements_total", "Statements slower than SLOW_QUERY_MS.", ("route", "statement"))
+
+_ALL = (http_seconds, db_seconds, db_rows, slow_queries, pool_wait_seconds, zendesk_seconds)
+
+
+# ── per-request totals (Server-Timing) ────────────────────────────────────────
+
+class _Request:
+    __slots__ = ("route", "db", "queries", "pool", "zendesk", "zendesk_calls")
+
+    def __init__(self, route):
+        self.route = route
+        self.db = self.pool = self.zendesk = 0.0
+        self.queries = self.zendesk_calls = 0
+
+
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+
+def _route():
+    r = _current.get()
+    return r.route if r else "background"
+
+
+_STATEMENT = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([a-z_][a-z0-9_]*)", re.I)
+
+
+def statement_label(sql):
+    """'SELECT shifts', 'INSERT alerts', ... — bounded cardinality for labels."""
+    text = sql.decode() if isinstance(sql, bytes) else str(sql)
+    words = text.split(None, 1)
+    op = words[0].upper() if words else "?"
+    m = _STATEMENT.search(text)
+    return f"{op} {m.group(1).lower()}" if m else op
+
+
+def observe_statement(sql, seconds, rows):
+    route, label = _route(), statement_label(sql)
+    db_seconds.observe(seconds, route, label)
+    if rows and rows > 0:
+        db_rows.inc(rows, route, label)
+    r = _current.get()
+    if r:
+        r.db += seconds
+        r.queries += 1
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(1, route, label)
+        text = " ".join((sql.decode() if isinstance(sql, bytes) else str(sql)).split())
+        print(f"🐢 slow query {seconds * 1000:.0f}ms [{route}] {text[:500]}", flush=True)
+
+
+def observe_pool_wait(seconds):
+    pool_wait_seconds.observe(seconds, _route())
+    r = _current.get()
+    if r:
+        r.pool += seconds
+
+
+def observe_zendesk(endpoint, status, seconds):
+    zendesk_seconds.observe(seconds, endpoint, status or "error")
+    r = _current.get()
+    if r:
+        r.zendesk += seconds
+        r.zendesk_calls += 1
+
+
+# ── Flask wiring ──────────────────────────────────────────────────────────────
+
+def init_app(app):
+    @app.before_request
+    def _start():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _current.set(_Request(request.url_rule.rule if request.url_rule else "unmatched"))
+
+    @app.after_request
+    def _finish(response):
+        start = g.pop("metrics_start", None)
+        r = _current.get()
+        if start is None or r is None:
+            return response
+        elapsed = time.perf_counter() - start
+        http_seconds.observe(elapsed, request.method, r.route, response.status_code)
+        timing = [f"app;dur={elapsed * 1000:.1f}", f'db;dur={r.db * 1000:.1f};desc="{r.queries} queries"']
+        if r.pool >= 0.0005:
+            timing.append(f"pool;dur={r.pool * 1000:.1f}")
+        if r.zendesk_calls:
+            timing.append(f'zendesk;dur={r.zendesk * 1000:.1f};desc="{r.zendesk_calls} calls"')
+        response.headers["Server-Timing"] = ", ".join(timing)
+        return response
+
+    @app.teardown_request
+    def _reset(_exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:  # streamed responses finish in another context
+                pass
+
+
+def render():
+    """The Prometheus exposition of every metric, plus pool gauges."""
+    from db import pool_stats  # db imports this module
+    pool = pool_stats()
+    lines = []
+    for m in _ALL:
+        lines += m.render()
+    for key, help in (("in_use", "Connections checked out."), ("idle", "Idle pooled connections."),
+                      ("waiting", "Threads waiting for a connection."), ("max", "Pool size limit.")):
+        value = pool.get(key)
+        if value is not None:
+            lines += [f"# HELP db_pool_{key} {help}", f"# TYPE db_pool_{key} gauge", f"db_pool_{key} {value}"]
+    for key in ("checkouts", "timeouts", "discarded"):
+        value = pool.get(key)
+        if value is not None:
+            lines += [f"# TYPE db_pool_{key}_total counter", f"db_pool_{key}_total {value}"]
+    replica = pool.get("replica")
+    if replica:
+        lines += ["# HELP db_replica_lag_seconds Replica replay lag at the last check.",
+                  "# TYPE db_replica_lag_seconds gauge", f"db_replica_lag_seconds {replica['lag_seconds'] or 0}",
+                  "# TYPE db_replica_pool_in_use gauge", f"db_replica_pool_in_use {replica['in_use']}",
+                  "# TYPE db_replica_down gauge", f"db_replica_down {int(replica['down'])}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,172 @@
+"""Versioned schema migrations.
+
+Each entry in MIGRATIONS runs once, in order, in its own transaction, and is
+recorded in `schema_migrations`. A session advisory lock, held for the whole
+run, keeps two processes (e.g. two instances deploying together) from
+applying the same version twice. Migrations are SQL strings or callables
+taking a cursor, or NonTransactional steps: index builds on populated tables
+use CREATE INDEX CONCURRENTLY so deploys don't block writes, and that can't
+run inside a transaction.
+
+    python migrations.py          # apply pending migrations
+    python migrations.py status   # list applied / pending versions
+
+The indexes in 4 back the hot queries: activity lists and counters
+(shift_id, created_at), per-agent shift history (agent_id, login_time), the
+active-shift lookups (partial, logout_time IS NULL), date-range analytics
+(login_time / created_at) and login by email (LOWER(email)).
+"""
+import re
+import sys
+import time
+
+if __name__ == "__main__":  # before the imports below read their settings
+    from dotenv import load_dotenv
+    load_dotenv()
+
+import bulk
+import counters
+import rollups
+import zendesk_sync
+from db import connect, db, init_pool
+
+LOCK_KEY = 774400102  # pg advisory lock id while migrating
+
+ACTIVITY_TABLES = list(counters.COUNTERS)
+
+
+class NonTransactional:
+    """A step whose statements run one by one in autocommit (CREATE / DROP INDEX
+    CONCURRENTLY). Each statement must be safe to rerun: a deploy that dies
+    halfway runs the whole step again."""
+
+    def __init__(self, sql):
+        self.statements = [q.strip() for q in sql.split(";") if q.strip()]
+
+
+def _activity_counts(cur):
+    cur.execute(counters.SCHEMA)
+    counters.rebuild(cur)
+
+
+_INDEXES = "\n".join(
+    [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {t}_shift_created_idx ON {t} (shift_id, created_at);" for t in ACTIVITY_TABLES]
+    # analytics filter these by created_at alone; handovers are listed newest first
+    + [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {t}_created_idx ON {t} (created_at);"
+       for t in ("alerts", "tickets", "dialpad_tickets", "incident_status", "handovers")]
+) + """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shifts_agent_login_idx ON shifts (agent_id, login_time);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shifts_login_idx ON shifts (login_time);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shifts_active_idx ON shifts (agent_id, login_time DESC) WHERE logout_time IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS agents_email_lower_idx ON agents (LOWER(email));
+"""
+
+# /manager/shifts and /manager/handovers page on (time, id); these replace the
+# single-column time indexes, which they cover for range scans too.
+_KEYSET_INDEXES = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shifts_login_id_idx ON shifts (login_time, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS handovers_created_id_idx ON handovers (created_at, id);
+DROP INDEX CONCURRENTLY IF EXISTS shifts_login_idx;
+DROP INDEX CONCURRENTLY IF EXISTS handovers_created_idx;
+"""
+
+# (version, name, sql, callable or NonTransactional) — append only; never edit an applied entry.
+MIGRATIONS = [
+    (1, "shift activity counters", _activity_counts),
+    (2, "zendesk sync tables", zendesk_sync.SCHEMA),
+    (3, "tickets unique per shift", bulk.init),
+    (4, "hot-path indexes", NonTransactional(_INDEXES)),
+    (5, "analytics rollups", rollups.init),
+    (6, "keyset pagination indexes", NonTransactional(_KEYSET_INDEXES)),
+]
+
+_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    applied_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+
+def applied(cur):
+    cur.execute(_TABLE)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in cur.fetchall()}
+
+
+def _lock(conn):
+    """Take the migration lock for this session. Polls rather than blocking in
+    pg_advisory_lock: a backend waiting inside a statement holds a snapshot,
+    and CREATE INDEX CONCURRENTLY in the lock holder would wait for it."""
+    with conn.cursor() as cur:
+        while True:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (LOCK_KEY,))
+            if cur.fetchone()[0]:
+                return
+            time.sleep(1)
+
+
+def _drop_invalid(cur, sql):
+    """A CONCURRENTLY build that failed leaves an INVALID index behind, which
+    IF NOT EXISTS would then skip; drop it so the build runs again."""
+    m = re.match(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)", sql)
+    if not m:
+        return
+    cur.execute("SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid=i.indexrelid "
+                "WHERE c.relname=%s AND NOT i.indisvalid", (m.group(1),))
+    if cur.fetchone():
+        print(f"⚠️ dropping invalid index {m.group(1)} left by an earlier build", flush=True)
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {m.group(1)}")
+
+
+def _apply(conn, version, name, step):
+    record = ("INSERT INTO schema_migrations (version, name) VALUES (%s,%s)", (version, name))
+    if isinstance(step, NonTransactional):
+        with conn.cursor() as cur:
+            for sql in step.statements:
+                _drop_invalid(cur, sql)
+                cur.execute(sql)
+            cur.execute(*record)
+        return
+    with db() as cur:
+        if callable(step):
+            step(cur)
+        else:
+            cur.execute(step)
+        cur.execute(*record)
+
+
+def migrate():
+    """Apply pending migrations. Returns the versions applied."""
+    done = []
+    conn = connect()  # dedicated, autocommit: holds the lock and runs NonTransactional steps
+    try:
+        conn.autocommit = True
+        _lock(conn)
+        with conn.cursor() as cur:
+            already = applied(cur)
+        for version, name, step in MIGRATIONS:
+            if version in already:
+                continue
+            _apply(conn, version, name, step)
+            print(f"✅ migration {version}: {name}")
+            done.append(version)
+    finally:
+        conn.close()  # ends the session, releasing the lock
+    return done
+
+
+if __name__ == "__main__":
+    init_pool()
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if cmd == "up":
+        print(f"✅ schema up to date ({len(migrate())} applied)")
+    elif cmd == "status":
+        with db() as cur:
+            done = applied(cur)
+        for version, name, _ in MIGRATIONS:
+            print(f"  {'applied' if version in done else 'pending'}  {version}: {name}")
+    else:
+        print("usage: python migrations.py [up|status]")
+        sys.exit(2)
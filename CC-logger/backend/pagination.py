@@ -0,0 +1,19 @@
+"""Opaque pagination cursors.
+
+A cursor is the sort key of the last row a client has seen, JSON-encoded and
+base64url'd so clients treat it as a token rather than something to build.
+"""
+import base64
+import json
+
+
+def encode(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode(cursor):
+    """The key inside `cursor`; raises ValueError when it is not one of ours."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
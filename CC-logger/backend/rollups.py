@@ -0,0 +1,253 @@
+"""Daily / hourly rollups behind /manager/advanced-analytics.
+
+`analytics_daily` holds one row per calendar day: shift totals by login day
+(shifts, triaged, Zendesk tickets, the agents who worked) and activity
+volumes by created_at day (incidents, tickets, dialpad). `analytics_hourly`
+holds shift totals per (day, hour). Days before today rarely change after the
+fact, so the endpoint reads settled days from here and aggregates live only
+the days the last refresh may have missed (today, yesterday just after
+midnight, days with open or recently changed shifts, queued dirty days) — a
+365-day range costs about what a 7-day one does.
+
+A background thread refreshes the days that can have changed since the last
+run: today (and any day crossed since), login days of shifts that are
+active, ended, or had activity logged, and days queued in
+`analytics_dirty_days` (deletions, back-dated writes).
+
+    python rollups.py rebuild   # recompute every day that has data
+    python rollups.py refresh   # one incremental refresh in the foreground
+"""
+import os
+import sys
+import threading
+import time
+
+if __name__ == "__main__":  # before the imports below read their settings
+    from dotenv import load_dotenv
+    load_dotenv()
+
+from db import db, init_pool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_daily (
+    day           DATE PRIMARY KEY,
+    shifts        INTEGER NOT NULL DEFAULT 0,
+    triaged       BIGINT  NOT NULL DEFAULT 0,
+    zd_tickets    BIGINT  NOT NULL DEFAULT 0,
+    agent_ids     UUID[]  NOT NULL DEFAULT '{}',
+    incidents     INTEGER NOT NULL DEFAULT 0,
+    tickets       INTEGER NOT NULL DEFAULT 0,
+    dialpad       INTEGER NOT NULL DEFAULT 0,
+    refreshed_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS analytics_hourly (
+    day     DATE NOT NULL,
+    hour    SMALLINT NOT NULL,
+    shifts  INTEGER NOT NULL,
+    triaged BIGINT  NOT NULL,
+    agents  INTEGER NOT NULL,
+    PRIMARY KEY (day, hour)
+);
+CREATE TABLE IF NOT EXISTS analytics_dirty_days (day DATE PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+    id            BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    refreshed_at  TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS shifts_logout_idx ON shifts (logout_time);
+CREATE INDEX IF NOT EXISTS shift_activity_counts_updated_idx ON shift_activity_counts (updated_at);
+"""
+
+LOCK_KEY = 774400103  # pg advisory lock id for the refresher
+INTERVAL = float(os.getenv("ANALYTICS_ROLLUP_INTERVAL", "300"))
+# Writes committing while a refresh runs carry timestamps from before it started.
+SLACK = "10 minutes"
+
+# Aggregate the days in {days} (a date[] expression) straight from the raw
+# tables. Each day is a range over login_time / created_at so the indexes apply.
+_DAILY_LIVE = """
+SELECT d.day, COALESCE(s.shifts,0) AS shifts, COALESCE(s.triaged,0) AS triaged, COALESCE(s.zd,0) AS zd_tickets,
+       COALESCE(s.agent_ids,'{{}}') AS agent_ids, COALESCE(i.n,0) AS incidents, COALESCE(t.n,0) AS tickets,
+       COALESCE(p.n,0) AS dialpad
+FROM unnest({days}) AS d(day)
+LEFT JOIN LATERAL (
+    SELECT COUNT(*) AS shifts, SUM(COALESCE(sh.triaged_count,0)) AS triaged,
+           SUM(COALESCE(c.ticket_cnt,0)) AS zd,
+           ARRAY_AGG(DISTINCT sh.agent_id) FILTER (WHERE sh.agent_id IS NOT NULL) AS agent_ids
+    FROM shifts sh LEFT JOIN shift_activity_counts c ON c.shift_id=sh.id
+    WHERE sh.login_time>=d.day AND sh.login_time<d.day+1
+) s ON TRUE
+LEFT JOIN LATERAL (SELECT COUNT(*) AS n FROM incident_status WHERE created_at>=d.day AND created_at<d.day+1) i ON TRUE
+LEFT JOIN LATERAL (SELECT COUNT(*) AS n FROM tickets WHERE created_at>=d.day AND created_at<d.day+1) t ON TRUE
+LEFT JOIN LATERAL (SELECT COUNT(*) AS n FROM dialpad_tickets WHERE created_at>=d.day AND created_at<d.day+1) p ON TRUE
+"""
+
+_HOURLY_LIVE = """
+SELECT d.day, EXTRACT(HOUR FROM sh.login_time)::int, COUNT(*), SUM(COALESCE(sh.triaged_count,0)),
+       COUNT(DISTINCT sh.agent_id)
+FROM unnest({days}) AS d(day)
+JOIN shifts sh ON sh.login_time>=d.day AND sh.login_time<d.day+1
+GROUP BY 1, 2
+"""
+
+# Days whose rollups may be stale. Recently ended shifts and recently bumped
+# counters are found through their indexes; active shifts through the partial one.
+_STALE_DAYS = f"""
+WITH last AS (SELECT COALESCE((SELECT refreshed_at FROM analytics_rollup_state), NOW()) - INTERVAL '{SLACK}' AS t)
+SELECT day FROM (
+    SELECT generate_series(DATE((SELECT t FROM last)), CURRENT_DATE, INTERVAL '1 day')::date AS day
+    UNION SELECT DATE(login_time) FROM shifts WHERE logout_time IS NULL
+    UNION SELECT DATE(login_time) FROM shifts WHERE logout_time>=(SELECT t FROM last)
+    UNION SELECT DATE(sh.login_time) FROM shift_activity_counts c JOIN shifts sh ON sh.id=c.shift_id
+          WHERE c.updated_at>=(SELECT t FROM last)
+) x
+"""
+
+_ALL_DAYS = """
+SELECT DATE(login_time) FROM shifts
+UNION SELECT DATE(created_at) FROM incident_status
+UNION SELECT DATE(created_at) FROM tickets
+UNION SELECT DATE(created_at) FROM dialpad_tickets
+"""
+
+
+def mark(cur, days):
+    """Queue days for the next refresh (for writes the stale-day scan can't see)."""
+    cur.execute("INSERT INTO analytics_dirty_days (day) SELECT DISTINCT unnest(%s::date[]) ON CONFLICT DO NOTHING",
+                (list(days),))
+
+
+def mark_agent(cur, agent_id):
+    """Queue every day an agent's shifts or activities fall on — call before deleting them."""
+    cur.execute("""
+        INSERT INTO analytics_dirty_days (day)
+        SELECT DATE(login_time) FROM shifts WHERE agent_id=%(a)s
+        UNION SELECT DATE(t.created_at) FROM incident_status t JOIN shifts s ON s.id=t.shift_id WHERE s.agent_id=%(a)s
+        UNION SELECT DATE(t.created_at) FROM tickets t JOIN shifts s ON s.id=t.shift_id WHERE s.agent_id=%(a)s
+        UNION SELECT DATE(t.created_at) FROM dialpad_tickets t JOIN shifts s ON s.id=t.shift_id WHERE s.agent_id=%(a)s
+        ON CONFLICT DO NOTHING
+    """, {"a": agent_id})
+
+
+def refresh_days(cur, days):
+    """Recompute the rollup rows of `days` from the raw tables."""
+    days = sorted(set(days))
+    if not days:
+        return 0
+    cur.execute(f"""
+        INSERT INTO analytics_daily (day, shifts, triaged, zd_tickets, agent_ids, incidents, tickets, dialpad)
+        {_DAILY_LIVE.format(days="%(days)s::date[]")}
+        ON CONFLICT (day) DO UPDATE SET
+            shifts=EXCLUDED.shifts, triaged=EXCLUDED.triaged, zd_tickets=EXCLUDED.zd_tickets,
+            agent_ids=EXCLUDED.agent_ids, incidents=EXCLUDED.incidents, tickets=EXCLUDED.tickets,
+            dialpad=EXCLUDED.dialpad, refreshed_at=NOW()
+    """, {"days": days})
+    cur.execute("DELETE FROM analytics_hourly WHERE day = ANY(%s::date[])", (days,))
+    cur.execute("INSERT INTO analytics_hourly (day, hour, shifts, triaged, agents) "
+                + _HOURLY_LIVE.format(days="%(days)s::date[]"), {"days": days})
+    return len(days)
+
+
+def refresh():
+    """Refresh every stale day. Returns days refreshed, or None when another
+    worker holds the lock."""
+    with db() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("DELETE FROM analytics_dirty_days RETURNING day")
+        days = {r[0] for r in cur.fetchall()}
+        cur.execute(_STALE_DAYS)
+        days.update(r[0] for r in cur.fetchall())
+        n = refresh_days(cur, days)
+        cur.execute("INSERT INTO analytics_rollup_state (id, refreshed_at) VALUES (TRUE, NOW()) "
+                    "ON CONFLICT (id) DO UPDATE SET refreshed_at=EXCLUDED.refreshed_at")
+    return n
+
+
+def rebuild(cur):
+    """Recompute every day that has data (initial backfill)."""
+    cur.execute("TRUNCATE analytics_daily, analytics_hourly, analytics_dirty_days")
+    cur.execute(_ALL_DAYS)
+    n = refresh_days(cur, [r[0] for r in cur.fetchall() if r[0]])
+    cur.execute("INSERT INTO analytics_rollup_state (id, refreshed_at) VALUES (TRUE, NOW()) "
+                "ON CONFLICT (id) DO UPDATE SET refreshed_at=EXCLUDED.refreshed_at")
+    return n
+
+
+def init(cur):
+    cur.execute(SCHEMA)
+    rebuild(cur)
+
+
+# ── reads ─────────────────────────────────────────────────────────────────────
+
+# Days in lo..hi whose stored rollup may be behind: what the next refresh
+# would recompute, plus days queued in analytics_dirty_days.
+_LIVE_DAYS = f"""
+live AS (
+    SELECT day FROM ({_STALE_DAYS}) s WHERE day>=%(lo)s AND day<=%(hi)s
+    UNION SELECT day FROM analytics_dirty_days WHERE day>=%(lo)s AND day<=%(hi)s
+)
+"""
+
+
+def daily(cur, date_from, date_to):
+    """(day, shifts, triaged, zd_tickets, agent_ids, incidents, tickets, dialpad)
+    for date_from..date_to: stored rows for settled days, live rows for the rest."""
+    cur.execute(f"""
+        WITH {_LIVE_DAYS}
+        SELECT day, shifts, triaged, zd_tickets, agent_ids::text[], incidents, tickets, dialpad FROM (
+            SELECT day, shifts, triaged, zd_tickets, agent_ids, incidents, tickets, dialpad FROM analytics_daily
+            WHERE day>=%(lo)s AND day<=%(hi)s AND day NOT IN (SELECT day FROM live)
+            UNION ALL
+            {_DAILY_LIVE.format(days="ARRAY(SELECT day FROM live)")}
+        ) d ORDER BY day
+    """, {"lo": date_from, "hi": date_to})
+    return cur.fetchall()
+
+
+def hourly(cur, date_from, date_to):
+    """(day, hour, shifts, triaged, agents) for date_from..date_to; days the
+    last refresh may have missed are aggregated live."""
+    cur.execute(f"""
+        WITH {_LIVE_DAYS}
+        SELECT day, hour, shifts, triaged, agents FROM analytics_hourly
+        WHERE day>=%(lo)s AND day<=%(hi)s AND day NOT IN (SELECT day FROM live)
+        UNION ALL
+        {_HOURLY_LIVE.format(days="ARRAY(SELECT day FROM live)")}
+    """, {"lo": date_from, "hi": date_to})
+    return cur.fetchall()
+
+
+# ── refresher ─────────────────────────────────────────────────────────────────
+
+def _loop():
+    while True:
+        time.sleep(INTERVAL)
+        try:
+            refresh()
+        except Exception as e:
+            print(f"[rollups] refresh error: {e}", flush=True)
+
+
+def start():
+    """Start the background refresh thread (ANALYTICS_ROLLUP_INTERVAL=0 disables it)."""
+    if INTERVAL <= 0:
+        return None
+    t = threading.Thread(target=_loop, name="analytics-rollups", daemon=True)
+    t.start()
+    print(f"✅ Analytics rollups refreshed every {INTERVAL:g}s")
+    return t
+
+
+if __name__ == "__main__":
+    init_pool()
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "rebuild":
+        with db() as cur:
+            print(f"✅ rebuilt {rebuild(cur)} day(s)")
+    elif cmd == "refresh":
+        print(f"✅ refreshed {refresh()} day(s)")
+    else:
+        print("usage: python rollups.py rebuild|refresh")
+        sys.exit(2)
@@ -1,8 +1,13 @@
 """Agent endpoints — shift lifecycle + activity logging."""
 import uuid
-from datetime import datetime
 from flask import Blueprint, request, jsonify
-from db import db, to_ist, IST
+from db import db, to_ist
+from activities import shift_activities
+from bulk import MAX_ACTIVITIES, alert_time, insert_activities, insert_tickets
+from counters import bump
+from live import notify
+import active_shifts
+import zendesk_sync
 
 agent_bp = Blueprint("agent", __name__)
 
@@ -20,30 +25,6 @@ def _fix_uuid(agent_id):
         return str(uuid.uuid4())
 
 
-def _shift_rows(cur, shift_id):
-    """Fetch every activity list for one shift."""
-    def q(sql):
-        cur.execute(sql, (shift_id,))
-        return cur.fetchall()
-
-    return {
-        "tickets":     [{"number": r[0], "description": r[1], "created_at": to_ist(r[2])}
-                        for r in q("SELECT ticket_number, description, created_at FROM tickets WHERE shift_id=%s ORDER BY created_at")],
-        "alerts":      [{"monitor": r[0], "type": r[1], "comment": r[2], "created_at": to_ist(r[3])}
-                        for r in q("SELECT monitor, alert_type, comment, created_at FROM alerts WHERE shift_id=%s ORDER BY created_at")],
-        "incidents":   [{"description": r[0], "created_at": to_ist(r[1])}
-                        for r in q("SELECT description, created_at FROM incident_status WHERE shift_id=%s ORDER BY created_at")],
-        "adhoc_tasks": [{"task": r[0], "created_at": to_ist(r[1])}
-                        for r in q("SELECT task, created_at FROM adhoc_tasks WHERE shift_id=%s ORDER BY created_at")],
-        "handovers":   [{"description": r[0], "handover_to": r[1], "created_at": to_ist(r[2])}
-                        for r in q("SELECT description, handover_to, created_at FROM handovers WHERE shift_id=%s ORDER BY created_at")],
-        "maintenance": [{"description": r[0], "created_at": to_ist(r[1])}
-                        for r in q("SELECT description, created_at FROM maintenance_logs WHERE shift_id=%s ORDER BY created_at")],
-        "dialpad_tickets": [{"ticket_number": r[0], "description": r[1], "created_at": to_ist(r[2])}
-                            for r in q("SELECT ticket_number, description, created_at FROM dialpad_tickets WHERE shift_id=%s ORDER BY created_at")],
-    }
-
-
 @agent_bp.route("/add-dialpad", methods=["POST", "OPTIONS"])
 def add_dialpad():
     if request.method == "OPTIONS":
@@ -60,6 +41,8 @@ def add_dialpad():
                 "INSERT INTO dialpad_tickets (shift_id, ticket_number, description) VALUES (%s,%s,%s)",
                 (shift_id, ticket_number, description),
             )
+            bump(cur, shift_id, "dialpad_tickets")
+            notify(cur, "activity", shift_id, table="dialpad_tickets")
         return jsonify({"message": "Dialpad ticket added successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -74,19 +57,9 @@ def check_active_shift():
     agent_id = _fix_uuid(data.get("agent_id", ""))
     try:
         with db() as cur:
-            cur.execute(
-                "SELECT id, triaged_count, COALESCE(zd_ticket_count,0) FROM shifts WHERE agent_id=%s AND logout_time IS NULL ORDER BY login_time DESC LIMIT 1",
-                (agent_id,)
-            )
-            row = cur.fetchone()
-        if row:
-            return jsonify({
-                "has_active_shift": True,
-                "shift_id": row[0],
-                "triaged_count": row[1],
-                "zd_ticket_count": int(row[2] or 0),
-                "agent_id": agent_id,
-            })
+            shift = active_shifts.lookup(cur, agent_id)
+        if shift:
+            return jsonify({"has_active_shift": True, **shift, "agent_id": agent_id})
         return jsonify({"has_active_shift": False, "agent_id": agent_id})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -99,13 +72,16 @@ def start_shift():
     if not agent_id: return jsonify({"error": "agent_id is required"}), 400
     try:
         with db() as cur:
-            # Return existing active shift if one already exists
-            cur.execute("SELECT id, triaged_count FROM shifts WHERE agent_id=%s AND logout_time IS NULL ORDER BY login_time DESC LIMIT 1", (agent_id,))
-            existing = cur.fetchone()
+            # Return existing active shift if one already exists (checked in the
+            # database under the agent's row lock, not the registry, so two
+            # concurrent starts can't both insert)
+            existing = active_shifts.lock_active(cur, agent_id)
             if existing:
-                return jsonify({"shift_id": existing[0], "triaged_count": existing[1] or 0, "resumed": True})
+                return jsonify({"shift_id": existing["shift_id"], "triaged_count": existing["triaged_count"], "resumed": True})
             cur.execute("INSERT INTO shifts (agent_id) VALUES (%s) RETURNING id", (agent_id,))
             shift_id = cur.fetchone()[0]
+            notify(cur, "shift_started", shift_id, agent_id=agent_id)
+        active_shifts.forget(agent_id)
         return jsonify({"shift_id": shift_id, "triaged_count": 0})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -117,15 +93,15 @@ def update_triage():
     data = request.json or {}
     shift_id, change = data.get("shift_id"), data.get("change")
     if shift_id is None or change is None: return jsonify({"error": "shift_id and change are required"}), 400
+    try:
+        change = int(change)
+    except (TypeError, ValueError):
+        return jsonify({"error": "change must be an integer"}), 400
     try:
         with db() as cur:
-            cur.execute(
-                "UPDATE shifts SET triaged_count=GREATEST(triaged_count+%s,0) WHERE id=%s RETURNING triaged_count",
-                (change, shift_id)
-            )
-            row = cur.fetchone()
-        if not row: return jsonify({"error": "Shift not found"}), 404
-        return jsonify({"triaged_count": row[0]})
+            count = active_shifts.triage(cur, shift_id, change)
+        if count is None: return jsonify({"error": "Shift not found"}), 404
+        return jsonify({"triaged_count": count})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -136,12 +112,16 @@ def end_shift():
     shift_id = (request.json or {}).get("shift_id")
     if not shift_id: return jsonify({"error": "shift_id is required"}), 400
     try:
+        active_shifts.flush()  # buffered triage clicks land before the shift closes
         with db() as cur:
             cur.execute(
-                "UPDATE shifts SET logout_time=NOW() WHERE id=%s AND logout_time IS NULL RETURNING id",
+                "UPDATE shifts SET logout_time=NOW() WHERE id=%s AND logout_time IS NULL RETURNING agent_id",
                 (shift_id,)
             )
-            if not cur.fetchone(): return jsonify({"error": "Shift not found or already ended"}), 404
+            row = cur.fetchone()
+            if not row: return jsonify({"error": "Shift not found or already ended"}), 404
+            notify(cur, "shift_ended", shift_id, agent_id=str(row[0]))
+        active_shifts.forget(row[0])
         return jsonify({"message": "Shift ended successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -158,13 +138,11 @@ def add_tickets():
     if not tickets:  return jsonify({"error": "tickets array is required"}), 400
     try:
         with db() as cur:
-            for t in tickets:
-                if t.get("number"):
-                    cur.execute(
-                        "INSERT INTO tickets (shift_id, ticket_number, description) VALUES (%s,%s,%s)",
-                        (shift_id, t["number"], t.get("description", ""))
-                    )
-        return jsonify({"message": "Tickets added successfully"})
+            inserted, skipped = insert_tickets(
+                cur, shift_id, [(t["number"], t.get("description", "")) for t in tickets if t.get("number")]
+            )
+            if inserted: notify(cur, "activity", shift_id, table="tickets")
+        return jsonify({"message": "Tickets added successfully", "inserted": inserted, "skipped": skipped})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -176,17 +154,15 @@ def add_alert():
     shift_id, monitor, alert_type = data.get("shift_id"), data.get("monitor"), data.get("alert_type")
     if not all([shift_id, monitor, alert_type]):
         return jsonify({"error": "shift_id, monitor, and alert_type are required"}), 400
-    raw = data.get("alert_datetime")
-    try:
-        created_at = IST.localize(datetime.strptime(raw, "%Y-%m-%dT%H:%M:%S")) if raw else datetime.now(IST)
-    except (ValueError, TypeError):
-        created_at = datetime.now(IST)
+    created_at = alert_time(data.get("alert_datetime"))
     try:
         with db() as cur:
             cur.execute(
                 "INSERT INTO alerts (shift_id, monitor, alert_type, comment, created_at) VALUES (%s,%s,%s,%s,%s)",
                 (shift_id, monitor, alert_type, data.get("comment", ""), created_at)
             )
+            bump(cur, shift_id, "alerts")
+            notify(cur, "activity", shift_id, table="alerts")
         return jsonify({"message": "Alert added successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -201,6 +177,8 @@ def add_incident():
     try:
         with db() as cur:
             cur.execute("INSERT INTO incident_status (shift_id, description) VALUES (%s,%s)", (shift_id, desc))
+            bump(cur, shift_id, "incident_status")
+            notify(cur, "activity", shift_id, table="incident_status")
         return jsonify({"message": "Incident added successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -215,6 +193,8 @@ def add_adhoc():
     try:
         with db() as cur:
             cur.execute("INSERT INTO adhoc_tasks (shift_id, task) VALUES (%s,%s)", (shift_id, task))
+            bump(cur, shift_id, "adhoc_tasks")
+            notify(cur, "activity", shift_id, table="adhoc_tasks")
         return jsonify({"message": "Ad-hoc task added successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -229,6 +209,8 @@ def add_handover():
     try:
         with db() as cur:
             cur.execute("INSERT INTO handovers (shift_id, description, handover_to) VALUES (%s,%s,%s)", (shift_id, desc, to))
+            bump(cur, shift_id, "handovers")
+            notify(cur, "activity", shift_id, table="handovers")
         return jsonify({"message": "Shift handover added successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -243,11 +225,49 @@ def add_maintenance():
     try:
         with db() as cur:
             cur.execute("INSERT INTO maintenance_logs (shift_id, description) VALUES (%s,%s)", (shift_id, desc))
+            bump(cur, shift_id, "maintenance_logs")
+            notify(cur, "activity", shift_id, table="maintenance_logs")
         return jsonify({"message": "Maintenance log added successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@agent_bp.route("/activities/batch", methods=["POST", "OPTIONS"])
+def add_activities_batch():
+    """Mixed activities for one shift in one request and one transaction:
+    {"shift_id", "activities": [{"type": "alert", "monitor": ..., ...}, ...]}.
+    Types: alert, incident, adhoc, handover, maintenance, dialpad, ticket, with
+    the same fields as the single-item endpoints. Invalid items are reported
+    per index and don't block the rest. 404 for an unknown shift, 409 for one
+    that has ended."""
+    if request.method == "OPTIONS": return "", 200
+    data = request.json or {}
+    shift_id, items = data.get("shift_id"), data.get("activities")
+    if not shift_id or not isinstance(items, list) or not items:
+        return jsonify({"error": "shift_id and a non-empty activities list are required"}), 400
+    if len(items) > MAX_ACTIVITIES:
+        return jsonify({"error": f"at most {MAX_ACTIVITIES} activities per batch"}), 400
+    try:
+        uuid.UUID(str(shift_id))
+    except ValueError:
+        return jsonify({"error": "shift_id must be a UUID"}), 400
+    try:
+        with db() as cur:
+            # Share-lock the shift so it can't end while the batch is written
+            cur.execute("SELECT logout_time FROM shifts WHERE id=%s FOR SHARE", (shift_id,))
+            row = cur.fetchone()
+            if not row:
+                return jsonify({"error": "Shift not found"}), 404
+            if row[0] is not None:
+                return jsonify({"error": "Shift has already ended"}), 409
+            results = insert_activities(cur, shift_id, items)
+            if any(r["status"] == "inserted" for r in results): notify(cur, "activity", shift_id, table="batch")
+        counts = {k: sum(r["status"] == k for r in results) for k in ("inserted", "skipped", "invalid")}
+        return jsonify({**counts, "results": results})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # ── shift summary ─────────────────────────────────────────────────────────────
 
 @agent_bp.route("/shift-summary/<shift_id>", methods=["GET", "OPTIONS"])
@@ -258,7 +278,7 @@ def get_shift_summary(shift_id):
             cur.execute("SELECT agent_id, login_time, logout_time, triaged_count, COALESCE(zd_ticket_count,0) FROM shifts WHERE id=%s", (shift_id,))
             s = cur.fetchone()
             if not s: return jsonify({"error": "Shift not found"}), 404
-            data = _shift_rows(cur, shift_id)
+            data = shift_activities(cur, shift_id)
         return jsonify({
             "agent_id": str(s[0]), "start_time": to_ist(s[1]), "end_time": to_ist(s[2]),
             "triaged_count": s[3] or 0,
@@ -281,16 +301,20 @@ def update_zd_count():
         return jsonify({"error": "shift_id and count are required"}), 400
     try:
         with db() as cur:
-            # Update the aggregate solved count for this shift and fetch shift start time
+            # Update the aggregate solved count for this shift and fetch shift start time,
+            # plus the count it replaces (locked, so a concurrent poll can't misreport it)
             cur.execute(
-                "UPDATE shifts SET zd_ticket_count=%s WHERE id=%s RETURNING zd_ticket_count, login_time",
+                """UPDATE shifts s SET zd_ticket_count=%s
+                     FROM (SELECT id, zd_ticket_count FROM shifts WHERE id=%s FOR UPDATE) old
+                    WHERE s.id=old.id
+                RETURNING s.zd_ticket_count, s.login_time, old.zd_ticket_count""",
                 (max(0, int(count)), shift_id)
             )
             row = cur.fetchone()
             if not row:
                 return jsonify({"error": "Shift not found"}), 404
 
-            zd_count, login_time = row[0], row[1]
+            zd_count, login_time, previous = row
 
             from datetime import datetime, timezone
 
@@ -306,7 +330,13 @@ def update_zd_count():
             # Log Zendesk tickets against this shift (deduped per shift_id + ticket_number),
             # but only if their updated_at is on/after the shift start time. This ensures
             # we only store tickets solved during THIS shift, not lifetime.
-            tickets = data.get("tickets") or []
+            #
+            # With the Zendesk sync running, take the agent's solved tickets from
+            # Postgres rather than trusting the client's copy.
+            tickets = zendesk_sync.solved_tickets(cur, shift_id)
+            if tickets is None:
+                tickets = data.get("tickets") or []
+            rows = []
             for t in tickets:
                 number = str(t.get("id") or t.get("number") or "").strip()
                 raw_updated = t.get("updated_at")
@@ -326,18 +356,15 @@ def update_zd_count():
                 if updated_utc < login_utc:
                     continue
 
-                cur.execute(
-                    "SELECT 1 FROM tickets WHERE shift_id=%s AND ticket_number=%s",
-                    (shift_id, number),
-                )
-                if cur.fetchone():
-                    continue
+                rows.append((number, t.get("subject") or t.get("description") or ""))
 
-                cur.execute(
-                    "INSERT INTO tickets (shift_id, ticket_number, description) VALUES (%s,%s,%s)",
-                    (shift_id, number, t.get("subject") or t.get("description") or ""),
-                )
+            # One multi-row insert; numbers already logged for this shift are skipped
+            inserted, skipped = insert_tickets(cur, shift_id, rows)
+            # The client polls this every few minutes; most polls change nothing
+            # and shouldn't invalidate the manager views' caches.
+            if inserted or zd_count != previous:
+                notify(cur, "zd_count", shift_id)
 
-        return jsonify({"zd_ticket_count": zd_count})
+        return jsonify({"zd_ticket_count": zd_count, "inserted": inserted, "skipped": skipped})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
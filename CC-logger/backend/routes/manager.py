@@ -1,14 +1,25 @@
 """Manager endpoints — monitoring, shifts, analytics."""
+import os
+import queue
 import statistics
 import sys
 import traceback
+import uuid
 from datetime import datetime, timedelta, date
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from activities import shift_activities, load_shift_activities
+from cache import TTLCache
+import analytics
+import conditional
+import export
+import fastjson
+import live
+import pagination
 from db import db, to_ist
 
 manager_bp = Blueprint("manager", __name__, url_prefix="/manager")
 
-DAY_NAMES = ["Sunday","Monday","Tuesday","Wednesday","Thursday","Friday","Saturday"]
+MAX_BATCH_SHIFTS = 50
 
 
 # ── helpers ───────────────────────────────────────────────────────────────────
@@ -26,130 +37,282 @@ def _date_range():
     return date_from, f"{date_to} 23:59:59"
 
 
-def _describe(values):
-    if not values: return {}
-    return {
-        "min": round(min(values), 2), "max": round(max(values), 2),
-        "avg": round(statistics.mean(values), 2), "median": round(statistics.median(values), 2),
-        "std_dev": round(statistics.stdev(values), 2) if len(values) > 1 else 0,
-    }
-
-
-def _shift_activities(cur, shift_id):
-    def q(sql): cur.execute(sql, (shift_id,)); return cur.fetchall()
-    return {
-        "tickets":     [{"number": r[0], "description": r[1], "created_at": to_ist(r[2])}
-                        for r in q("SELECT ticket_number,description,created_at FROM tickets WHERE shift_id=%s ORDER BY created_at")],
-        "alerts":      [{"monitor": r[0], "type": r[1], "comment": r[2], "created_at": to_ist(r[3])}
-                        for r in q("SELECT monitor,alert_type,comment,created_at FROM alerts WHERE shift_id=%s ORDER BY created_at")],
-        "incidents":   [{"description": r[0], "created_at": to_ist(r[1])}
-                        for r in q("SELECT description,created_at FROM incident_status WHERE shift_id=%s ORDER BY created_at")],
-        "adhoc_tasks": [{"task": r[0], "created_at": to_ist(r[1])}
-                        for r in q("SELECT task,created_at FROM adhoc_tasks WHERE shift_id=%s ORDER BY created_at")],
-        "handovers":   [{"description": r[0], "handover_to": r[1], "created_at": to_ist(r[2])}
-                        for r in q("SELECT description,handover_to,created_at FROM handovers WHERE shift_id=%s ORDER BY created_at")],
-        "maintenance": [{"description": r[0], "created_at": to_ist(r[1])}
-                        for r in q("SELECT description,created_at FROM maintenance_logs WHERE shift_id=%s ORDER BY created_at")],
-        "dialpad_tickets": [{"ticket_number": r[0], "description": r[1], "created_at": to_ist(r[2])}
-                            for r in q("SELECT ticket_number,description,created_at FROM dialpad_tickets WHERE shift_id=%s ORDER BY created_at")],
-    }
+# ── endpoints ─────────────────────────────────────────────────────────────────
 
+def _load_active_agents():
+    # Primary only: the live stream and ETag versions follow the primary's notifications.
+    with db() as cur:
+        cur.execute("""
+            SELECT s.id, s.agent_id, s.login_time, s.triaged_count,
+                   EXTRACT(EPOCH FROM (NOW()-s.login_time))/3600,
+                   COALESCE(ag.name,'Unknown Agent'), COALESCE(c.ticket_cnt,0)
+            FROM shifts s
+            LEFT JOIN agents ag ON s.agent_id=ag.id
+            LEFT JOIN shift_activity_counts c ON c.shift_id=s.id
+            WHERE s.logout_time IS NULL
+            ORDER BY s.login_time DESC
+        """)
+        rows = cur.fetchall()
+    return [
+        {"shift_id": str(r[0]), "agent_id": str(r[1]), "agent_name": r[5],
+         "login_time": to_ist(r[2]), "triaged_count": r[3] or 0,
+         "hours_active": round(float(r[4] or 0), 2), "zd_ticket_count": int(r[6] or 0)}
+        for r in rows
+    ]
 
-# ── endpoints ─────────────────────────────────────────────────────────────────
 
 @manager_bp.route("/active-agents", methods=["GET", "OPTIONS"])
+@conditional.cached("shifts", "agents", "tickets")
 def get_active_agents():
     if request.method == "OPTIONS": return "", 200
     try:
-        with db() as cur:
-            cur.execute("""
-                SELECT s.id, s.agent_id, s.login_time, s.triaged_count,
-                       EXTRACT(EPOCH FROM (NOW()-s.login_time))/3600,
-                       COALESCE(ag.name,'Unknown Agent'), COUNT(DISTINCT t.id)
-                FROM shifts s
-                LEFT JOIN agents ag ON s.agent_id=ag.id
-                LEFT JOIN tickets t ON t.shift_id=s.id
-                WHERE s.logout_time IS NULL
-                GROUP BY s.id, s.agent_id, s.login_time, s.triaged_count, ag.name
-                ORDER BY s.login_time DESC
-            """)
-            rows = cur.fetchall()
-        return jsonify({"active_agents": [
-            {"shift_id": str(r[0]), "agent_id": str(r[1]), "agent_name": r[5],
-             "login_time": to_ist(r[2]), "triaged_count": r[3] or 0,
-             "hours_active": round(float(r[4] or 0), 2), "zd_ticket_count": int(r[6] or 0)}
-            for r in rows
-        ]})
+        return jsonify({"active_agents": _load_active_agents()})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _page_args(default, maximum, parse_id):
+    """(limit, cursor key (datetime, id) or None) from ?limit=&cursor=; raises
+    ValueError. `parse_id` turns the cursor's id back into the column's type."""
+    raw = request.args.get("limit") or str(default)
+    limit = int(raw) if raw.isdigit() else 0
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    cursor = request.args.get("cursor")
+    key = pagination.decode(cursor) if cursor else None
+    if key is None:
+        return limit, None
+    try:
+        if not (isinstance(key, list) and len(key) == 2 and isinstance(key[0], str)):
+            raise ValueError
+        return limit, (datetime.fromisoformat(key[0]), parse_id(str(key[1])))
+    except ValueError:
+        raise ValueError("invalid cursor") from None
+
+
+def _page(rows, limit, key):
+    """Trim the extra look-ahead row; returns (rows, has_more, next_cursor)."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, has_more, pagination.encode(list(key(rows[-1]))) if has_more else None
+
+
 @manager_bp.route("/shifts", methods=["GET", "OPTIONS"])
+@conditional.cached("shifts", "agents", "tickets")
 def get_shifts():
+    """Shifts newest first, keyset-paginated on (login_time, id): ?limit= (default
+    200, max 1000) and ?cursor= from the previous page's next_cursor."""
     if request.method == "OPTIONS": return "", 200
-    start, end, name = request.args.get("start_date"), request.args.get("end_date"), request.args.get("agent_id")
+    start, end, agent_id = request.args.get("start_date"), request.args.get("end_date"), request.args.get("agent_id")
+    try:
+        limit, after = _page_args(200, 1000, lambda v: str(uuid.UUID(v)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if agent_id: uuid.UUID(agent_id)
+    except ValueError:
+        return jsonify({"error": "agent_id must be a UUID"}), 400
     sql = """
         SELECT s.id, s.agent_id, s.login_time, s.logout_time, s.triaged_count,
                EXTRACT(EPOCH FROM (COALESCE(s.logout_time,NOW())-s.login_time))/3600,
-               COALESCE(ag.name,'Unknown Agent'), COUNT(DISTINCT t.id)
+               COALESCE(ag.name,'Unknown Agent'), COALESCE(c.ticket_cnt,0)
         FROM shifts s
         LEFT JOIN agents ag ON s.agent_id=ag.id
-        LEFT JOIN tickets t ON t.shift_id=s.id
+        LEFT JOIN shift_activity_counts c ON c.shift_id=s.id
         WHERE 1=1
     """
     params = []
-    if start:  sql += " AND s.login_time >= %s"; params.append(start)
-    if end:    sql += " AND s.login_time <= %s"; params.append(end + " 23:59:59")
-    if name:   sql += " AND ag.name ILIKE %s";  params.append(f"%{name}%")
-    sql += " GROUP BY s.id, s.agent_id, s.login_time, s.logout_time, s.triaged_count, ag.name ORDER BY s.login_time DESC LIMIT 1000"
+    if start:    sql += " AND s.login_time >= %s"; params.append(start)
+    if end:      sql += " AND s.login_time <= %s"; params.append(end + " 23:59:59")
+    if agent_id: sql += " AND s.agent_id = %s";    params.append(agent_id)
+    if after:    sql += " AND (s.login_time, s.id) < (%s::timestamptz, %s::uuid)"; params.extend(after)
+    sql += " ORDER BY s.login_time DESC, s.id DESC LIMIT %s"; params.append(limit + 1)
     try:
         with db() as cur:
             cur.execute(sql, params); rows = cur.fetchall()
+        rows, has_more, next_cursor = _page(rows, limit, lambda r: (r[2].isoformat(), str(r[0])))
         return jsonify({"shifts": [
             {"id": str(r[0]), "agent_id": str(r[1]), "agent_name": r[6],
              "login_time": to_ist(r[2]), "logout_time": to_ist(r[3]),
              "triaged_count": r[4] or 0, "duration_hours": round(float(r[5] or 0), 2),
              "zd_ticket_count": int(r[7] or 0)}
             for r in rows
-        ]})
+        ], "has_more": has_more, "next_cursor": next_cursor})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@manager_bp.route("/export", methods=["GET", "OPTIONS"])
+def export_rows():
+    """Full-history export, streamed: ?tables=shifts,alerts,... &format=csv|ndjson
+    &start_date=&end_date= (inclusive, optional) &agent_id=. CSV takes one table;
+    NDJSON with several tags each row with its table. 503 + Retry-After while
+    export.MAX_CONCURRENT downloads are already streaming."""
+    if request.method == "OPTIONS": return "", 200
+    tables = [t for t in (request.args.get("tables") or "shifts").split(",") if t]
+    fmt = request.args.get("format", "csv")
+    unknown = [t for t in tables if t not in export.TABLES]
+    if unknown:
+        return jsonify({"error": f"unknown table(s): {', '.join(unknown)}", "tables": list(export.TABLES)}), 400
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    if fmt == "csv" and len(tables) > 1:
+        return jsonify({"error": "csv exports one table at a time; use format=ndjson for several"}), 400
+    filters = {"agent_id": request.args.get("agent_id")}
+    try:
+        for key, arg in (("date_from", "start_date"), ("date_to", "end_date")):
+            filters[key] = datetime.strptime(request.args[arg], "%Y-%m-%d").date() if request.args.get(arg) else None
+        if filters["agent_id"]:
+            uuid.UUID(filters["agent_id"])
+    except ValueError:
+        return jsonify({"error": "dates must be YYYY-MM-DD and agent_id a UUID"}), 400
+
+    try:
+        release = export.reserve()
+    except export.ExportBusy as e:
+        res = jsonify({"error": str(e)})
+        res.status_code = 503
+        res.headers["Retry-After"] = "30"
+        return res
+
+    if fmt == "csv":
+        body, mimetype = export.csv_stream(tables[0], **filters), "text/csv"
+    else:
+        body, mimetype = export.ndjson_stream(tables, **filters), "application/x-ndjson"
+    name = "_".join(tables + [str(d) for d in (filters["date_from"], filters["date_to"]) if d])
+    res = Response(stream_with_context(body), mimetype=mimetype)
+    res.headers["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    res.headers["X-Accel-Buffering"] = "no"
+    res.call_on_close(release)  # the server closes the response when the download ends or is dropped
+    return res
+
+
+# Every dashboard bucket in one pass: shifts since the start of the widest
+# window (month / week / last 30 days) plus the active ones, split into
+# periods with FILTER, and today's activity counts as range-bounded subqueries.
+_ANALYTICS_SQL = """
+    WITH b AS (
+        SELECT CURRENT_DATE::timestamptz AS today,
+               CURRENT_DATE::timestamptz + INTERVAL '1 day' AS tomorrow,
+               DATE_TRUNC('week', CURRENT_DATE) AS week,
+               DATE_TRUNC('month', CURRENT_DATE) AS month,
+               CURRENT_DATE - INTERVAL '30 days' AS last30
+    )
+    SELECT COUNT(sh.id) FILTER (WHERE sh.logout_time IS NULL),
+           {today}, {week}, {month},
+           AVG(sh.triaged_count/NULLIF(EXTRACT(EPOCH FROM (COALESCE(sh.logout_time,NOW())-sh.login_time))/3600,0))
+               FILTER (WHERE sh.logout_time IS NOT NULL AND sh.login_time>=b.last30
+                         AND EXTRACT(EPOCH FROM (sh.logout_time-sh.login_time))/3600>0.5),
+           (SELECT COUNT(*) FROM alerts          WHERE created_at>=b.today AND created_at<b.tomorrow),
+           (SELECT COUNT(*) FROM tickets         WHERE created_at>=b.today AND created_at<b.tomorrow),
+           (SELECT COUNT(*) FROM dialpad_tickets WHERE created_at>=b.today AND created_at<b.tomorrow)
+    FROM b
+    LEFT JOIN shifts sh ON sh.logout_time IS NULL OR sh.login_time>=LEAST(b.week, b.month, b.last30)
+    LEFT JOIN shift_activity_counts c ON c.shift_id=sh.id
+    GROUP BY b.today, b.tomorrow
+""".format(**{
+    period: ", ".join(agg.format(f=f" FILTER (WHERE {cond})") for agg in (
+        "COUNT(DISTINCT sh.agent_id){f}", "COUNT(sh.id){f}",
+        "COALESCE(SUM(sh.triaged_count){f},0)", "COALESCE(SUM(c.ticket_cnt){f},0)",
+    ))
+    for period, cond in (
+        ("today", "sh.login_time>=b.today AND sh.login_time<b.tomorrow"),
+        ("week",  "sh.login_time>=b.week"),
+        ("month", "sh.login_time>=b.month"),
+    )
+})
+
+_analytics_cache = TTLCache(ttl=float(os.getenv("ANALYTICS_CACHE_TTL", "15")), maxsize=1)
+
+
+def _load_analytics():
+    with db() as cur:
+        cur.execute(_ANALYTICS_SQL)
+        r = cur.fetchone()
+
+    def period(i):
+        return {"agents_active": r[i] or 0, "total_shifts": r[i+1] or 0, "cases_triaged": r[i+2] or 0, "zd_tickets": r[i+3] or 0}
+
+    return {
+        "active_now": r[0],
+        "today": period(1), "week": period(5), "month": period(9),
+        "avg_productivity": round(float(r[13] or 0), 2),
+        "alerts_today": r[14] or 0,
+        "tickets_today": r[15] or 0,
+        "dialpad_today": r[16] or 0,
+    }
+
+
+_ANALYTICS_TABLES = ("shifts", "tickets", "alerts", "dialpad_tickets")
+
+
 @manager_bp.route("/analytics", methods=["GET", "OPTIONS"])
+@conditional.cached(*_ANALYTICS_TABLES)
 def get_analytics():
+    """Dashboard summary, served from a short-TTL cache (ANALYTICS_CACHE_TTL seconds)
+    so concurrent pollers share one query per TTL. The cache is keyed on the
+    tables' versions, so a write starts a fresh entry; X-Cache-Age is its age."""
     if request.method == "OPTIONS": return "", 200
     try:
-        with db() as cur:
-            def s(sql): cur.execute(sql); return cur.fetchone()[0]
-            def r(sql): cur.execute(sql); return cur.fetchone()
-            active        = s("SELECT COUNT(*) FROM shifts WHERE logout_time IS NULL")
-            today         = r("SELECT COUNT(DISTINCT s.agent_id),COUNT(DISTINCT s.id),COALESCE(SUM(s.triaged_count),0),COALESCE(SUM(s.tcnt),0) FROM (SELECT sh.id,sh.agent_id,sh.triaged_count,COUNT(DISTINCT t.id) AS tcnt FROM shifts sh LEFT JOIN tickets t ON t.shift_id=sh.id WHERE DATE(sh.login_time)=CURRENT_DATE GROUP BY sh.id,sh.agent_id,sh.triaged_count) s")
-            week          = r("SELECT COUNT(DISTINCT s.agent_id),COUNT(DISTINCT s.id),COALESCE(SUM(s.triaged_count),0),COALESCE(SUM(s.tcnt),0) FROM (SELECT sh.id,sh.agent_id,sh.triaged_count,COUNT(DISTINCT t.id) AS tcnt FROM shifts sh LEFT JOIN tickets t ON t.shift_id=sh.id WHERE sh.login_time>=DATE_TRUNC('week',CURRENT_DATE) GROUP BY sh.id,sh.agent_id,sh.triaged_count) s")
-            month         = r("SELECT COUNT(DISTINCT s.agent_id),COUNT(DISTINCT s.id),COALESCE(SUM(s.triaged_count),0),COALESCE(SUM(s.tcnt),0) FROM (SELECT sh.id,sh.agent_id,sh.triaged_count,COUNT(DISTINCT t.id) AS tcnt FROM shifts sh LEFT JOIN tickets t ON t.shift_id=sh.id WHERE sh.login_time>=DATE_TRUNC('month',CURRENT_DATE) GROUP BY sh.id,sh.agent_id,sh.triaged_count) s")
-            avg_p         = s("SELECT AVG(triaged_count/NULLIF(EXTRACT(EPOCH FROM (COALESCE(logout_time,NOW())-login_time))/3600,0)) FROM shifts WHERE logout_time IS NOT NULL AND EXTRACT(EPOCH FROM (logout_time-login_time))/3600>0.5 AND login_time>=CURRENT_DATE-INTERVAL '30 days'")
-            alerts        = s("SELECT COUNT(*) FROM alerts WHERE DATE(created_at)=CURRENT_DATE")
-            tickets       = s("SELECT COUNT(*) FROM tickets WHERE DATE(created_at)=CURRENT_DATE")
-            dialpad_today = s("SELECT COUNT(*) FROM dialpad_tickets WHERE DATE(created_at)=CURRENT_DATE")
-        return jsonify({
-            "active_now": active,
-            "today":  {"agents_active": today[0] or 0, "total_shifts": today[1] or 0, "cases_triaged": today[2] or 0, "zd_tickets": today[3] or 0},
-            "week":   {"agents_active": week[0]  or 0, "total_shifts": week[1]  or 0, "cases_triaged": week[2]  or 0, "zd_tickets": week[3]  or 0},
-            "month":  {"agents_active": month[0] or 0, "total_shifts": month[1] or 0, "cases_triaged": month[2] or 0, "zd_tickets": month[3] or 0},
-            "avg_productivity": round(float(avg_p or 0), 2),
-            "alerts_today": alerts or 0,
-            "tickets_today": tickets or 0,
-            "dialpad_today": dialpad_today or 0,
-        })
+        data, age, _ = _analytics_cache.get_or_load(("summary", conditional.version(_ANALYTICS_TABLES)),
+                                                    _load_analytics)
+        res = jsonify(data)
+        res.headers["X-Cache-Age"] = f"{age:.1f}"
+        return res
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+_hub = live.Hub(lambda: {"active_agents": _load_active_agents(), "analytics": _load_analytics()})
+
+
+def _sse(kind, payload):
+    return f"event: {kind}\ndata: {fastjson.dumps(payload)}\n\n"
+
+
+@manager_bp.route("/stream", methods=["GET", "OPTIONS"])
+def stream():
+    """Server-Sent Events for the live dashboard: a `snapshot` event
+    ({active_agents, analytics}) then `delta` events ({version, events, upsert,
+    removed, analytics?}) as agents write. A `reset` event means the client fell
+    behind and should reconnect for a fresh snapshot."""
+    if request.method == "OPTIONS": return "", 200
+    if _hub.subscribers() >= live.MAX_STREAMS:
+        # Dashboards fall back to polling; keep the remaining threads for agents.
+        res = jsonify({"error": "too many live streams on this worker"})
+        res.status_code, res.headers["Retry-After"] = 503, "30"
+        return res
+    try:
+        q, snapshot, version = _hub.subscribe()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    def events():
+        try:
+            yield "retry: 3000\n" + _sse("snapshot", {"version": version, **snapshot})
+            while True:
+                try:
+                    kind, payload = q.get(timeout=live.HEARTBEAT)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(kind, payload)
+                if kind == "reset":
+                    return
+        finally:
+            _hub.unsubscribe(q)
+
+    res = Response(stream_with_context(events()), mimetype="text/event-stream")
+    res.headers["Cache-Control"] = "no-cache"
+    res.headers["X-Accel-Buffering"] = "no"
+    return res
+
 
 @manager_bp.route("/agent-stats/<agent_id>", methods=["GET", "OPTIONS"])
 def get_agent_stats(agent_id):
     if request.method == "OPTIONS": return "", 200
     try:
-        with db() as cur:
+        with db(readonly=True) as cur:
             cur.execute("SELECT COALESCE(name,'Unknown Agent') FROM agents WHERE id=%s", (agent_id,))
             name_row = cur.fetchone()
             name = name_row[0] if name_row else "Unknown Agent"
@@ -188,7 +351,7 @@ def get_shift_details(shift_id):
             """, (shift_id,))
             s = cur.fetchone()
             if not s: return jsonify({"error": "Shift not found"}), 404
-            acts = _shift_activities(cur, shift_id)
+            acts = shift_activities(cur, shift_id)
         return jsonify({
             "agent_id": str(s[0]), "agent_name": s[4],
             "login_time": to_ist(s[1]), "logout_time": to_ist(s[2]),
@@ -198,6 +361,41 @@ def get_shift_details(shift_id):
         return jsonify({"error": str(e)}), 500
 
 
+@manager_bp.route("/shift-details", methods=["GET", "OPTIONS"])
+def get_shift_details_batch():
+    """GET /manager/shift-details?ids=<id>,<id>,...  — several shifts in two queries."""
+    if request.method == "OPTIONS": return "", 200
+    ids = [i.strip() for i in (request.args.get("ids") or "").split(",") if i.strip()]
+    if not ids: return jsonify({"error": "ids query parameter is required"}), 400
+    if len(ids) > MAX_BATCH_SHIFTS:
+        return jsonify({"error": f"At most {MAX_BATCH_SHIFTS} shift ids per request"}), 400
+    try:
+        for i in ids: uuid.UUID(i)
+    except ValueError:
+        return jsonify({"error": "Invalid shift id format"}), 400
+    try:
+        with db() as cur:
+            cur.execute("""
+                SELECT s.id,s.agent_id,s.login_time,s.logout_time,s.triaged_count,COALESCE(ag.name,'Unknown Agent')
+                FROM shifts s LEFT JOIN agents ag ON s.agent_id=ag.id WHERE s.id = ANY(%s::uuid[])
+                ORDER BY s.login_time DESC
+            """, (ids,))
+            rows = cur.fetchall()
+            acts = load_shift_activities(cur, [r[0] for r in rows]) if rows else {}
+        shifts = []
+        for r in rows:
+            a = acts[str(r[0])]
+            shifts.append({
+                "id": str(r[0]), "agent_id": str(r[1]), "agent_name": r[5],
+                "login_time": to_ist(r[2]), "logout_time": to_ist(r[3]),
+                "triaged_count": r[4] or 0, "zd_ticket_count": len(a["tickets"]), **a,
+            })
+        found = {s["id"] for s in shifts}
+        return jsonify({"shifts": shifts, "missing": [i for i in ids if str(uuid.UUID(i)) not in found]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @manager_bp.route("/advanced-analytics", methods=["GET", "OPTIONS"])
 def get_advanced_analytics():
     if request.method == "OPTIONS": return "", 200
@@ -206,139 +404,36 @@ def get_advanced_analytics():
     except ValueError:
         return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
 
-    p = (date_from, date_to)
     try:
-        with db() as cur:
-            def rows(sql): cur.execute(sql, p); return cur.fetchall()
-
-            performance_trends = [
-                {"date": str(r[0]), "agents": r[1], "shifts": r[2], "total_triaged": r[3] or 0, "avg_triaged": round(float(r[4] or 0), 2), "total_zd_tickets": int(r[5] or 0)}
-                for r in rows("""
-                    SELECT s.day, COUNT(DISTINCT s.agent_id), COUNT(DISTINCT s.id),
-                           COALESCE(SUM(s.triaged_count),0), COALESCE(AVG(s.triaged_count),0),
-                           COALESCE(SUM(s.ticket_cnt),0)
-                    FROM (
-                        SELECT sh.id, sh.agent_id, DATE(sh.login_time) AS day,
-                               sh.triaged_count, COUNT(DISTINCT t.id) AS ticket_cnt
-                        FROM shifts sh
-                        LEFT JOIN tickets t ON t.shift_id=sh.id
-                        WHERE sh.login_time>=%s AND sh.login_time<=%s
-                        GROUP BY sh.id, sh.agent_id, sh.login_time, sh.triaged_count
-                    ) s
-                    GROUP BY s.day ORDER BY 1
-                """)
-            ]
-            agent_rankings = [
-                {"rank": i+1, "agent_id": str(r[0]), "agent_name": r[1],
-                 "shift_count": r[2], "total_triaged": int(r[3] or 0), "avg_triaged": round(float(r[4] or 0), 2),
-                 "productivity_rate": round(float(r[5] or 0), 2), "total_tickets": int(r[6] or 0),
-                 "total_alerts": int(r[7] or 0), "total_incidents": int(r[8] or 0), "total_adhoc": int(r[9] or 0),
-                 "avg_shift_hours": round(float(r[10] or 0), 2), "total_zd_tickets": int(r[11] or 0),
-                 "total_dialpad": int(r[12] or 0)}
-                for i, r in enumerate(rows("""
-                    SELECT s.agent_id, COALESCE(ag.name,'Unknown Agent'),
-                           COUNT(s.id),
-                           COALESCE(SUM(s.triaged_count),0),
-                           COALESCE(AVG(s.triaged_count),0),
-                           COALESCE(AVG(s.triaged_count/NULLIF(EXTRACT(EPOCH FROM (COALESCE(s.logout_time,NOW())-s.login_time))/3600,0)),0),
-                           COALESCE(SUM(s.ticket_cnt),0),
-                           COALESCE(SUM(s.alert_cnt),0),
-                           COALESCE(SUM(s.incident_cnt),0),
-                           COALESCE(SUM(s.adhoc_cnt),0),
-                           COALESCE(AVG(EXTRACT(EPOCH FROM (COALESCE(s.logout_time,NOW())-s.login_time))/3600),0),
-                           COALESCE(SUM(s.ticket_cnt),0),
-                           COALESCE(SUM(s.dialpad_cnt),0)
-                    FROM (
-                        SELECT sh.id, sh.agent_id, sh.triaged_count, sh.zd_ticket_count,
-                               sh.logout_time, sh.login_time,
-                               COUNT(DISTINCT t.id)  AS ticket_cnt,
-                               COUNT(DISTINCT a.id)  AS alert_cnt,
-                               COUNT(DISTINCT i.id)  AS incident_cnt,
-                               COUNT(DISTINCT ad.id) AS adhoc_cnt,
-                               COUNT(DISTINCT dp.id) AS dialpad_cnt
-                        FROM shifts sh
-                        LEFT JOIN tickets t        ON t.shift_id  = sh.id
-                        LEFT JOIN alerts a         ON a.shift_id  = sh.id
-                        LEFT JOIN incident_status i ON i.shift_id = sh.id
-                        LEFT JOIN adhoc_tasks ad   ON ad.shift_id = sh.id
-                        LEFT JOIN dialpad_tickets dp ON dp.shift_id = sh.id
-                        WHERE sh.login_time>=%s AND sh.login_time<=%s
-                        GROUP BY sh.id, sh.agent_id, sh.triaged_count, sh.zd_ticket_count,
-                                 sh.logout_time, sh.login_time
-                    ) s
-                    LEFT JOIN agents ag ON ag.id=s.agent_id
-                    GROUP BY s.agent_id, ag.name HAVING COUNT(s.id)>=1 ORDER BY 6 DESC
-                """))
-            ]
-            hourly_distribution = [
-                {"hour": int(r[0]), "shift_count": r[1], "total_triaged": r[2] or 0, "avg_triaged": round(float(r[3] or 0), 2)}
-                for r in rows("SELECT EXTRACT(HOUR FROM login_time),COUNT(*),COALESCE(SUM(triaged_count),0),COALESCE(AVG(triaged_count),0) FROM shifts WHERE login_time>=%s AND login_time<=%s GROUP BY 1 ORDER BY 1")
-            ]
-            daily_distribution = [
-                {"day_of_week": int(r[0]), "day_name": DAY_NAMES[int(r[0])], "shift_count": r[1],
-                 "total_triaged": r[2] or 0, "avg_triaged": round(float(r[3] or 0), 2), "unique_agents": r[4]}
-                for r in rows("SELECT EXTRACT(DOW FROM login_time),COUNT(*),COALESCE(SUM(triaged_count),0),COALESCE(AVG(triaged_count),0),COUNT(DISTINCT agent_id) FROM shifts WHERE login_time>=%s AND login_time<=%s GROUP BY 1 ORDER BY 1")
-            ]
-            alert_analysis = [
-                {"alert_type": r[0], "count": r[1], "shifts_affected": r[2]}
-                for r in rows("SELECT alert_type,COUNT(*),COUNT(DISTINCT shift_id) FROM alerts WHERE created_at>=%s AND created_at<=%s GROUP BY 1 ORDER BY 2 DESC")
-            ]
-            monitor_analysis = [
-                {"monitor": r[0], "alert_count": r[1], "shifts_affected": r[2], "unique_alert_types": r[3]}
-                for r in rows("SELECT monitor,COUNT(*),COUNT(DISTINCT shift_id),COUNT(DISTINCT alert_type) FROM alerts WHERE created_at>=%s AND created_at<=%s GROUP BY 1 ORDER BY 2 DESC LIMIT 10")
-            ]
-            dur_rows = rows("SELECT EXTRACT(EPOCH FROM (logout_time-login_time))/3600 FROM shifts WHERE logout_time IS NOT NULL AND login_time>=%s AND login_time<=%s AND EXTRACT(EPOCH FROM (logout_time-login_time))/3600>0")
-            prod_rows = rows("SELECT triaged_count,EXTRACT(EPOCH FROM (COALESCE(logout_time,NOW())-login_time))/3600 FROM shifts WHERE login_time>=%s AND login_time<=%s AND EXTRACT(EPOCH FROM (COALESCE(logout_time,NOW())-login_time))/3600>0.5")
-            incident_pattern = [{"date": str(r[0]), "count": r[1]} for r in rows("SELECT DATE(created_at),COUNT(*) FROM incident_status WHERE created_at>=%s AND created_at<=%s GROUP BY 1 ORDER BY 1")]
-            ticket_volume    = [{"date": str(r[0]), "count": r[1]} for r in rows("SELECT DATE(created_at),COUNT(*) FROM tickets WHERE created_at>=%s AND created_at<=%s GROUP BY 1 ORDER BY 1")]
-            dialpad_volume   = [{"date": str(r[0]), "count": r[1]} for r in rows("SELECT DATE(d.created_at),COUNT(*) FROM dialpad_tickets d WHERE d.created_at>=%s AND d.created_at<=%s GROUP BY 1 ORDER BY 1")]
-            coverage_analysis = [
-                {"hour": int(r[0]), "avg_agents": round(float(r[1] or 0), 2)}
-                for r in rows("SELECT hour,AVG(agents_in_slot) FROM (SELECT EXTRACT(HOUR FROM login_time)::int AS hour,COUNT(DISTINCT agent_id) AS agents_in_slot FROM shifts WHERE login_time>=%s AND login_time<=%s GROUP BY DATE_TRUNC('hour',login_time),EXTRACT(HOUR FROM login_time)) h GROUP BY hour ORDER BY hour")
-            ]
-            agent_consistency = [
-                {"agent_id": str(r[0]), "variance": round(float(r[1] or 0), 2),
-                 "avg_triaged": round(float(r[2] or 0), 2),
-                 "consistency_score": round(100-min(float(r[1] or 0)*10, 100), 2) if r[1] else 100}
-                for r in rows("SELECT agent_id,STDDEV(triaged_count),AVG(triaged_count) FROM shifts WHERE login_time>=%s AND login_time<=%s AND logout_time IS NOT NULL GROUP BY agent_id HAVING COUNT(*)>=1 ORDER BY 2")
-            ][:10]
-
-        durations = [float(r[0]) for r in dur_rows if r[0]]
-        rates = [round(r[0]/r[1], 2) for r in prod_rows if r[0] is not None and r[1] and r[1] > 0]
-        peak_hour = max(hourly_distribution, key=lambda x: x["total_triaged"], default=None)
-
-        # Insights
-        insights = []
-        if agent_rankings:
-            top = agent_rankings[0]
-            insights.append({"type": "productivity", "severity": "info", "title": "Top Performer",
-                              "message": f"Agent {top['agent_id'][:8]} leads with {top['productivity_rate']} cases/hour", "value": top["productivity_rate"]})
-        if alert_analysis:
-            total = sum(a["count"] for a in alert_analysis)
-            if total:
-                insights.append({"type": "alert", "severity": "warning" if total > 50 else "info", "title": "Alert Pattern",
-                                  "message": f"{alert_analysis[0]['alert_type']} is the most common alert ({alert_analysis[0]['count']} occurrences)", "value": total})
-        low_cov = [c for c in coverage_analysis if c["avg_agents"] < 2]
-        if low_cov:
-            insights.append({"type": "coverage", "severity": "warning", "title": "Low Coverage Hours",
-                              "message": f"{len(low_cov)} hours have insufficient agent coverage", "value": len(low_cov)})
-        if len(performance_trends) >= 14:
-            recent = statistics.mean([t["total_triaged"] for t in performance_trends[-7:]])
-            prev   = statistics.mean([t["total_triaged"] for t in performance_trends[-14:-7]])
-            if prev > 0:
-                change = ((recent - prev) / prev) * 100
-                insights.append({"type": "trend", "severity": "success" if change > 0 else "warning", "title": "Weekly Trend",
-                                  "message": f"Productivity {'increased' if change > 0 else 'decreased'} by {abs(round(change,1))}% this week", "value": round(change, 1)})
+        names = analytics.resolve(request.args["sections"].split(",")) if request.args.get("sections") else None
+        limit = request.args.get("rankings_limit", type=int)
+        cursor = request.args.get("rankings_cursor")
+        if cursor:
+            analytics.page_rankings([], 1, cursor)  # validate before doing any work
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify({
-            "performance_trends": performance_trends, "agent_rankings": agent_rankings,
-            "hourly_distribution": hourly_distribution, "daily_distribution": daily_distribution,
-            "alert_analysis": alert_analysis, "monitor_analysis": monitor_analysis,
-            "shift_duration_stats": _describe(durations), "productivity_stats": _describe(rates),
-            "incident_pattern": incident_pattern, "ticket_volume": ticket_volume, "dialpad_volume": dialpad_volume,
-            "agent_consistency": agent_consistency, "peak_hour": peak_hour,
-            "coverage_analysis": coverage_analysis, "insights": insights,
-        })
+    try:
+        data, errors, timings, cached = analytics.run(date_from, date_to, names)
+        if errors:
+            print(f"[manager] advanced-analytics section errors: {errors}", flush=True)
+        extra = {"errors": errors, "timings_ms": timings, "cached": cached}
+        names = names or list(analytics.SECTIONS)
+        if "hourly" in names:
+            extra["peak_hour"] = max(data["hourly_distribution"], key=lambda x: x["total_triaged"], default=None)
+        if all(n in names for n in analytics.DERIVED["insights"]):
+            extra["insights"] = _insights(data)
+        if "rankings" in names and (limit or cursor):
+            extra["agent_rankings_total"] = len(data["agent_rankings"])
+            data["agent_rankings"], extra["agent_rankings_next_cursor"] = analytics.page_rankings(
+                data["agent_rankings"], max(1, min(limit or 50, 500)), cursor)
+
+        if request.args.get("encoding") == "columnar":
+            extra["columnar"] = analytics.columnar(data)
+
+        # errors: section -> message for sections that failed or timed out
+        # (their keys hold empty values); timings_ms: section -> milliseconds.
+        return jsonify({**data, **extra})
     except Exception as e:
         err_msg = str(e)
         print(f"[manager] advanced-analytics error: {err_msg}", flush=True)
@@ -346,6 +441,33 @@ def get_advanced_analytics():
         return jsonify({"error": err_msg}), 500
 
 
+def _insights(data):
+    performance_trends, agent_rankings = data["performance_trends"], data["agent_rankings"]
+    alert_analysis, coverage_analysis = data["alert_analysis"], data["coverage_analysis"]
+    insights = []
+    if agent_rankings:
+        top = agent_rankings[0]
+        insights.append({"type": "productivity", "severity": "info", "title": "Top Performer",
+                          "message": f"Agent {top['agent_id'][:8]} leads with {top['productivity_rate']} cases/hour", "value": top["productivity_rate"]})
+    if alert_analysis:
+        total = sum(a["count"] for a in alert_analysis)
+        if total:
+            insights.append({"type": "alert", "severity": "warning" if total > 50 else "info", "title": "Alert Pattern",
+                              "message": f"{alert_analysis[0]['alert_type']} is the most common alert ({alert_analysis[0]['count']} occurrences)", "value": total})
+    low_cov = [c for c in coverage_analysis if c["avg_agents"] < 2]
+    if low_cov:
+        insights.append({"type": "coverage", "severity": "warning", "title": "Low Coverage Hours",
+                          "message": f"{len(low_cov)} hours have insufficient agent coverage", "value": len(low_cov)})
+    if len(performance_trends) >= 14:
+        recent = statistics.mean([t["total_triaged"] for t in performance_trends[-7:]])
+        prev   = statistics.mean([t["total_triaged"] for t in performance_trends[-14:-7]])
+        if prev > 0:
+            change = ((recent - prev) / prev) * 100
+            insights.append({"type": "trend", "severity": "success" if change > 0 else "warning", "title": "Weekly Trend",
+                              "message": f"Productivity {'increased' if change > 0 else 'decreased'} by {abs(round(change,1))}% this week", "value": round(change, 1)})
+    return insights
+
+
 @manager_bp.route("/agent-detail/<agent_id>", methods=["GET", "OPTIONS"])
 def get_agent_detail(agent_id):
     if request.method == "OPTIONS": return "", 200
@@ -356,7 +478,7 @@ def get_agent_detail(agent_id):
 
     p = (agent_id, date_from, date_to)
     try:
-        with db() as cur:
+        with db(readonly=True) as cur:
             def trend(table):
                 cur.execute(f"SELECT DATE(t.created_at),COUNT(*) FROM {table} t JOIN shifts s ON s.id=t.shift_id WHERE s.agent_id=%s AND t.created_at>=%s AND t.created_at<=%s GROUP BY 1 ORDER BY 1", p)
                 return [{"date": str(r[0]), "count": r[1]} for r in cur.fetchall()]
@@ -368,27 +490,15 @@ def get_agent_detail(agent_id):
             monitor_breakdown = [{"monitor": r[0], "count": r[1]} for r in cur.fetchall()]
 
             cur.execute("""
-                SELECT s.id, DATE(s.login_time),
-                       EXTRACT(EPOCH FROM (COALESCE(s.logout_time,NOW())-s.login_time))/3600,
-                       s.triaged_count, s.ticket_cnt, s.alert_cnt, s.incident_cnt, s.adhoc_cnt,
-                       s.ticket_cnt, s.dialpad_cnt
-                FROM (
-                    SELECT sh.id, sh.login_time, sh.logout_time, sh.triaged_count, sh.zd_ticket_count,
-                           COUNT(DISTINCT t.id)   AS ticket_cnt,
-                           COUNT(DISTINCT a.id)   AS alert_cnt,
-                           COUNT(DISTINCT i.id)   AS incident_cnt,
-                           COUNT(DISTINCT ad.id)  AS adhoc_cnt,
-                           COUNT(DISTINCT dp.id)  AS dialpad_cnt
-                    FROM shifts sh
-                    LEFT JOIN tickets t          ON t.shift_id  = sh.id
-                    LEFT JOIN alerts a            ON a.shift_id  = sh.id
-                    LEFT JOIN incident_status i   ON i.shift_id  = sh.id
-                    LEFT JOIN adhoc_tasks ad      ON ad.shift_id = sh.id
-                    LEFT JOIN dialpad_tickets dp  ON dp.shift_id = sh.id
-                    WHERE sh.agent_id=%s AND sh.login_time>=%s AND sh.login_time<=%s
-                    GROUP BY sh.id, sh.login_time, sh.logout_time, sh.triaged_count, sh.zd_ticket_count
-                ) s
-                ORDER BY s.login_time DESC LIMIT 10
+                SELECT sh.id, DATE(sh.login_time),
+                       EXTRACT(EPOCH FROM (COALESCE(sh.logout_time,NOW())-sh.login_time))/3600,
+                       sh.triaged_count, COALESCE(c.ticket_cnt,0), COALESCE(c.alert_cnt,0),
+                       COALESCE(c.incident_cnt,0), COALESCE(c.adhoc_cnt,0),
+                       COALESCE(c.ticket_cnt,0), COALESCE(c.dialpad_cnt,0)
+                FROM shifts sh
+                LEFT JOIN shift_activity_counts c ON c.shift_id=sh.id
+                WHERE sh.agent_id=%s AND sh.login_time>=%s AND sh.login_time<=%s
+                ORDER BY sh.login_time DESC LIMIT 10
             """, p)
             recent_shifts = [
                 {"id": str(r[0]), "date": str(r[1]), "duration_hours": round(float(r[2] or 0), 2),
@@ -398,38 +508,18 @@ def get_agent_detail(agent_id):
                 for r in cur.fetchall()
             ]
             cur.execute("""
-                SELECT COUNT(s.id), COALESCE(SUM(s.triaged_count),0),
-                       COALESCE(SUM(s.ticket_cnt),0), COALESCE(SUM(s.alert_cnt),0),
-                       COALESCE(SUM(s.incident_cnt),0), COALESCE(SUM(s.adhoc_cnt),0),
-                       COALESCE(AVG(s.triaged_count),0),
-                       COALESCE(AVG(EXTRACT(EPOCH FROM (COALESCE(s.logout_time,NOW())-s.login_time))/3600),0),
-                       COALESCE(SUM(s.ticket_cnt),0)
-                FROM (
-                    SELECT sh.id, sh.triaged_count, sh.zd_ticket_count, sh.logout_time, sh.login_time,
-                           COUNT(DISTINCT t.id)  AS ticket_cnt,
-                           COUNT(DISTINCT a.id)  AS alert_cnt,
-                           COUNT(DISTINCT i.id)  AS incident_cnt,
-                           COUNT(DISTINCT ad.id) AS adhoc_cnt
-                    FROM shifts sh
-                    LEFT JOIN tickets t          ON t.shift_id  = sh.id
-                    LEFT JOIN alerts a            ON a.shift_id  = sh.id
-                    LEFT JOIN incident_status i   ON i.shift_id  = sh.id
-                    LEFT JOIN adhoc_tasks ad      ON ad.shift_id = sh.id
-                    WHERE sh.agent_id=%s AND sh.login_time>=%s AND sh.login_time<=%s
-                    GROUP BY sh.id, sh.triaged_count, sh.zd_ticket_count, sh.logout_time, sh.login_time
-                ) s
+                SELECT COUNT(sh.id), COALESCE(SUM(sh.triaged_count),0),
+                       COALESCE(SUM(c.ticket_cnt),0), COALESCE(SUM(c.alert_cnt),0),
+                       COALESCE(SUM(c.incident_cnt),0), COALESCE(SUM(c.adhoc_cnt),0),
+                       COALESCE(AVG(sh.triaged_count),0),
+                       COALESCE(AVG(EXTRACT(EPOCH FROM (COALESCE(sh.logout_time,NOW())-sh.login_time))/3600),0),
+                       COALESCE(SUM(c.ticket_cnt),0), COALESCE(SUM(c.dialpad_cnt),0)
+                FROM shifts sh
+                LEFT JOIN shift_activity_counts c ON c.shift_id=sh.id
+                WHERE sh.agent_id=%s AND sh.login_time>=%s AND sh.login_time<=%s
             """, p)
             k = cur.fetchone()
 
-            # Total Dialpad tickets for this agent over the selected date range
-            cur.execute("""
-                SELECT COUNT(*)
-                FROM dialpad_tickets d
-                JOIN shifts s ON s.id=d.shift_id
-                WHERE s.agent_id=%s AND s.login_time>=%s AND s.login_time<=%s
-            """, p)
-            total_dialpad = cur.fetchone()[0] or 0
-
             ticket_trend = trend("tickets")
             alert_trend = trend("alerts")
             incident_trend = trend("incident_status")
@@ -442,7 +532,7 @@ def get_agent_detail(agent_id):
             "total_incidents": int(k[4] or 0), "total_adhoc": int(k[5] or 0),
             "avg_triaged_per_shift": round(float(k[6] or 0), 2), "avg_shift_hours": round(float(k[7] or 0), 2),
             "total_zd_tickets": int(k[8] or 0),
-            "total_dialpad": int(total_dialpad or 0),
+            "total_dialpad": int(k[9] or 0),
             "alert_breakdown": alert_breakdown, "monitor_breakdown": monitor_breakdown,
             "ticket_trend": ticket_trend, "alert_trend": alert_trend,
             "incident_trend": incident_trend, "adhoc_trend": adhoc_trend,
@@ -456,20 +546,29 @@ def get_agent_detail(agent_id):
 
 
 @manager_bp.route("/handovers", methods=["GET", "OPTIONS"])
+@conditional.cached("handovers", "agents")
 def get_all_handovers():
+    """Handovers newest first, keyset-paginated on (created_at, id): ?limit=
+    (default 100, max 500) and ?cursor=."""
     if request.method == "OPTIONS": return "", 200
+    try:
+        limit, after = _page_args(100, 500, int)  # handovers.id is a SERIAL
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
         with db() as cur:
-            cur.execute("""
+            cur.execute(f"""
                 SELECT h.id,h.description,h.handover_to,h.created_at,COALESCE(ag.name,'Unknown Agent'),s.agent_id::text
                 FROM handovers h JOIN shifts s ON s.id=h.shift_id JOIN agents ag ON ag.id=s.agent_id
-                ORDER BY h.created_at DESC LIMIT 100
-            """)
+                {"WHERE (h.created_at, h.id) < (%s::timestamptz, %s::integer)" if after else ""}
+                ORDER BY h.created_at DESC, h.id DESC LIMIT %s
+            """, (*(after or ()), limit + 1))
             rows = cur.fetchall()
+        rows, has_more, next_cursor = _page(rows, limit, lambda r: (r[3].isoformat(), r[0]))
         return jsonify({"handovers": [
             {"id": str(r[0]), "description": r[1], "handover_to": r[2],
              "created_at": to_ist(r[3]), "from_name": r[4], "agent_id": r[5]}
             for r in rows
-        ]})
+        ], "has_more": has_more, "next_cursor": next_cursor})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
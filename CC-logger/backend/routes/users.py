@@ -2,6 +2,8 @@
 import uuid
 from flask import Blueprint, request, jsonify
 from db import db, to_ist
+from live import notify
+from rollups import mark_agent
 
 users_bp = Blueprint("users", __name__, url_prefix="/manager")
 
@@ -39,10 +41,11 @@ def list_users():
         with db() as cur:
             cur.execute("""
                 SELECT a.id::text, a.name, a.email, a.role, a.created_at,
-                       COUNT(s.id),
-                       EXISTS(SELECT 1 FROM shifts WHERE agent_id::text=a.id::text AND logout_time IS NULL)
-                FROM agents a LEFT JOIN shifts s ON s.agent_id::text=a.id::text
-                GROUP BY a.id,a.name,a.email,a.role,a.created_at ORDER BY a.created_at DESC
+                       COALESCE(s.total,0), COALESCE(s.active,false)
+                FROM agents a
+                LEFT JOIN (SELECT agent_id, COUNT(*) AS total, BOOL_OR(logout_time IS NULL) AS active
+                           FROM shifts GROUP BY agent_id) s ON s.agent_id=a.id
+                ORDER BY a.created_at DESC
             """)
             rows = cur.fetchall()
         return jsonify({"users": [
@@ -90,13 +93,15 @@ def delete_user(agent_id):
             cur.execute("SELECT COUNT(*) FROM shifts WHERE agent_id=%s AND logout_time IS NULL", (agent_id,))
             if cur.fetchone()[0] > 0:
                 return jsonify({"error": "Cannot delete an agent who is currently in an active shift"}), 409
-            cur.execute("SELECT name FROM agents WHERE id::text=%s", (agent_id,))
+            cur.execute("SELECT name FROM agents WHERE id=%s", (agent_id,))
             row = cur.fetchone()
             if not row: return jsonify({"error": "Agent not found"}), 404
 
             # Delete all shift-related history first (FKs from many tables point at shifts).
             cur.execute("SELECT COUNT(*) FROM shifts WHERE agent_id=%s", (agent_id,))
             total_shifts = int(cur.fetchone()[0] or 0)
+            if total_shifts:
+                mark_agent(cur, agent_id)  # analytics rollups for those days change
 
             for table in [
                 "tickets",
@@ -113,7 +118,8 @@ def delete_user(agent_id):
                 )
 
             cur.execute("DELETE FROM shifts WHERE agent_id=%s", (agent_id,))
-            cur.execute("DELETE FROM agents WHERE id::text=%s", (agent_id,))
+            cur.execute("DELETE FROM agents WHERE id=%s", (agent_id,))
+            notify(cur, "agent_deleted", agent_id=agent_id)
         print(f"🗑️  Agent deleted: {row[0]} UUID={agent_id}")
         if total_shifts > 0:
             return jsonify({"message": f"Agent '{row[0]}' deleted successfully (removed {total_shifts} shift(s) of history)"})
@@ -2,35 +2,28 @@
 routes/zendesk.py
 """
 import os
+import time
 import requests
+from concurrent.futures import TimeoutError as FuturesTimeout, as_completed
+from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify
+from cache import TTLCache
+from db import db
+import zendesk_client
+import zendesk_sync
 
 zendesk_bp = Blueprint("zendesk", __name__, url_prefix="/zendesk")
 
-def _require_env(key: str) -> str:
-    v = (os.getenv(key) or "").strip()
-    if not v:
-        raise RuntimeError(f"Missing required environment variable: {key}")
-    return v
-
-def _zd_base():
-    subdomain = _require_env("ZENDESK_SUBDOMAIN")
-    # Guardrail: this app is intended to run against ONE production Zendesk instance.
-    # If you want sandbox vs prod, deploy two separate apps with different env vars.
-    if "sandbox" in subdomain.lower():
-        raise RuntimeError("ZENDESK_SUBDOMAIN looks like a sandbox. Configure production Zendesk credentials.")
-    return f"https://{subdomain}.zendesk.com/api/v2"
-
-def _zd_auth():
-    email = _require_env("ZENDESK_EMAIL")
-    token = _require_env("ZENDESK_API_TOKEN")
-    return (f"{email}/token", token)
-
-def _zd_get(path, params=None):
-    url = f"{_zd_base()}{path}"
-    resp = requests.get(url, auth=_zd_auth(), params=params, timeout=10)
-    resp.raise_for_status()
-    return resp.json()
+def _zd_get(path, params=None, deadline=None):
+    return zendesk_client.client().get(path, params=params, deadline=deadline)
+
+
+def _busy(e):
+    """503 + Retry-After when no zendesk_client.slot() freed up in time."""
+    res = jsonify({"error": str(e)})
+    res.status_code = 503
+    res.headers["Retry-After"] = "2"
+    return res
 
 def _format_ticket(t):
     return {
@@ -46,6 +39,121 @@ def _format_ticket(t):
     }
 
 
+# ── caches ────────────────────────────────────────────────────────────────────
+# email -> matching Zendesk users (rarely changes), email -> formatted assigned
+# tickets (what every agent's dashboard polls). Requester names are cached in
+# zendesk_client.
+
+DEADLINE = float(os.getenv("ZENDESK_DEADLINE", "8"))
+
+# Loads are bounded by DEADLINE; callers coalesced onto one give up a little after.
+_user_cache      = TTLCache(ttl=float(os.getenv("ZENDESK_USER_TTL", "3600")), maxsize=2000, wait=DEADLINE + 1)
+_ticket_cache    = TTLCache(ttl=float(os.getenv("ZENDESK_TICKETS_TTL", "30")), maxsize=2000, wait=DEADLINE + 1)
+
+PAGE_SIZE, MAX_TICKETS = 100, 300
+
+
+def _search_users(email):
+    with zendesk_client.slot():
+        search = _zd_get("/search.json", params={"query": f'type:user email:"{email}"'},
+                         deadline=time.monotonic() + DEADLINE)
+    return [r for r in search.get("results", []) if r.get("result_type") == "user"]
+
+
+def _assigned_tickets(user_id):
+    """Up to 300 most recently updated tickets assigned to `user_id`, formatted.
+
+    Page 1 tells us `count`, so the remaining pages are requested in parallel,
+    and each page's requester lookups start as soon as that page arrives. The
+    whole fetch shares one ZENDESK_DEADLINE budget; pages or names that miss it
+    are left out rather than failing the request. Holds a zendesk_client.slot()
+    for the whole fetch."""
+    with zendesk_client.slot():
+        return _fetch_assigned(user_id, time.monotonic() + DEADLINE)
+
+
+def _fetch_assigned(user_id, deadline):
+    def page(n):
+        return _zd_get(
+            f"/users/{user_id}/tickets/assigned.json",
+            params={"per_page": PAGE_SIZE, "page": n, "sort_by": "updated_at", "sort_order": "desc"},
+            deadline=deadline,
+        )
+
+    pages, names, name_futures, seen = {}, {}, [], set()
+
+    def arrived(n, data):
+        batch = data.get("tickets", [])
+        pages[n] = batch
+        ids = {t.get("requester_id") for t in batch if t.get("requester_id")} - seen
+        seen.update(ids)
+        cached, futures = zendesk_client.lookup_requesters(list(ids), deadline)
+        names.update(cached)
+        name_futures.extend(futures)
+
+    first = page(1)
+    arrived(1, first)
+    if first.get("next_page"):
+        total = min(first.get("count") or MAX_TICKETS, MAX_TICKETS)
+        page_futures = {zendesk_client.fanout.submit(page, n): n for n in range(2, -(-total // PAGE_SIZE) + 1)}
+        try:
+            for f in as_completed(page_futures, timeout=zendesk_client.budget(deadline)):
+                try:
+                    arrived(page_futures[f], f.result())
+                except Exception as e:
+                    print(f"[zendesk] page {page_futures[f]} for user {user_id} failed: {e}", flush=True)
+        except FuturesTimeout:
+            print(f"[zendesk] deadline hit fetching tickets for user {user_id}; returning partial list", flush=True)
+
+    all_tickets = [t for n in sorted(pages) for t in pages[n]][:MAX_TICKETS]
+    zendesk_client.collect(name_futures, deadline, names)
+
+    tickets = []
+    for t in all_tickets:
+        fmt = _format_ticket(t)
+        fmt["requester"] = names.get(t.get("requester_id"), "Unknown")
+        tickets.append(fmt)
+    return tickets
+
+
+def _zd_time(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ") if dt else None
+
+
+def _synced_response(email, user, agent_name, remember):
+    """tickets-by-agent served from zendesk_tickets, or None until the first sync lands.
+    `remember` stores a user found through the Zendesk search for next time."""
+    with db() as cur:
+        cursor, last_run = zendesk_sync.state(cur)
+        if not cursor:
+            return None
+        if remember:
+            zendesk_sync.remember_agent(cur, email, user)
+        rows = zendesk_sync.assigned_tickets(cur, user["id"])
+    tickets = []
+    for r in rows:
+        fmt = _format_ticket({"id": r[0], "subject": r[1], "status": r[2], "priority": r[3],
+                              "updated_at": _zd_time(r[4]), "created_at": _zd_time(r[5]),
+                              "url": r[7], "assignee_id": r[8]})
+        fmt["requester"] = r[6] or "Unknown"
+        tickets.append(fmt)
+    res = jsonify({"tickets": tickets, "agent_name": agent_name, "total": len(tickets)})
+    res.headers["X-Cache"] = "SYNC"
+    res.headers["X-Cache-Age"] = f"{(datetime.now(timezone.utc) - last_run).total_seconds():.1f}"
+    return res
+
+
+@zendesk_bp.route("/stats", methods=["GET", "OPTIONS"])
+def client_stats():
+    """GET /zendesk/stats — per-endpoint upstream call counts and latency."""
+    if request.method == "OPTIONS":
+        return "", 200
+    try:
+        return jsonify(zendesk_client.client().stats())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @zendesk_bp.route("/debug-user", methods=["GET", "OPTIONS"])
 def debug_user():
     """GET /zendesk/debug-user?name=<n> — shows which Zendesk users match."""
@@ -55,12 +163,16 @@ def debug_user():
     if not name:
         return jsonify({"error": "name is required"}), 400
     try:
-        search = _zd_get("/search.json", params={"query": f'type:user "{name}"'})
+        with zendesk_client.slot():
+            search = _zd_get("/search.json", params={"query": f'type:user "{name}"'},
+                             deadline=time.monotonic() + DEADLINE)
         users = [
             {"id": r["id"], "name": r.get("name"), "email": r.get("email"), "role": r.get("role")}
             for r in search.get("results", []) if r.get("result_type") == "user"
         ]
         return jsonify({"query": name, "matches": users})
+    except zendesk_client.ZendeskBusy as e:
+        return _busy(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -68,8 +180,9 @@ def debug_user():
 @zendesk_bp.route("/tickets-by-agent", methods=["GET", "OPTIONS"])
 def tickets_by_agent():
     """
-    GET /zendesk/tickets-by-agent?email=<agent_email>
+    GET /zendesk/tickets-by-agent?email=<agent_email>[&refresh=1]
     Uses /users/{id}/tickets/assigned.json — strictly returns only that user's tickets.
+    Served from a short-TTL cache; X-Cache / X-Cache-Age report hit/miss and age.
     """
     if request.method == "OPTIONS":
         return "", 200
@@ -78,58 +191,46 @@ def tickets_by_agent():
     if not email:
         return jsonify({"error": "email query parameter is required"}), 400
 
+    if request.args.get("refresh") == "1":
+        _ticket_cache.invalidate(email)
+
     try:
-        # Step 1 — find user by email (unique + stable)
-        search = _zd_get("/search.json", params={"query": f'type:user email:"{email}"'})
-        all_users = [r for r in search.get("results", []) if r.get("result_type") == "user"]
+        # Step 1 — find user by email (unique + stable, so cached for a long time)
+        matched_user = known = None
+        if zendesk_sync.enabled():
+            with db() as cur:
+                matched_user = known = zendesk_sync.known_agent(cur, email)
+        if matched_user is None:
+            all_users, _, _ = _user_cache.get_or_load(email, lambda: _search_users(email))
 
-        if not all_users:
-            return jsonify({"tickets": [], "message": f"No Zendesk user found for '{email}'"})
+            if not all_users:
+                _user_cache.invalidate(email)  # don't pin a miss for the whole TTL
+                return jsonify({"tickets": [], "message": f"No Zendesk user found for '{email}'"})
 
-        # Email searches should be unique; if not, fail loudly instead of guessing.
-        if len(all_users) > 1:
-            matches = [{"id": u.get("id"), "name": u.get("name"), "email": u.get("email"), "role": u.get("role")} for u in all_users]
-            return jsonify({"error": "Multiple Zendesk users matched this email", "matches": matches}), 409
+            # Email searches should be unique; if not, fail loudly instead of guessing.
+            if len(all_users) > 1:
+                matches = [{"id": u.get("id"), "name": u.get("name"), "email": u.get("email"), "role": u.get("role")} for u in all_users]
+                return jsonify({"error": "Multiple Zendesk users matched this email", "matches": matches}), 409
 
-        matched_user = all_users[0]
-        user_id = matched_user["id"]
+            matched_user = all_users[0]
         agent_name = matched_user.get("name") or email
 
-        # Step 2 — use the dedicated assigned-tickets endpoint for this user
-        all_tickets = []
-        page = 1
-        while True:
-            data = _zd_get(
-                f"/users/{user_id}/tickets/assigned.json",
-                params={"per_page": 100, "page": page, "sort_by": "updated_at", "sort_order": "desc"}
-            )
-            batch = data.get("tickets", [])
-            all_tickets.extend(batch)
-            if not data.get("next_page") or len(all_tickets) >= 300:
-                break
-            page += 1
-
-        # Step 3 — enrich with requester names
-        requester_ids = list({t.get("requester_id") for t in all_tickets if t.get("requester_id")})
-        requester_map = {}
-        if requester_ids:
-            for i in range(0, len(requester_ids), 100):
-                chunk = requester_ids[i:i+100]
-                try:
-                    udata = _zd_get(f"/users/show_many.json?ids={','.join(str(x) for x in chunk)}")
-                    for u in udata.get("users", []):
-                        requester_map[u["id"]] = u.get("name", "Unknown")
-                except Exception:
-                    pass
+        # With the incremental sync running, answer from Postgres
+        if zendesk_sync.enabled():
+            res = _synced_response(email, matched_user, agent_name, remember=known is None)
+            if res is not None:
+                return res
 
-        tickets = []
-        for t in all_tickets:
-            fmt = _format_ticket(t)
-            fmt["requester"] = requester_map.get(t.get("requester_id"), "Unknown")
-            tickets.append(fmt)
+        # Steps 2+3 — assigned tickets with requester names, short-TTL and coalesced
+        tickets, age, status = _ticket_cache.get_or_load(email, lambda: _assigned_tickets(matched_user["id"]))
 
-        return jsonify({"tickets": tickets, "agent_name": agent_name, "total": len(tickets)})
+        res = jsonify({"tickets": tickets, "agent_name": agent_name, "total": len(tickets)})
+        res.headers["X-Cache"] = status
+        res.headers["X-Cache-Age"] = f"{age:.1f}"
+        return res
 
+    except (zendesk_client.ZendeskBusy, TimeoutError) as e:  # TimeoutError: gave up on a coalesced load
+        return _busy(e)
     except requests.HTTPError as e:
         status = e.response.status_code if e.response is not None else 500
         return jsonify({"error": f"Zendesk API error: {e}"}), status
@@ -142,16 +243,20 @@ def get_ticket(ticket_id):
     if request.method == "OPTIONS":
         return "", 200
     try:
-        data   = _zd_get(f"/tickets/{ticket_id}.json")
-        ticket = _format_ticket(data["ticket"])
-        rid = data["ticket"].get("requester_id")
-        if rid:
-            try:
-                udata = _zd_get(f"/users/{rid}.json")
-                ticket["requester"] = udata.get("user", {}).get("name", "Unknown")
-            except Exception:
-                pass
+        deadline = time.monotonic() + DEADLINE
+        with zendesk_client.slot():
+            data   = _zd_get(f"/tickets/{ticket_id}.json", deadline=deadline)
+            ticket = _format_ticket(data["ticket"])
+            rid = data["ticket"].get("requester_id")
+            if rid:
+                try:
+                    udata = _zd_get(f"/users/{rid}.json", deadline=deadline)
+                    ticket["requester"] = udata.get("user", {}).get("name", "Unknown")
+                except Exception:
+                    pass
         return jsonify({"ticket": ticket})
+    except zendesk_client.ZendeskBusy as e:
+        return _busy(e)
     except requests.HTTPError as e:
         status = e.response.status_code if e.response is not None else 500
         return jsonify({"error": f"Zendesk API error: {e}"}), status
@@ -0,0 +1,47 @@
+-- Base tables for throwaway databases (CI, benchmarks). Production's tables
+-- predate migrations.py; everything else (counters, rollups, indexes, ...)
+-- comes from `python migrations.py` on top of this. Needs Postgres 13+ (gen_random_uuid).
+
+CREATE TABLE IF NOT EXISTS agents (
+    id         UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name       TEXT,
+    email      TEXT,
+    role       TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS shifts (
+    id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    agent_id        UUID REFERENCES agents(id),
+    login_time      TIMESTAMPTZ DEFAULT NOW(),
+    logout_time     TIMESTAMPTZ,
+    triaged_count   INTEGER DEFAULT 0,
+    zd_ticket_count INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    ticket_number TEXT, description TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    monitor TEXT, alert_type TEXT, comment TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS incident_status (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    description TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS adhoc_tasks (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    task TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS handovers (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    description TEXT, handover_to TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS maintenance_logs (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    description TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS dialpad_tickets (
+    id SERIAL PRIMARY KEY, shift_id UUID REFERENCES shifts(id),
+    ticket_number TEXT, description TEXT, created_at TIMESTAMPTZ DEFAULT NOW()
+);
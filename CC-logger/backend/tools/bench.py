@@ -0,0 +1,211 @@
+"""
+tools/bench.py — latency benchmarks for the agent write path, the manager
+reads and tickets-by-agent, run in-process against a local database.
+
+    DATABASE_URL=... python tools/seed_data.py --agents 50 --shifts 200
+    DATABASE_URL=... python tools/bench.py --save before.json
+    ... change something ...
+    DATABASE_URL=... python tools/bench.py --baseline before.json
+
+Requests go through the Flask test client from --concurrency threads (writes)
+or one thread (reads), after a few untimed warm-up calls. In-process caches
+are emptied before every read unless --warm, so the numbers are for the
+query path. Queries per request come from the Server-Timing header.
+tickets-by-agent talks to tools/fake_zendesk.py, started on a free local port
+with --zd-latency seconds per upstream call.
+
+Reports n, errors, p50/p95/p99 (ms), queries per request and requests/s per
+scenario, and exits 1 when any request failed. With --baseline, prints the
+change against a saved run and also exits 1 when any p95 regressed by more
+than --tolerance percent. --only picks scenarios by name prefix (e.g.
+--only write).
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_fake_zendesk(agents, latency):
+    from werkzeug.serving import make_server
+    import fake_zendesk
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = _free_port()
+    server = make_server("127.0.0.1", port, fake_zendesk.build_app(agents, 100, latency=latency), threaded=True)
+    threading.Thread(target=server.serve_forever, name="fake-zendesk", daemon=True).start()
+    return f"http://127.0.0.1:{port}/api/v2"
+
+
+def percentile(sorted_ms, p):
+    if not sorted_ms:
+        return 0.0
+    return sorted_ms[min(len(sorted_ms) - 1, max(0, round(p / 100 * len(sorted_ms)) - 1))]
+
+
+def run_scenario(client, make_request, n, concurrency, before=None):
+    """Time `n` calls of make_request(i) -> (method, path, json body)."""
+    def one(i):
+        if before:
+            before()
+        method, path, body = make_request(i)
+        start = time.perf_counter()
+        res = client.open(path, method=method, json=body)
+        ms = (time.perf_counter() - start) * 1000
+        m = _QUERIES.search(res.headers.get("Server-Timing", ""))
+        return ms, res.status_code, int(m.group(1)) if m else 0
+
+    for i in range(min(3, n)):
+        one(i)
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(one, range(n)))
+    else:
+        samples = [one(i) for i in range(n)]
+    wall = time.perf_counter() - start
+    ms = sorted(s[0] for s in samples)
+    return {
+        "n": n, "errors": sum(s[1] >= 400 for s in samples),
+        "p50": round(percentile(ms, 50), 2), "p95": round(percentile(ms, 95), 2), "p99": round(percentile(ms, 99), 2),
+        "qpr": round(sum(s[2] for s in samples) / n, 2), "rps": round(n / wall, 1),
+    }
+
+
+def scenarios(args, cur):
+    cur.execute("""
+        SELECT s.id::text, a.id::text, a.email FROM shifts s JOIN agents a ON a.id=s.agent_id
+        WHERE s.logout_time IS NULL AND a.name LIKE 'Bench Agent %%' ORDER BY a.email
+    """)
+    active = cur.fetchall()
+    cur.execute("SELECT email FROM agents WHERE name LIKE 'Bench Agent %%' ORDER BY email")
+    emails = [r[0] for r in cur.fetchall()]
+    if not active or not emails:
+        raise SystemExit("⚠️  no seeded agents with open shifts — run tools/seed_data.py first")
+    rnd = random.Random(7)
+    shift = lambda i: active[i % len(active)][0]
+    today = datetime.now().date()
+
+    writes = [
+        ("write: add-alert", lambda i: ("POST", "/add-alert", {
+            "shift_id": shift(i), "monitor": f"monitor-{rnd.randint(1, 40)}", "alert_type": "cpu", "comment": "bench"})),
+        ("write: update-triage", lambda i: ("POST", "/update-triage", {"shift_id": shift(i), "change": 1})),
+        ("write: update-zd-count", lambda i: ("POST", "/update-zd-count", {"shift_id": shift(i), "count": i % 30})),
+    ]
+    reads = [
+        ("read: active-agents", lambda i: ("GET", "/manager/active-agents", None)),
+        ("read: analytics", lambda i: ("GET", "/manager/analytics", None)),
+        ("read: shifts", lambda i: ("GET", "/manager/shifts", None)),
+    ] + [
+        (f"read: advanced-analytics {d}d", lambda i, d=d: ("GET", f"/manager/advanced-analytics?days={d}", None))
+        for d in (7, 30, 365)
+    ] + [
+        ("read: agent-detail 30d", lambda i: ("GET", f"/manager/agent-detail/{active[i % len(active)][1]}"
+                                                    f"?date_from={today.replace(day=1)}&date_to={today}", None)),
+    ]
+    zendesk = [
+        ("zendesk: tickets-by-agent", lambda i: ("GET", f"/zendesk/tickets-by-agent?email={emails[i % len(emails)]}", None)),
+    ]
+    return ([(name, fn, args.requests, args.concurrency) for name, fn in writes]
+            + [(name, fn, args.reads, 1) for name, fn in reads + zendesk]), len(emails)
+
+
+def compare(results, baseline, tolerance):
+    regressed = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        change = {k: (r[k] - b[k]) / b[k] * 100 if b[k] else 0.0 for k in ("p50", "p95", "p99")}
+        r["vs_baseline"] = {k: round(v, 1) for k, v in change.items()}
+        if change["p95"] > tolerance:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hot endpoints against a local database.")
+    parser.add_argument("--requests", type=int, default=300, help="calls per write scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="threads for write scenarios")
+    parser.add_argument("--reads", type=int, default=30, help="calls per read scenario")
+    parser.add_argument("--zd-latency", type=float, default=0.05, help="fake Zendesk seconds per call")
+    parser.add_argument("--warm", action="store_true", help="keep in-process caches between reads")
+    parser.add_argument("--only", help="run scenarios whose name starts with this")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed p95 regression, percent")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    # Keep background work from skewing the numbers and route Zendesk to the fake.
+    os.environ.update(ANALYTICS_ROLLUP_INTERVAL="0", ZENDESK_SYNC="0", SLOW_QUERY_MS="0")
+    import psycopg2
+    with psycopg2.connect(os.getenv("DATABASE_URL"), sslmode=os.getenv("DB_SSLMODE", "require")) as conn:
+        with conn.cursor() as cur:
+            todo, n_agents = scenarios(args, cur)
+    os.environ.update(ZENDESK_BASE_URL=_start_fake_zendesk(n_agents, args.zd_latency),
+                      ZENDESK_EMAIL="bench@example.com", ZENDESK_API_TOKEN="bench")
+
+    import analytics
+    import conditional
+    from app import app
+    import zendesk_client
+    from routes import manager, zendesk
+
+    def cold():
+        for cache in (analytics._cache, conditional._cache, manager._analytics_cache, zendesk._user_cache,
+                      zendesk._ticket_cache, zendesk_client._requester_cache):
+            cache.invalidate()
+
+    client, results = app.test_client(), {}
+    print(f"{'scenario':<32}{'n':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}{'req/s':>8}")
+    for name, make, n, concurrency in todo:
+        if args.only and not name.startswith(args.only):
+            continue
+        before = None if args.warm or name.startswith("write") else cold
+        r = results[name] = run_scenario(client, make, n, concurrency, before)
+        print(f"{name:<32}{r['n']:>6}{r['errors']:>5}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}"
+              f"{r['qpr']:>7.1f}{r['rps']:>8.1f}")
+
+    status = 1 if any(r["errors"] for r in results.values()) else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(results, baseline, args.tolerance)
+        print("\nvs baseline (p50 / p95 / p99, % change):")
+        for name, r in results.items():
+            if "vs_baseline" in r:
+                v = r["vs_baseline"]
+                flag = "  ⚠️ regressed" if name in regressed else ""
+                print(f"  {name:<32}{v['p50']:>+8.1f}{v['p95']:>+8.1f}{v['p99']:>+8.1f}{flag}")
+        status = 1 if regressed else status
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"meta": {"at": datetime.now().isoformat(timespec="seconds"), **vars(args)},
+                       "results": results}, f, indent=2)
+        print(f"✅ saved {args.save}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
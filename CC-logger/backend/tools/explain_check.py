@@ -0,0 +1,110 @@
+"""
+tools/explain_check.py — fail if a hot endpoint's queries fall back to a
+sequential scan.
+
+Calls each endpoint in HOT through the Flask test client with a cursor that
+EXPLAINs every SELECT before running it (with enable_seqscan off, so the
+planner only picks a Seq Scan when no index can serve the predicate — on a
+small dev database it would otherwise prefer one anyway). Run it against a
+migrated database that has at least one agent with shifts:
+
+    DATABASE_URL=... python tools/explain_check.py
+
+Exits 1 and lists the offending statements when any unexpected Seq Scan shows up.
+"""
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import psycopg2.extensions
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Tables that may be read in full: agents is a small lookup table and
+# analytics_rollup_state holds a single row.
+ALLOW = {"agents", "analytics_rollup_state"}
+# Endpoints that aggregate a whole table by design.
+ALLOW_FOR = {
+    "/manager/users": {"shifts"},  # total shifts per agent
+}
+
+
+class ExplainCursor(psycopg2.extensions.cursor):
+    seen = []  # (statement, [relations seq-scanned])
+
+    def execute(self, sql, params=None):
+        text = sql.decode() if isinstance(sql, bytes) else sql
+        if text.lstrip().upper().startswith(("SELECT", "WITH")):
+            super().execute("SET LOCAL enable_seqscan = off")
+            super().execute("EXPLAIN (FORMAT JSON) " + text, params)
+            plan = self.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            ExplainCursor.seen.append((" ".join(text.split())[:160], list(_seq_scans(plan[0]["Plan"]))))
+        return super().execute(sql, params)
+
+
+def _seq_scans(node):
+    if node.get("Node Type") == "Seq Scan":
+        yield node.get("Relation Name")
+    for child in node.get("Plans", []):
+        yield from _seq_scans(child)
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+    import db
+    import migrations
+    from app import app
+
+    db._pool.closeall()
+    db._pool = db.BlockingPool(1, 4, os.getenv("DATABASE_URL"), sslmode=os.getenv("DB_SSLMODE", "require"),
+                               cursor_factory=ExplainCursor)
+    with db.db() as cur:
+        pending = [v for v, *_ in migrations.MIGRATIONS if v not in migrations.applied(cur)]
+        cur.execute("SELECT s.id::text, s.agent_id::text, a.email FROM shifts s JOIN agents a ON a.id=s.agent_id "
+                    "ORDER BY s.login_time DESC LIMIT 1")
+        row = cur.fetchone()
+    if pending:
+        print(f"⚠️  migrations {pending} not applied — run python migrations.py first")
+        return 2
+    if not row:
+        print("⚠️  no shifts to exercise the endpoints with")
+        return 2
+    shift_id, agent_id, email = row
+    week = f"date_from={date.today() - timedelta(days=7)}&date_to={date.today()}"
+
+    hot = [
+        ("POST", "/check-active-shift", {"agent_id": agent_id}),
+        ("GET", f"/shift-summary/{shift_id}", None),
+        ("GET", "/manager/active-agents", None),
+        ("GET", "/manager/analytics", None),
+        ("GET", "/manager/users", None),
+        ("POST", "/manager/auth/verify", {"email": email}),
+        ("GET", f"/manager/shifts?start_date={date.today() - timedelta(days=7)}", None),
+        ("GET", f"/manager/shifts?agent_id={agent_id}&limit=1", None),
+        ("GET", "/manager/handovers", None),
+        ("GET", f"/manager/shift-details/{shift_id}", None),
+        ("GET", f"/manager/shift-details?ids={shift_id}", None),
+        ("GET", f"/manager/agent-stats/{agent_id}", None),
+        ("GET", f"/manager/agent-detail/{agent_id}?{week}", None),
+        ("GET", f"/manager/advanced-analytics?{week}", None),
+    ]
+    client, failed = app.test_client(), 0
+    for method, path, body in hot:
+        ExplainCursor.seen = []
+        res = client.open(path, method=method, json=body)
+        allowed = ALLOW | ALLOW_FOR.get(path.split("?")[0], set())
+        bad = [(sql, rels) for sql, rels in ExplainCursor.seen if set(rels) - allowed]
+        status = "ok " if not bad and res.status_code < 500 else "BAD"
+        print(f"{status} {res.status_code} {method} {path}  ({len(ExplainCursor.seen)} queries)")
+        for sql, rels in bad:
+            print(f"      seq scan on {', '.join(sorted(set(rels) - allowed))}: {sql}")
+        failed += status == "BAD"
+    print("✅ no unexpected seq scans" if not failed else f"⚠️  {failed} endpoint(s) failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+tools/fake_zendesk.py — a local stand-in for the slice of the Zendesk API the
+backend uses, so the zendesk routes can be exercised without a real instance
+or burning the production rate limit.
+
+    python tools/fake_zendesk.py --port 5055 --agents 20 --tickets 250 --latency 0.1
+
+then run the backend with
+
+    ZENDESK_BASE_URL=http://127.0.0.1:5055/api/v2 ZENDESK_EMAIL=x ZENDESK_API_TOKEN=x
+
+Agents are agent0@example.com ... agentN@example.com. GET /_stats returns
+per-endpoint request counts (POST /_stats/reset clears them), which is how to
+check that caching and coalescing actually cut upstream traffic. POST
+/_touch?n=10 modifies random tickets so the incremental export has changes.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, request, jsonify
+
+STATUSES = ["new", "open", "pending", "hold", "solved", "closed"]
+
+
+def build_app(agents=20, tickets_per_agent=250, requesters=400, latency=0.0, rate_limit=0, seed=44):
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    app = Flask(__name__)
+    stats = Counter()
+    lock = threading.Lock()
+    window = []  # request timestamps in the last minute, for --rate-limit
+
+    users = {}
+    for i in range(agents):
+        uid = 1000 + i
+        users[uid] = {"id": uid, "name": f"Agent {i}", "email": f"agent{i}@example.com", "role": "agent"}
+    for i in range(requesters):
+        uid = 50000 + i
+        users[uid] = {"id": uid, "name": f"Customer {i}", "email": f"customer{i}@example.net", "role": "end-user"}
+
+    tickets = {}
+    tid = 1
+    for i in range(agents):
+        for _ in range(tickets_per_agent):
+            updated = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 30))
+            tickets[tid] = {
+                "id": tid, "subject": f"Shipment issue #{tid}", "status": rnd.choice(STATUSES),
+                "priority": rnd.choice(["low", "normal", "high", "urgent", None]),
+                "assignee_id": 1000 + i, "requester_id": 50000 + rnd.randrange(requesters),
+                "created_at": (updated - timedelta(hours=rnd.randint(1, 72))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "updated_at": updated.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "url": f"http://127.0.0.1/api/v2/tickets/{tid}.json",
+            }
+            tid += 1
+
+    @app.before_request
+    def _count():
+        if request.path.startswith("/_"):
+            return None
+        with lock:
+            stats[request.url_rule.rule if request.url_rule else request.path] += 1
+            if rate_limit:
+                now_s = time.monotonic()
+                window[:] = [t for t in window if now_s - t < 60]
+                if len(window) >= rate_limit:
+                    stats["429"] += 1
+                    res = jsonify({"error": "TooManyRequests"})
+                    res.status_code = 429
+                    res.headers["Retry-After"] = str(int(60 - (now_s - window[0])) + 1)
+                    return res
+                window.append(now_s)
+        if latency:
+            time.sleep(latency)
+        return None
+
+    @app.after_request
+    def _budget(res):
+        if rate_limit and not request.path.startswith("/_"):
+            res.headers["X-Rate-Limit"] = str(rate_limit)
+            res.headers["X-Rate-Limit-Remaining"] = str(max(rate_limit - len(window), 0))
+        return res
+
+    @app.route("/_stats", methods=["GET"])
+    def get_stats():
+        with lock:
+            return jsonify(dict(stats))
+
+    @app.route("/_stats/reset", methods=["POST"])
+    def reset_stats():
+        with lock:
+            stats.clear()
+        return jsonify({"ok": True})
+
+    @app.route("/api/v2/search.json")
+    def search():
+        query = request.args.get("query", "")
+        needle = query.split(":", 2)[-1].strip('"').lower()
+        results = [
+            {**u, "result_type": "user"} for u in users.values()
+            if needle and (needle == u["email"].lower() or needle in u["name"].lower())
+        ]
+        return jsonify({"results": results, "count": len(results)})
+
+    @app.route("/api/v2/users/<int:uid>/tickets/assigned.json")
+    def assigned(uid):
+        per_page = min(int(request.args.get("per_page", 100)), 100)
+        page = int(request.args.get("page", 1))
+        mine = sorted((t for t in tickets.values() if t["assignee_id"] == uid),
+                      key=lambda t: t["updated_at"], reverse=True)
+        chunk = mine[(page - 1) * per_page: page * per_page]
+        more = page * per_page < len(mine)
+        return jsonify({
+            "tickets": chunk, "count": len(mine),
+            "next_page": f"{request.base_url}?page={page + 1}&per_page={per_page}" if more else None,
+        })
+
+    @app.route("/api/v2/incremental/tickets/cursor.json")
+    def incremental_tickets():
+        per_page = min(int(request.args.get("per_page", 1000)), 1000)
+        if request.args.get("cursor"):
+            stamp, _, last_id = request.args["cursor"].partition("|")
+            after = (stamp, int(last_id or 0))
+        else:
+            start = datetime.fromtimestamp(int(request.args.get("start_time", 0)), timezone.utc)
+            after = (start.strftime("%Y-%m-%dT%H:%M:%SZ"), -1)
+        with lock:
+            changed = sorted((t for t in tickets.values() if (t["updated_at"], t["id"]) > after),
+                             key=lambda t: (t["updated_at"], t["id"]))
+        chunk = changed[:per_page]
+        last = chunk[-1] if chunk else None
+        return jsonify({
+            "tickets": chunk,
+            "after_cursor": f"{last['updated_at']}|{last['id']}" if last else request.args.get("cursor"),
+            "end_of_stream": len(changed) <= per_page,
+        })
+
+    @app.route("/_touch", methods=["POST"])
+    def touch():
+        """Update `n` random tickets (status + updated_at) to simulate agent work."""
+        n = int(request.args.get("n", 10))
+        stamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        with lock:
+            picked = rnd.sample(list(tickets), min(n, len(tickets)))
+            for t in picked:
+                tickets[t].update(status=rnd.choice(STATUSES), updated_at=stamp)
+        return jsonify({"touched": picked})
+
+    @app.route("/api/v2/users/show_many.json")
+    def show_many():
+        ids = [int(x) for x in (request.args.get("ids") or "").split(",") if x.strip()]
+        return jsonify({"users": [users[i] for i in ids if i in users]})
+
+    @app.route("/api/v2/users/<int:uid>.json")
+    def show_user(uid):
+        if uid not in users:
+            return jsonify({"error": "RecordNotFound"}), 404
+        return jsonify({"user": users[uid]})
+
+    @app.route("/api/v2/tickets/<int:ticket_id>.json")
+    def show_ticket(ticket_id):
+        if ticket_id not in tickets:
+            return jsonify({"error": "RecordNotFound"}), 404
+        return jsonify({"ticket": tickets[ticket_id]})
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Zendesk API locally.")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--tickets", type=int, default=250, help="tickets assigned to each agent")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute before 429s (0 = unlimited)")
+    args = parser.parse_args()
+    build_app(args.agents, args.tickets, latency=args.latency, rate_limit=args.rate_limit).run(
+        host="127.0.0.1", port=args.port, threaded=True)
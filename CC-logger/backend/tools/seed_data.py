@@ -0,0 +1,133 @@
+"""
+tools/seed_data.py — fill a local database with synthetic agents, shifts and
+activities for benchmarking (tools/bench.py).
+
+    DATABASE_URL=... python tools/seed_data.py --agents 50 --shifts 200 --days 365
+
+Agents are "Bench Agent i" / agent{i}@example.com, matching the users served by
+tools/fake_zendesk.py. Shifts are 6-10 h, start around the morning / afternoon /
+night rotas and are spread over the last --days days; each gets Poisson-
+distributed activity counts (MEANS below). The newest shift of the first
+--active agents is left open. --reset deletes previously seeded agents and
+everything hanging off them first. Counters and analytics rollups are rebuilt
+at the end. Run migrations first; never point this at production.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+EMAIL = "agent{}@example.com"
+ROTAS = (3, 11, 19)  # shift start hours, UTC (~08:30 / 16:30 / 00:30 IST)
+
+# activity table -> (mean rows per shift, columns, row factory)
+MEANS = {
+    "alerts":           (8, ("monitor", "alert_type", "comment"),
+                         lambda r, i: (f"monitor-{r.randint(1, 40)}", r.choice(["cpu", "disk", "latency", "5xx", "down"]), "")),
+    "tickets":          (12, ("ticket_number", "description"),
+                         lambda r, i: (str(100000 + i), "customer issue")),
+    "incident_status":  (1, ("description",), lambda r, i: ("incident update",)),
+    "adhoc_tasks":      (2, ("task",), lambda r, i: ("ad-hoc task",)),
+    "handovers":        (0.7, ("description", "handover_to"), lambda r, i: ("handover notes", "next shift")),
+    "maintenance_logs": (0.5, ("description",), lambda r, i: ("maintenance window",)),
+    "dialpad_tickets":  (3, ("ticket_number", "description"), lambda r, i: (str(500000 + i), "call")),
+}
+
+
+def poisson(rnd, mean):
+    """Knuth's method; fine for the small means used here."""
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rnd.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def reset(cur):
+    cur.execute("SELECT id FROM agents WHERE email LIKE 'agent%%@example.com' AND name LIKE 'Bench Agent %%'")
+    ids = [r[0] for r in cur.fetchall()]
+    if not ids:
+        return 0
+    shifts = "SELECT id FROM shifts WHERE agent_id = ANY(%s::uuid[])"
+    for table in list(MEANS) + ["shift_activity_counts"]:
+        cur.execute(f"DELETE FROM {table} WHERE shift_id IN ({shifts})", (ids,))
+    cur.execute("DELETE FROM shifts WHERE agent_id = ANY(%s::uuid[])", (ids,))
+    cur.execute("DELETE FROM agents WHERE id = ANY(%s::uuid[])", (ids,))
+    return len(ids)
+
+
+def seed(cur, agents, shifts, days, active, rnd):
+    now = datetime.now(timezone.utc)
+    agent_rows = [(str(uuid.UUID(int=rnd.getrandbits(128))), f"Bench Agent {i}", EMAIL.format(i), "agent")
+                  for i in range(agents)]
+    execute_values(cur, "INSERT INTO agents (id, name, email, role) VALUES %s", agent_rows)
+
+    shift_rows, activity_rows, seq = [], {t: [] for t in MEANS}, 0
+    for n, (agent_id, *_) in enumerate(agent_rows):
+        starts = sorted(
+            (now - timedelta(days=rnd.uniform(0, days))).replace(hour=rnd.choice(ROTAS), minute=rnd.randint(0, 59))
+            for _ in range(shifts)
+        )
+        for j, login in enumerate(starts):
+            login = min(login, now - timedelta(minutes=5))
+            hours = rnd.uniform(6, 10)
+            logout = None if (j == len(starts) - 1 and n < active) else min(login + timedelta(hours=hours), now)
+            end = logout or now
+            shift_id = str(uuid.UUID(int=rnd.getrandbits(128)))
+            counts = {t: poisson(rnd, mean) for t, (mean, _, _) in MEANS.items()}
+            shift_rows.append((shift_id, agent_id, login, logout, rnd.randint(15, 70), counts["tickets"]))
+            for table, (_, _, make) in MEANS.items():
+                for _ in range(counts[table]):
+                    seq += 1
+                    at = login + (end - login) * rnd.random()
+                    activity_rows[table].append((shift_id, *make(rnd, seq), at))
+    execute_values(cur, "INSERT INTO shifts (id, agent_id, login_time, logout_time, triaged_count, zd_ticket_count) "
+                        "VALUES %s", shift_rows, page_size=1000)
+    for table, rows in activity_rows.items():
+        cols = ", ".join(("shift_id",) + MEANS[table][1] + ("created_at",))
+        execute_values(cur, f"INSERT INTO {table} ({cols}) VALUES %s", rows, page_size=2000)
+    return len(shift_rows), {t: len(r) for t, r in activity_rows.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic shifts and activities.")
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--shifts", type=int, default=200, help="shifts per agent")
+    parser.add_argument("--days", type=int, default=365, help="spread shifts over the last N days")
+    parser.add_argument("--active", type=int, default=10, help="agents whose newest shift stays open")
+    parser.add_argument("--seed", type=int, default=44)
+    parser.add_argument("--reset", action="store_true", help="delete previously seeded agents first")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    import counters
+    import rollups
+    from db import db, init_pool
+    init_pool()
+
+    with db() as cur:
+        if args.reset:
+            print(f"✅ removed {reset(cur)} seeded agent(s)")
+        cur.execute("SELECT COUNT(*) FROM agents WHERE email LIKE 'agent%%@example.com' AND name LIKE 'Bench Agent %%'")
+        if cur.fetchone()[0]:
+            print("⚠️  seeded agents already exist — pass --reset to replace them")
+            return 2
+        n, per_table = seed(cur, args.agents, args.shifts, args.days, args.active, random.Random(args.seed))
+        counters.rebuild(cur)
+        rollups.rebuild(cur)
+    print(f"✅ seeded {args.agents} agents, {n} shifts, "
+          + ", ".join(f"{v} {k}" for k, v in per_table.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
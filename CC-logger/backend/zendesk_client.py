@@ -0,0 +1,256 @@
+"""Zendesk API client.
+
+One process-wide client holds a keep-alive `requests.Session`, so fetching
+several pages for one agent reuses the same TLS connection instead of doing a
+fresh handshake per call. Configuration is read and validated once.
+
+Rate limits: a 429/503 with a short Retry-After is slept out and retried, and when
+X-Rate-Limit-Remaining drops under ZENDESK_RATE_LOW_WATER percent of the
+limit, requests are paced with a delay that doubles while the budget stays
+low and resets once it recovers. Per-endpoint call counts and latencies are
+kept in `stats()`.
+
+Requester names (requester id -> name) are cached for ZENDESK_REQUESTER_TTL
+and resolved with show_many calls on the shared `fanout` pool; both the
+zendesk routes and the background sync use `requester_names`.
+
+`slot()` caps how many request threads may be inside Zendesk work at once
+(ZENDESK_MAX_INFLIGHT per process); past that, callers get ZendeskBusy after
+ZENDESK_QUEUE_WAIT seconds instead of tying up another worker thread.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from cache import TTLCache
+
+
+def _require_env(key: str) -> str:
+    v = (os.getenv(key) or "").strip()
+    if not v:
+        raise RuntimeError(f"Missing required environment variable: {key}")
+    return v
+
+
+class ZendeskBusy(RuntimeError):
+    """Every Zendesk slot stayed taken for ZENDESK_QUEUE_WAIT seconds."""
+
+
+MAX_INFLIGHT = int(os.getenv("ZENDESK_MAX_INFLIGHT", "4"))
+QUEUE_WAIT = float(os.getenv("ZENDESK_QUEUE_WAIT", "0.2"))
+_slots = threading.BoundedSemaphore(MAX_INFLIGHT)
+
+
+@contextmanager
+def slot():
+    if not _slots.acquire(timeout=QUEUE_WAIT):
+        raise ZendeskBusy(f"Zendesk is busy ({MAX_INFLIGHT} requests in flight), retry shortly")
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+def _endpoint(path):
+    """/users/123/tickets/assigned.json?x=1 -> /users/{id}/tickets/assigned.json"""
+    return re.sub(r"/\d+", "/{id}", path.split("?", 1)[0])
+
+
+class ZendeskClient:
+    def __init__(self, base_url, email, token, timeout=10, pool_size=10, max_retries=3,
+                 low_water=10, max_backoff=5.0, max_retry_wait=10.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.low_water = low_water
+        self.max_backoff = max_backoff
+        self.max_retry_wait = max_retry_wait
+
+        self.session = requests.Session()
+        self.session.auth = (f"{email}/token", token)
+        self.session.headers["Accept"] = "application/json"
+        # Connection errors and gateway hiccups are retried by urllib3; 429s are
+        # handled below so the pacing state sees them.
+        adapter = HTTPAdapter(
+            pool_connections=2, pool_maxsize=pool_size,
+            max_retries=Retry(total=2, connect=2, read=1, status=2, backoff_factor=0.3,
+                              status_forcelist=(502, 504), allowed_methods=frozenset({"GET"}),
+                              respect_retry_after_header=False, raise_on_status=False),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._pace = 0.0        # seconds to wait before each call while the budget is low
+        self._stats = {}        # endpoint -> {"calls", "errors", "total_ms", "max_ms"}
+
+    @classmethod
+    def from_env(cls):
+        # ZENDESK_BASE_URL points the client at a local fake (tools/fake_zendesk.py).
+        base = (os.getenv("ZENDESK_BASE_URL") or "").strip()
+        if not base:
+            subdomain = _require_env("ZENDESK_SUBDOMAIN")
+            # Guardrail: this app is intended to run against ONE production Zendesk instance.
+            # If you want sandbox vs prod, deploy two separate apps with different env vars.
+            if "sandbox" in subdomain.lower():
+                raise RuntimeError("ZENDESK_SUBDOMAIN looks like a sandbox. Configure production Zendesk credentials.")
+            base = f"https://{subdomain}.zendesk.com/api/v2"
+        return cls(
+            base, _require_env("ZENDESK_EMAIL"), _require_env("ZENDESK_API_TOKEN"),
+            timeout=float(os.getenv("ZENDESK_TIMEOUT", "10")),
+            pool_size=int(os.getenv("ZENDESK_POOL_SIZE", "10")),
+            low_water=float(os.getenv("ZENDESK_RATE_LOW_WATER", "10")),
+        )
+
+    # ── rate limiting ─────────────────────────────────────────────────────────
+
+    def _observe_budget(self, resp):
+        remaining, limit = resp.headers.get("X-Rate-Limit-Remaining"), resp.headers.get("X-Rate-Limit")
+        if remaining is None or not limit:
+            return
+        try:
+            low = float(remaining) * 100 / float(limit) < self.low_water
+        except ValueError:
+            return
+        with self._lock:
+            self._pace = min(max(self._pace * 2, 0.25), self.max_backoff) if low else 0.0
+
+    @staticmethod
+    def _retry_after(resp, attempt):
+        try:
+            return float(resp.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return min(2 ** attempt, 30)
+
+    # ── requests ──────────────────────────────────────────────────────────────
+
+    def _record(self, endpoint, status, seconds):
+        metrics.observe_zendesk(endpoint, status, seconds)
+        ms = seconds * 1000
+        with self._lock:
+            s = self._stats.setdefault(endpoint, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["calls"] += 1
+            s["errors"] += status is None or status >= 400
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+
+    @staticmethod
+    def _left(deadline, endpoint):
+        """Seconds before `deadline` (a time.monotonic() value), or None without one."""
+        if deadline is None:
+            return None
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise requests.Timeout(f"deadline passed before calling {endpoint}")
+        return left
+
+    def get(self, path, params=None, timeout=None, deadline=None):
+        """GET and decode JSON. `deadline` (time.monotonic()) bounds the whole call:
+        each attempt's timeout and the pacing sleep are capped at the time left,
+        and a 429/503 whose Retry-After runs past it fails instead of sleeping."""
+        endpoint = _endpoint(path)
+        for attempt in range(self.max_retries + 1):
+            if self._pace:
+                left = self._left(deadline, endpoint)
+                time.sleep(self._pace if left is None else min(self._pace, left))
+            left = self._left(deadline, endpoint)
+            limit = timeout or self.timeout
+            start = time.perf_counter()
+            try:
+                resp = self.session.get(f"{self.base_url}{path}", params=params,
+                                        timeout=limit if left is None else min(limit, left))
+            except requests.RequestException:
+                self._record(endpoint, None, time.perf_counter() - start)
+                raise
+            self._record(endpoint, resp.status_code, time.perf_counter() - start)
+            self._observe_budget(resp)
+            if resp.status_code in (429, 503) and attempt < self.max_retries:
+                wait = self._retry_after(resp, attempt)
+                with self._lock:
+                    self._pace = min(max(self._pace * 2, 0.25), self.max_backoff)
+                # Longer than max_retry_wait or past the deadline: fail now, don't hold the worker.
+                if wait <= self.max_retry_wait and (deadline is None or time.monotonic() + wait < deadline):
+                    time.sleep(wait)
+                    continue
+            resp.raise_for_status()
+            return resp.json()
+
+    def stats(self):
+        with self._lock:
+            endpoints = {
+                ep: {**s, "avg_ms": round(s["total_ms"] / s["calls"], 1), "total_ms": round(s["total_ms"], 1),
+                     "max_ms": round(s["max_ms"], 1)}
+                for ep, s in self._stats.items()
+            }
+            return {"endpoints": endpoints, "pacing_seconds": self._pace}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    """The process-wide ZendeskClient, built from env on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ZendeskClient.from_env()
+    return _client
+
+
+# ── requester names ───────────────────────────────────────────────────────────
+
+_requester_cache = TTLCache(ttl=float(os.getenv("ZENDESK_REQUESTER_TTL", "86400")), maxsize=10000)
+
+# Bounded pool for fanning out page and show_many calls within one request.
+fanout = ThreadPoolExecutor(max_workers=int(os.getenv("ZENDESK_FANOUT", "8")), thread_name_prefix="zendesk")
+
+
+def budget(deadline):
+    """Seconds left before `deadline` (None = use the client's own timeout)."""
+    return None if deadline is None else max(deadline - time.monotonic(), 0.05)
+
+
+def _show_many(chunk, deadline=None):
+    udata = client().get(f"/users/show_many.json?ids={','.join(str(x) for x in chunk)}", deadline=deadline)
+    names = {u["id"]: u.get("name", "Unknown") for u in udata.get("users", [])}
+    for rid, name in names.items():
+        _requester_cache.set(rid, name)
+    return names
+
+
+def lookup_requesters(ids, deadline=None):
+    """Resolve cached requester names now; return (names, futures for the rest)."""
+    names, missing = {}, []
+    for rid in ids:
+        hit = _requester_cache.get(rid)
+        if hit:
+            names[rid] = hit[0]
+        else:
+            missing.append(rid)
+    futures = [fanout.submit(_show_many, missing[i:i+100], deadline) for i in range(0, len(missing), 100)]
+    return names, futures
+
+
+def collect(futures, deadline, into):
+    """Merge finished show_many results into `into`; anything late or failed stays 'Unknown'."""
+    done, _ = wait(futures, timeout=budget(deadline))
+    for f in done:
+        if f.exception() is None:
+            into.update(f.result())
+    return into
+
+
+def requester_names(ids, deadline=None):
+    """Map requester id -> name, hitting show_many (in parallel) only for ids not cached."""
+    names, futures = lookup_requesters(ids, deadline)
+    return collect(futures, deadline, names)
@@ -0,0 +1,226 @@
+"""Incremental Zendesk ticket sync.
+
+A background thread follows Zendesk's cursor-based incremental ticket export
+and upserts every changed ticket into `zendesk_tickets`. The export cursor is
+stored in `zendesk_sync_state` in the same transaction as the rows it covers,
+so a crash never skips changes. Upstream traffic is proportional to the number
+of tickets that changed, not to agents x pollers, and /zendesk/tickets-by-agent
+and /update-zd-count read from Postgres instead of paging the API.
+
+Enable with ZENDESK_SYNC=1. Every gunicorn worker starts the thread, but a
+Postgres advisory lock lets only one of them talk to Zendesk per tick. Each
+page is fetched first and then written in its own short transaction.
+
+    python zendesk_sync.py init   # create the tables
+    python zendesk_sync.py once   # run a single sync pass in the foreground
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+if __name__ == "__main__":  # before the imports below read their settings
+    from dotenv import load_dotenv
+    load_dotenv()
+
+import zendesk_client
+from db import connect, db, init_pool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zendesk_tickets (
+    id             BIGINT PRIMARY KEY,
+    subject        TEXT,
+    status         TEXT,
+    priority       TEXT,
+    assignee_id    BIGINT,
+    requester_id   BIGINT,
+    requester_name TEXT,
+    url            TEXT,
+    created_at     TIMESTAMPTZ,
+    updated_at     TIMESTAMPTZ,
+    synced_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS zendesk_tickets_assignee_updated_idx
+    ON zendesk_tickets (assignee_id, updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS zendesk_agents (
+    email       TEXT PRIMARY KEY,
+    zd_user_id  BIGINT NOT NULL,
+    name        TEXT,
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS zendesk_sync_state (
+    name        TEXT PRIMARY KEY,
+    cursor      TEXT,
+    last_run    TIMESTAMPTZ,
+    last_count  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+STREAM = "tickets"
+LOCK_KEY = 774400101  # pg advisory lock id for the sync leader
+INTERVAL = float(os.getenv("ZENDESK_SYNC_INTERVAL", "60"))
+BACKFILL_DAYS = int(os.getenv("ZENDESK_SYNC_BACKFILL_DAYS", "30"))
+MAX_PAGES = 20  # per tick; the export endpoint is rate limited to 10 req/min
+
+_UPSERT = """
+    INSERT INTO zendesk_tickets (id, subject, status, priority, assignee_id, requester_id,
+                                 requester_name, url, created_at, updated_at, synced_at)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,NOW())
+    ON CONFLICT (id) DO UPDATE SET
+        subject=EXCLUDED.subject, status=EXCLUDED.status, priority=EXCLUDED.priority,
+        assignee_id=EXCLUDED.assignee_id, requester_id=EXCLUDED.requester_id,
+        requester_name=COALESCE(EXCLUDED.requester_name, zendesk_tickets.requester_name),
+        url=EXCLUDED.url, created_at=EXCLUDED.created_at, updated_at=EXCLUDED.updated_at, synced_at=NOW()
+    WHERE zendesk_tickets.updated_at IS NULL OR EXCLUDED.updated_at >= zendesk_tickets.updated_at
+"""
+
+
+def enabled():
+    return os.getenv("ZENDESK_SYNC", "").strip() == "1"
+
+
+def state(cur):
+    """(cursor, last_run) for the ticket stream, or (None, None) before the first sync."""
+    cur.execute("SELECT cursor, last_run FROM zendesk_sync_state WHERE name=%s", (STREAM,))
+    return cur.fetchone() or (None, None)
+
+
+def remember_agent(cur, email, user):
+    cur.execute(
+        "INSERT INTO zendesk_agents (email, zd_user_id, name) VALUES (%s,%s,%s) "
+        "ON CONFLICT (email) DO UPDATE SET zd_user_id=EXCLUDED.zd_user_id, name=EXCLUDED.name, updated_at=NOW() "
+        "WHERE (zendesk_agents.zd_user_id, zendesk_agents.name) IS DISTINCT FROM (EXCLUDED.zd_user_id, EXCLUDED.name)",
+        (email.lower(), user["id"], user.get("name")),
+    )
+
+
+def known_agent(cur, email):
+    """The Zendesk user remembered for `email`, or None."""
+    cur.execute("SELECT zd_user_id, name FROM zendesk_agents WHERE email=%s", (email.lower(),))
+    r = cur.fetchone()
+    return {"id": r[0], "name": r[1]} if r else None
+
+
+def assigned_tickets(cur, zd_user_id, limit=300):
+    """Most recently updated synced tickets assigned to `zd_user_id`, as raw rows."""
+    cur.execute("""
+        SELECT id, subject, status, priority, updated_at, created_at, requester_name, url, assignee_id
+        FROM zendesk_tickets WHERE assignee_id=%s AND status<>'deleted'
+        ORDER BY updated_at DESC LIMIT %s
+    """, (zd_user_id, limit))
+    return cur.fetchall()
+
+
+def solved_tickets(cur, shift_id):
+    """Solved/closed tickets of the shift's agent updated since the shift started,
+    shaped like the update-zd-count payload — or None when the sync has not
+    completed yet or the agent's Zendesk id is unknown."""
+    if not enabled() or not state(cur)[0]:
+        return None
+    cur.execute("""
+        SELECT za.zd_user_id, s.login_time FROM shifts s
+        JOIN agents a ON a.id=s.agent_id
+        JOIN zendesk_agents za ON za.email=LOWER(a.email)
+        WHERE s.id=%s
+    """, (shift_id,))
+    r = cur.fetchone()
+    if not r:
+        return None
+    cur.execute("""
+        SELECT id, subject, updated_at FROM zendesk_tickets
+        WHERE assignee_id=%s AND status IN ('solved','closed') AND updated_at>=%s
+    """, r)
+    return [{"id": t[0], "subject": t[1], "updated_at": t[2].isoformat()} for t in cur.fetchall()]
+
+
+def _page(cursor):
+    zd = zendesk_client.client()
+    if cursor:
+        return zd.get("/incremental/tickets/cursor.json", params={"cursor": cursor})
+    start = datetime.now(timezone.utc) - timedelta(days=BACKFILL_DAYS)
+    return zd.get("/incremental/tickets/cursor.json", params={"start_time": int(start.timestamp())})
+
+
+def _store(cursor, data):
+    """Upsert one export page and advance the cursor, in one short transaction."""
+    batch = data.get("tickets", [])
+    names = zendesk_client.requester_names(list({t.get("requester_id") for t in batch if t.get("requester_id")}))
+    with db() as cur:
+        for t in batch:
+            cur.execute(_UPSERT, (
+                t["id"], t.get("subject"), t.get("status"), t.get("priority"), t.get("assignee_id"),
+                t.get("requester_id"), names.get(t.get("requester_id")), t.get("url"),
+                t.get("created_at"), t.get("updated_at"),
+            ))
+        cur.execute(
+            "INSERT INTO zendesk_sync_state (name, cursor, last_run, last_count) VALUES (%s,%s,NOW(),%s) "
+            "ON CONFLICT (name) DO UPDATE SET cursor=EXCLUDED.cursor, last_run=NOW(), last_count=EXCLUDED.last_count",
+            (STREAM, data.get("after_cursor") or cursor, len(batch)),
+        )
+    return len(batch)
+
+
+def sync_once():
+    """Pull every change since the stored cursor. Returns tickets upserted, or
+    None when another worker holds the sync lock.
+
+    The lock is a session-level advisory lock on a dedicated connection, held
+    for the whole run; Zendesk calls (and their rate-limit sleeps) happen
+    outside any pooled connection or transaction."""
+    lock = connect()
+    try:
+        lock.autocommit = True
+        with lock.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                return None
+        with db() as cur:
+            cursor, _ = state(cur)
+        total = 0
+        for _ in range(MAX_PAGES):
+            data = _page(cursor)
+            total += _store(cursor, data)
+            cursor = data.get("after_cursor") or cursor
+            if data.get("end_of_stream", True):
+                break
+        return total
+    finally:
+        lock.close()  # ends the session, releasing the lock
+
+
+def _loop():
+    while True:
+        try:
+            n = sync_once()
+            if n:
+                print(f"[zendesk-sync] upserted {n} ticket(s)", flush=True)
+        except Exception as e:
+            print(f"[zendesk-sync] error: {e}", flush=True)
+        time.sleep(INTERVAL)
+
+
+def start():
+    """Start the background sync thread if ZENDESK_SYNC=1."""
+    if not enabled():
+        return None
+    t = threading.Thread(target=_loop, name="zendesk-sync", daemon=True)
+    t.start()
+    print(f"✅ Zendesk sync every {INTERVAL:g}s")
+    return t
+
+
+if __name__ == "__main__":
+    init_pool()
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "init":
+        with db() as cur:
+            cur.execute(SCHEMA)
+        print("✅ zendesk sync tables ready")
+    elif cmd == "once":
+        print(f"✅ upserted {sync_once()} ticket(s)")
+    else:
+        print("usage: python zendesk_sync.py init|once")
+        sys.exit(2)
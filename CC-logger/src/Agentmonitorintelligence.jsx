@@ -567,25 +567,22 @@ function AgentDetailPanel({ agent, api, days, refreshKey = 0, onBack }) {
   const loadRawAlerts = useCallback(async () => {
     setAlertsLoading(true);
     try {
-      const detail = await fetch(`${api}/manager/agent-detail/${agent.agent_id}?days=${days}`).then(r => r.json());
+      const detail = data || await fetch(`${api}/manager/agent-detail/${agent.agent_id}?days=${days}`).then(r => r.json());
       const shiftIds = (detail.recent_shifts || []).map(s => s.id).filter(Boolean);
-      const results = await Promise.all(
-        shiftIds.map(id =>
-          fetch(`${api}/manager/shift-details/${id}`)
-            .then(r => r.json())
-            .then(sd => (sd.alerts || []).map(a => ({
-              ...a,
-              _shift_date: sd.login_time,
-              _agent: sd.agent_name,
-            })))
-            .catch(() => [])
-        )
-      );
+      // One batched request for every recent shift instead of one per shift
+      const batch = shiftIds.length
+        ? await fetch(`${api}/manager/shift-details?ids=${shiftIds.join(",")}`).then(r => r.json())
+        : { shifts: [] };
+      const results = (batch.shifts || []).map(sd => (sd.alerts || []).map(a => ({
+        ...a,
+        _shift_date: sd.login_time,
+        _agent: sd.agent_name,
+      })));
       setAllAlerts(results.flat().sort((a, b) => new Date(b.created_at) - new Date(a.created_at)));
     } catch (_) { /* silent */ }
     setAlertsLoading(false);
     setAlertsFetched(true);
-  }, [agent.agent_id, api, days]);
+  }, [agent.agent_id, api, days, data]);
 
   useEffect(() => { load(); }, [load]);
 
@@ -767,7 +764,7 @@ function MonitorIntelligenceView({ api, days, refreshKey = 0 }) {
 
   useEffect(() => {
     setLoading(true); setErr(null);
-    fetch(`${api}/manager/advanced-analytics?days=${days}`)
+    fetch(`${api}/manager/advanced-analytics?days=${days}&sections=monitor_analysis`)
       .then(async r => {
         const body = await r.json().catch(() => ({}));
         if (!r.ok) throw new Error(body?.error || `HTTP ${r.status}`);
@@ -868,7 +865,7 @@ export default function AgentMonitorIntelligence({ api }) {
 
   const loadAgents = useCallback(() => {
     setAgLoading(true); setAgErr(null);
-    fetch(`${api}/manager/advanced-analytics?days=${days}`)
+    fetch(`${api}/manager/advanced-analytics?days=${days}&sections=agent_rankings`)
       .then(async r => {
         const body = await r.json().catch(() => ({}));
         if (!r.ok) throw new Error(body?.error || `HTTP ${r.status}`);
@@ -457,11 +457,18 @@ const [adhocTask, setAdhocTask]           = useState("");
     closed:  { bg:"rgba(34,197,94,0.12)",   border:"rgba(34,197,94,0.35)",   text:"#4ade80",  label:"Closed ✔ Done"  },
   };
 
-  const fetchZdByAgent = async (agentEmail) => {
+  const fetchZdByAgent = async (agentEmail, refresh = false) => {
     setZdLoading(true);
     setZdError(null);
     try {
-      const res = await fetch(`${API}/zendesk/tickets-by-agent?email=${encodeURIComponent(agentEmail)}`);
+      const url = `${API}/zendesk/tickets-by-agent?email=${encodeURIComponent(agentEmail)}${refresh ? "&refresh=1" : ""}`;
+      let res = await fetch(url);
+      // 503 = the backend's Zendesk slots are all busy; retry once after Retry-After (plus jitter).
+      if (res.status === 503) {
+        const wait = (Number(res.headers.get("Retry-After")) || 2) * 1000 + Math.random() * 1000;
+        await new Promise(r => setTimeout(r, wait));
+        res = await fetch(url);
+      }
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const data = await res.json();
       const incoming = data.tickets || [];
@@ -1738,7 +1745,7 @@ const handleEndShift = async () => {
                       <div style={{ width:16, height:16, border:`2px solid ${C.border}`, borderTop:`2px solid ${C.accentLight}`, borderRadius:"50%", animation:"spin .8s linear infinite" }}/>
                     )}
                     <button
-                      onClick={() => authUser?.email && fetchZdByAgent(authUser.email)}
+                      onClick={() => authUser?.email && fetchZdByAgent(authUser.email, true)}
                       disabled={zdLoading}
                       style={{ all:"unset", cursor:"pointer", padding:"4px 10px", borderRadius:6, border:`1px solid ${C.border}`, fontSize:11, color:C.inkMid, fontFamily:"'Plus Jakarta Sans',sans-serif" }}
                     >
@@ -652,6 +652,16 @@ function AgentStatsModal({ agentStats, isLoading, error, onClose, formatDate, fo
    MAIN COMPONENT
 ══════════════════════════════════════════════════════════════════════════ */
 
+// ── ?encoding=columnar: series arrive as { field: [values] }; rebuild rows ─
+function fromColumnar(data) {
+  for (const key of data.columnar || []) {
+    const cols = data[key];
+    const fields = Object.keys(cols);
+    data[key] = cols[fields[0]].map((_, i) => Object.fromEntries(fields.map(f => [f, cols[f][i]])));
+  }
+  return data;
+}
+
 function ManagerDashboard() {
   const API = "https://alerttracker-ayfwbqbcbvbmh4g3.westeurope-01.azurewebsites.net";
 
@@ -666,6 +676,8 @@ function ManagerDashboard() {
   const [shiftDetails,      setShiftDetails]      = useState(null);
   const [shiftDetailOpen,   setShiftDetailOpen]   = useState(false);  // separate open flag prevents null-flash
   const [filters,           setFilters]           = useState({ startDate: "", endDate: "", agentId: "" });
+  const [shiftsCursor,      setShiftsCursor]      = useState(null);
+  const [agentOptions,      setAgentOptions]      = useState([]);
 
   const [loading, setLoading] = useState({
     activeAgents:      false,
@@ -717,7 +729,9 @@ function ManagerDashboard() {
     }
   }, [API]);
 
-  const fetchShifts = useCallback(async () => {
+  // Pass the previous page's next_cursor to append the next (older) page.
+  const fetchShifts = useCallback(async (cursor) => {
+    const more = typeof cursor === "string";
     setLoading(p => ({ ...p, shifts: true }));
     setErrors(p => ({ ...p, shifts: null }));
     try {
@@ -725,13 +739,15 @@ function ManagerDashboard() {
       if (filters.startDate) params.append("start_date", filters.startDate);
       if (filters.endDate)   params.append("end_date",   filters.endDate);
       if (filters.agentId)   params.append("agent_id",   filters.agentId);
+      if (more)              params.append("cursor",     cursor);
       const res = await fetch(`${API}/manager/shifts?${params.toString()}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const data = await res.json();
-      setAllShifts(data.shifts ?? []);
+      setAllShifts(prev => more ? [...prev, ...(data.shifts ?? [])] : (data.shifts ?? []));
+      setShiftsCursor(data.has_more ? data.next_cursor : null);
     } catch (err) {
       setErrors(p => ({ ...p, shifts: err.message }));
-      setAllShifts([]);
+      if (!more) setAllShifts([]);
     } finally {
       setLoading(p => ({ ...p, shifts: false }));
     }
@@ -743,9 +759,9 @@ function ManagerDashboard() {
     setLoading(p => ({ ...p, advancedAnalytics: true }));
     setErrors(p => ({ ...p, advancedAnalytics: null }));
     try {
-      const res = await fetch(`${API}/manager/advanced-analytics?${qs}`);
+      const res = await fetch(`${API}/manager/advanced-analytics?${qs}&encoding=columnar`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      setAdvancedAnalytics(await res.json());
+      setAdvancedAnalytics(fromColumnar(await res.json()));
     } catch (err) {
       setErrors(p => ({ ...p, advancedAnalytics: err.message }));
     } finally {
@@ -799,23 +815,67 @@ function ManagerDashboard() {
 
   /* ── Effects ── */
 
-  // Boot + 30 s auto-refresh
+  // Live feed: snapshot + deltas pushed over SSE. Polling is the fallback
+  // while the stream is down (EventSource reconnects on its own).
+  const [live, setLive] = useState(false);
+  const [streamKey, setStreamKey] = useState(0);
+
   useEffect(() => {
-    fetchActiveAgents();
-    fetchAnalytics();
-    const interval = setInterval(() => {
+    if (typeof EventSource === "undefined") return;
+    const es = new EventSource(`${API}/manager/stream`);
+    const hours = a => ({ ...a, hours_active: (Date.now() - Date.parse(a.login_time)) / 3600000 });
+    es.addEventListener("snapshot", e => {
+      const snap = JSON.parse(e.data);
+      setActiveAgents(snap.active_agents.map(hours));
+      setAnalytics(snap.analytics);
+      setErrors(p => ({ ...p, activeAgents: null, analytics: null }));
+      setLive(true);
+    });
+    es.addEventListener("delta", e => {
+      const d = JSON.parse(e.data);
+      setActiveAgents(prev => {
+        const gone = new Set([...d.removed, ...d.upsert.map(a => a.shift_id)]);
+        return [...d.upsert.map(hours), ...prev.filter(a => !gone.has(a.shift_id))]
+          .sort((a, b) => Date.parse(b.login_time) - Date.parse(a.login_time));
+      });
+      if (d.analytics) setAnalytics(d.analytics);
+    });
+    es.addEventListener("reset", () => { es.close(); setLive(false); setStreamKey(k => k + 1); });
+    es.onerror = () => setLive(false);
+    const tick = setInterval(() => setActiveAgents(prev => prev.map(hours)), 60000);
+    return () => { es.close(); clearInterval(tick); setLive(false); };
+  }, [API, streamKey]);
+
+  // Boot + 30 s auto-refresh (active agents / summary only while the live feed is down)
+  useEffect(() => {
+    if (!live) {
       fetchActiveAgents();
       fetchAnalytics();
+    }
+    const interval = setInterval(() => {
+      if (!live) {
+        fetchActiveAgents();
+        fetchAnalytics();
+      }
       if (activeView === "analytics") fetchAdvancedAnalytics();
     }, 30000);
     return () => clearInterval(interval);
-  }, [fetchActiveAgents, fetchAnalytics, fetchAdvancedAnalytics, activeView]);
+  }, [fetchActiveAgents, fetchAnalytics, fetchAdvancedAnalytics, activeView, live]);
 
   // Load shifts on tab open or filter change
   useEffect(() => {
     if (activeView === "shifts") fetchShifts();
   }, [filters, activeView, fetchShifts]);
 
+  // Agent list for the shift filter
+  useEffect(() => {
+    if (activeView !== "shifts" || agentOptions.length) return;
+    fetch(`${API}/manager/users`)
+      .then(res => res.ok ? res.json() : { users: [] })
+      .then(d => setAgentOptions((d.users ?? []).slice().sort((a, b) => a.name.localeCompare(b.name))))
+      .catch(() => {});
+  }, [API, activeView, agentOptions.length]);
+
   // Lazy-load advanced analytics on first visit
   useEffect(() => {
     if (activeView === "analytics" && !advancedAnalytics) fetchAdvancedAnalytics();
@@ -1093,14 +1153,17 @@ function ManagerDashboard() {
                 onChange={e => setFilters(f => ({ ...f, endDate: e.target.value }))}
                 style={{ minWidth: 140 }}
               />
-              <input
-                type="text"
+              <select
                 className="mgr-input"
-                placeholder="Filter by Agent Name…"
                 value={filters.agentId}
                 onChange={e => setFilters(f => ({ ...f, agentId: e.target.value }))}
                 style={{ flex: 1, minWidth: 180 }}
-              />
+              >
+                <option value="">All agents</option>
+                {agentOptions.map(a => (
+                  <option key={a.id} value={a.id}>{a.name}</option>
+                ))}
+              </select>
               <button
                 className="mgr-btn-ghost"
                 onClick={() => setFilters({ startDate: "", endDate: "", agentId: "" })}
@@ -1173,6 +1236,17 @@ function ManagerDashboard() {
                     ))}
                   </tbody>
                 </table>
+                {shiftsCursor && (
+                  <div style={{ padding: 12, textAlign: "center", borderTop: `1px solid ${C.border}` }}>
+                    <button
+                      className="mgr-btn-ghost"
+                      disabled={loading.shifts}
+                      onClick={() => fetchShifts(shiftsCursor)}
+                    >
+                      {loading.shifts ? "Loading…" : "Load more"}
+                    </button>
+                  </div>
+                )}
               </div>
             ) : (
               <EmptyState message="No shifts found — try adjusting the filters" />